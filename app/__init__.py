@@ -1,13 +1,54 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+import logging
+import threading
+from fastapi import Depends, FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from .routers import users, events, chatbot
+from .routers import users, events, chatbot, media
 from fastapi.middleware.cors import CORSMiddleware
+from . import config
+from .services import deadlines, tracing
+from .services import firebase, gemini, event_lifecycle
+from .services import media as media_service
+from .services.event_index import event_index
+from .services.event_replica import event_replica
+from .services.admission import AdmissionController, AdmissionPolicy, SharedBucketStore
+from .services.shared_cache import shared_cache
 
 
+def warm_up_services():
+    """Build backend clients and import heavy modules before they are needed."""
+    try:
+        firebase.warm_up()
+        gemini.get_client()
+        import qrcode, PIL.Image  # noqa: F401  (used by joinEvent)
+    except Exception:
+        logging.exception("Service warm-up failed; clients will be built on first use")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.SERVICE_WARMUP == "blocking":
+        await run_in_threadpool(warm_up_services)
+    elif config.SERVICE_WARMUP == "background":
+        threading.Thread(target=warm_up_services, name="service-warmup", daemon=True).start()
+    if config.EVENTS_REPLICA_ENABLED:
+        event_replica.add_listener(event_index.apply_change)
+        try:
+            await run_in_threadpool(event_replica.start, firebase.db.collection("Events"))
+        except Exception:
+            logging.exception("Events replica failed to start; serving direct reads")
+    lifecycle = asyncio.create_task(event_lifecycle.run_scheduled()) if config.EVENT_LIFECYCLE_ENABLED else None
+    yield
+    if lifecycle is not None:
+        lifecycle.cancel()
+    event_replica.stop()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="HackConnect Backend")
+    media_service.check_config()
+    app = FastAPI(title="HackConnect Backend", lifespan=lifespan)
 
 
     origins = [
@@ -22,12 +63,82 @@ def create_app() -> FastAPI:
         allow_headers=["*"],            # allow all headers
     )
 
+    if config.TRACE_BACKEND_CALLS:
+        @app.middleware("http")
+        async def trace_backend_calls(request: Request, call_next):
+            trace, token = tracing.start_trace(request.method, request.url.path)
+            try:
+                response = await call_next(request)
+            finally:
+                tracing.end_trace(token)
+            # The header covers the handler; the log line, written after the body, covers streaming too.
+            response.headers[config.TRACE_HEADER] = trace.summary_header()
+            tracing.log_after_body(response, trace)
+            return response
+
+    if config.REQUEST_DEADLINE_ENABLED:
+        @app.middleware("http")
+        async def request_deadline(request: Request, call_next):
+            seconds = deadlines.budget_for(request.url.path)
+            if seconds is None:
+                return await call_next(request)
+            budget, token = deadlines.start_budget(seconds)
+            try:
+                response = await call_next(request)
+            finally:
+                deadlines.end_budget(token)
+            # Routes report backend failures as 500s; out of budget, that is a 503 to retry.
+            if budget.exhausted and response.status_code >= 500:
+                return deadlines.exceeded_response()
+            return response
+
     @app.get("/")
     async def read_root():
         return {"message": "Welcome to the HackConnect Backend!"}
 
-    app.include_router(users.router, prefix="/users", tags=["users"])
-    app.include_router(events.router, prefix="/events", tags=["events"])
-    app.include_router(chatbot.router, prefix="/chatbot", tags=["chatbot"])
+    # Admission control per router: token buckets per wallet (path param)
+    # and per IP, plus a concurrency cap and bounded queue per route.
+    admission = {
+        "users": AdmissionPolicy(
+            wallet_rate=5, wallet_burst=10, ip_rate=20, ip_burst=40,
+            max_concurrency=32, max_queue=64,
+        ),
+        "events": AdmissionPolicy(
+            wallet_rate=5, wallet_burst=10, ip_rate=20, ip_burst=40,
+            max_concurrency=64, max_queue=128,
+            routes={
+                # QR rendering + uploads: keep drops from draining the threadpool
+                "/events/joinEvent/{event_id}/{wallet_address}": dict(
+                    wallet_rate=1, wallet_burst=3, max_concurrency=16, max_queue=64,
+                ),
+                # Live check-in feeds stay open for hours: rate-limit connects, no gate slot
+                "/events/attendees/{eventId}/live": dict(max_concurrency=0),
+                "/events/attendees/{eventId}/stream": dict(max_concurrency=0),
+            },
+        ),
+        "media": AdmissionPolicy(
+            ip_rate=50, ip_burst=100, max_concurrency=64, max_queue=128,
+        ),
+        "chatbot": AdmissionPolicy(
+            ip_rate=1, ip_burst=5, max_concurrency=16, max_queue=32, queue_timeout=5.0,
+        ),
+    }
+
+    def guard(name):
+        if not config.ADMISSION_ENABLED:
+            return []
+        # Under the multi-worker launcher, buckets are shared by all workers.
+        store = SharedBucketStore(shared_cache) if shared_cache.shared else None
+        controller = AdmissionController(
+            admission[name], store=store, trust_forwarded=config.ADMISSION_TRUST_FORWARDED
+        )
+        # "function" scope: the slot is released when the handler returns, not
+        # after a streamed body (NDJSON exports, status streams) is sent.
+        return [Depends(controller, scope="function")]
+
+    app.include_router(users.router, prefix="/users", tags=["users"], dependencies=guard("users"))
+    app.include_router(events.router, prefix="/events", tags=["events"], dependencies=guard("events"))
+    app.include_router(chatbot.router, prefix="/chatbot", tags=["chatbot"], dependencies=guard("chatbot"))
+    app.include_router(media.router, prefix="/media", tags=["media"], dependencies=guard("media"))
 
     return app
\ No newline at end of file
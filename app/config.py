@@ -0,0 +1,156 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    """Read a boolean flag from the environment ("1", "true", "yes", "on")."""
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Backend round-trip tracing (Firestore / Storage calls per request)
+TRACE_BACKEND_CALLS = _env_bool("TRACE_BACKEND_CALLS")
+TRACE_ROUNDTRIP_BUDGET = int(os.getenv("TRACE_ROUNDTRIP_BUDGET", "3"))
+TRACE_HEADER = os.getenv("TRACE_HEADER", "X-Backend-Trace")
+
+# Startup: "off" builds backend clients on first use, "blocking" builds them
+# before the app accepts traffic, "background" builds them without blocking.
+SERVICE_WARMUP = os.getenv("SERVICE_WARMUP", "off").strip().lower()
+
+# Conditional GET: Cache-Control for public event reads
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", "5"))
+HTTP_CACHE_SWR = int(os.getenv("HTTP_CACHE_SWR", "30"))
+
+# Event search index: seconds before the in-process index is rebuilt from Firestore
+EVENT_INDEX_TTL = float(os.getenv("EVENT_INDEX_TTL", "300"))
+
+# Events replica: serve event reads from a snapshot-listener copy of the collection
+# (max apply lag of a change, and max age in seconds of the stream's latest
+# confirmed snapshot before reads fall back to Firestore)
+EVENTS_REPLICA_ENABLED = _env_bool("EVENTS_REPLICA_ENABLED")
+EVENTS_REPLICA_MAX_STALENESS = float(os.getenv("EVENTS_REPLICA_MAX_STALENESS", "5"))
+EVENTS_REPLICA_MAX_SILENCE = float(os.getenv("EVENTS_REPLICA_MAX_SILENCE", "60"))
+
+# Admission control (rate limits and load shedding, see create_app for the
+# policies), opt-in. Per-IP buckets key on the socket peer address: behind
+# Cloud Run or any reverse proxy that is the proxy, so every user would share
+# one bucket. Set ADMISSION_TRUST_FORWARDED there to key on the first
+# X-Forwarded-For address (only when the proxy sets that header itself).
+ADMISSION_ENABLED = _env_bool("ADMISSION_ENABLED")
+ADMISSION_TRUST_FORWARDED = _env_bool("ADMISSION_TRUST_FORWARDED")
+
+# Document loader: tick window for coalescing reads and max keys per get_all
+LOADER_WINDOW_MS = float(os.getenv("LOADER_WINDOW_MS", "2"))
+LOADER_MAX_BATCH = int(os.getenv("LOADER_MAX_BATCH", "100"))
+
+# Purchase queue: joinEvent requests are queued per event and committed in micro-batches
+PURCHASE_QUEUE_ENABLED = _env_bool("PURCHASE_QUEUE_ENABLED")
+PURCHASE_QUEUE_BATCH = int(os.getenv("PURCHASE_QUEUE_BATCH", "50"))
+PURCHASE_QUEUE_WINDOW_MS = float(os.getenv("PURCHASE_QUEUE_WINDOW_MS", "20"))
+PURCHASE_QUEUE_MAX_PENDING = int(os.getenv("PURCHASE_QUEUE_MAX_PENDING", "5000"))
+PURCHASE_QUEUE_WORKERS = int(os.getenv("PURCHASE_QUEUE_WORKERS", "8"))
+# Seconds joinEvent waits for the result before answering 202 with a status URL
+PURCHASE_QUEUE_WAIT = float(os.getenv("PURCHASE_QUEUE_WAIT", "10"))
+PURCHASE_QUEUE_RESULT_TTL = float(os.getenv("PURCHASE_QUEUE_RESULT_TTL", "600"))
+
+# Event stats: shard documents the sale/check-in counters of one event are
+# spread over, and minutes of per-minute check-in buckets kept
+EVENT_STATS_SHARDS = int(os.getenv("EVENT_STATS_SHARDS", "10"))
+EVENT_STATS_MINUTES_KEPT = int(os.getenv("EVENT_STATS_MINUTES_KEPT", "1440"))
+
+# Task generation: parallel chunk writers for bulk refreshes (each chunk is one 500-write batch)
+TASKS_WRITE_CONCURRENCY = int(os.getenv("TASKS_WRITE_CONCURRENCY", "4"))
+
+# Leaderboard: seconds between background rescans of Wallets that reconcile the in-memory index
+LEADERBOARD_RECONCILE_SECONDS = float(os.getenv("LEADERBOARD_RECONCILE_SECONDS", "300"))
+
+# Production launcher (python -m app.launcher): worker processes, 0 = one per CPU
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+
+# Shared-memory cache: file mapped by every worker (set by the launcher;
+# unset means a cache private to the process)
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH") or None
+SHARED_CACHE_MB = int(os.getenv("SHARED_CACHE_MB", "64"))
+SHARED_CACHE_SLOT_BYTES = int(os.getenv("SHARED_CACHE_SLOT_BYTES", "8192"))
+SHARED_CACHE_EVENT_TTL = float(os.getenv("SHARED_CACHE_EVENT_TTL", "10"))
+SHARED_CACHE_QR_TTL = float(os.getenv("SHARED_CACHE_QR_TTL", "86400"))
+
+# Gemini gateway (chatbot): concurrent calls, per-attempt timeout and overall
+# deadline in seconds, retries with jittered backoff, and the circuit breaker
+# (consecutive failures to open, seconds before a probe is let through)
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "10"))
+GEMINI_DEADLINE = float(os.getenv("GEMINI_DEADLINE", "20"))
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", "2"))
+GEMINI_BACKOFF = float(os.getenv("GEMINI_BACKOFF", "0.5"))
+GEMINI_BREAKER_FAILURES = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET = float(os.getenv("GEMINI_BREAKER_RESET", "30"))
+
+# Live check-in feed: messages buffered per subscriber before it is dropped as
+# too slow, and seconds between keep-alives on idle connections
+CHECKIN_FEED_BUFFER = int(os.getenv("CHECKIN_FEED_BUFFER", "256"))
+CHECKIN_FEED_KEEPALIVE = float(os.getenv("CHECKIN_FEED_KEEPALIVE", "15"))
+
+# Media route (/media/{path}): absolute base URL of this API stored in
+# imageUrl/qrCodeUrl, disk LRU cache of hot objects per worker, and seconds
+# the signed attendee export URL stays valid. Without MEDIA_BASE_URL uploads
+# stay public bucket URLs (MEDIA_MAKE_PUBLIC defaults to on).
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "")
+MEDIA_MAKE_PUBLIC = _env_bool("MEDIA_MAKE_PUBLIC", not MEDIA_BASE_URL)
+MEDIA_EXPORT_URL_TTL = int(os.getenv("MEDIA_EXPORT_URL_TTL", "900"))
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR") or None
+MEDIA_CACHE_MB = int(os.getenv("MEDIA_CACHE_MB", "256"))
+MEDIA_CACHE_MAX_OBJECT_MB = int(os.getenv("MEDIA_CACHE_MAX_OBJECT_MB", "8"))
+MEDIA_CACHE_REVALIDATE = float(os.getenv("MEDIA_CACHE_REVALIDATE", "30"))
+
+# Idempotency-Key (joinEvent): seconds a response is replayed, seconds a
+# duplicate waits for the in-flight request, seconds after which a pending
+# claim is considered abandoned, keys kept in memory, Firestore records
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "15"))
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+IDEMPOTENCY_FIRESTORE = _env_bool("IDEMPOTENCY_FIRESTORE", True)
+
+# Event lifecycle (opt-in): scheduled job that archives events ended more than
+# EVENT_ARCHIVE_AFTER_HOURS ago (rewrites their status to "archived") and
+# rewrites the active events summary read by listEvents (seconds between runs;
+# summaries older than the max age are ignored). While enabled, listEvents
+# served from the summary can show tier sold counts up to
+# EVENT_SUMMARY_INTERVAL seconds old.
+EVENT_LIFECYCLE_ENABLED = _env_bool("EVENT_LIFECYCLE_ENABLED")
+EVENT_ARCHIVE_AFTER_HOURS = float(os.getenv("EVENT_ARCHIVE_AFTER_HOURS", "72"))
+EVENT_ARCHIVE_INTERVAL = float(os.getenv("EVENT_ARCHIVE_INTERVAL", "3600"))
+EVENT_SUMMARY_INTERVAL = float(os.getenv("EVENT_SUMMARY_INTERVAL", "60"))
+EVENT_SUMMARY_MAX_AGE = float(os.getenv("EVENT_SUMMARY_MAX_AGE", "300"))
+
+# Request deadlines (opt-in): seconds each HTTP request may spend (REQUEST_DEADLINE,
+# overridden per path prefix in DEADLINE_ROUTES, 0 = no deadline) and the
+# retry policies of Firestore/Storage calls made within it (attempts and
+# per-attempt timeout for reads and idempotent writes; other writes run once).
+# Once a budget is spent the request answers 503, so size the budgets from
+# the benchmarks before enabling (listEvents over 10k events can take ~8s).
+REQUEST_DEADLINE_ENABLED = _env_bool("REQUEST_DEADLINE_ENABLED")
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "8"))
+DEADLINE_ROUTES = {
+    "/events/joinEvent/": float(os.getenv("DEADLINE_JOIN_EVENT", "15")),
+    "/events/create": float(os.getenv("DEADLINE_CREATE_EVENT", "15")),
+    "/events/downloadAttendeesList/": float(os.getenv("DEADLINE_EXPORT", "30")),
+    "/events/rebuildStats": float(os.getenv("DEADLINE_EXPORT", "30")),
+    "/events/archiveFinished": float(os.getenv("DEADLINE_EXPORT", "30")),
+    "/users/createTasks": float(os.getenv("DEADLINE_EXPORT", "30")),
+    # Large media is streamed in ranged chunks; the chatbot gateway has its own deadline
+    "/media/": 0.0,
+    "/chatbot/": 0.0,
+}
+DEADLINE_READ_ATTEMPTS = int(os.getenv("DEADLINE_READ_ATTEMPTS", "3"))
+DEADLINE_READ_TIMEOUT = float(os.getenv("DEADLINE_READ_TIMEOUT", "3"))
+DEADLINE_WRITE_ATTEMPTS = int(os.getenv("DEADLINE_WRITE_ATTEMPTS", "2"))
+DEADLINE_WRITE_TIMEOUT = float(os.getenv("DEADLINE_WRITE_TIMEOUT", "5"))
@@ -0,0 +1,74 @@
+"""Production launcher.
+
+    python -m app.launcher --workers 4
+    python main.py
+
+Runs ``WEB_WORKERS`` uvicorn worker processes (0 = one per CPU), using
+uvloop and httptools when they are installed. Before the workers start it
+picks the file for the shared-memory cache (``SHARED_CACHE_PATH``, in
+/dev/shm when available) and exports it, so every worker maps the same
+cache; the file is removed when the launcher exits.
+"""
+import argparse
+import atexit
+import importlib.util
+import logging
+import os
+import tempfile
+
+import uvicorn
+
+from . import config
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _cache_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, f"hackconnect-cache-{os.getpid()}")
+
+
+def _remove(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the HackConnect API with multiple workers.")
+    parser.add_argument("--host", default=config.WEB_HOST)
+    parser.add_argument("--port", type=int, default=config.WEB_PORT)
+    parser.add_argument("--workers", type=int, default=config.WEB_WORKERS, help="0 = one per CPU")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+
+    if not config.SHARED_CACHE_PATH:
+        path = _cache_path()
+        # Workers read the path from the environment; this process may run the app itself.
+        os.environ["SHARED_CACHE_PATH"] = config.SHARED_CACHE_PATH = path
+        atexit.register(_remove, path)
+
+    logging.basicConfig(level=args.log_level.upper())
+    logging.info("Starting %d worker(s) (loop=%s, http=%s, shared cache=%s)",
+                 workers, loop, http, config.SHARED_CACHE_PATH)
+    uvicorn.run(
+        "app:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop=loop,
+        http=http,
+        log_level=args.log_level,
+    )
+
+
+if __name__ == "__main__":
+    main()
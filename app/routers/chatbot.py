@@ -3,7 +3,7 @@
 
 from urllib import response
 from fastapi import APIRouter, HTTPException
-from ..services.gemini import generate_response
+from ..services.gemini import gemini_gateway, GeminiRejected
 from pydantic import BaseModel
 
 class ChatbotRequest(BaseModel):
@@ -15,10 +15,14 @@ class ChatbotRequest(BaseModel):
 router = APIRouter()
 
 @router.post("/chatbotInput")
-def chatbot_input(request: ChatbotRequest):
+async def chatbot_input(request: ChatbotRequest):
     """Process user message through chatbot and return response."""
     try:
-        response = generate_response(request.user_message)
+        response = await gemini_gateway.respond(request.user_message)
+    except HTTPException:
+        raise
+    except GeminiRejected as e:
+        raise HTTPException(status_code=502, detail=f"Chatbot error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chatbot error: {str(e)}")
     
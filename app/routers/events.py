@@ -1,18 +1,39 @@
+import asyncio
 import json
 import base64
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+import math
+import random
+import time
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 import datetime as dt
 from ..services.firebase import db, storage_bucket
+from ..services.serialization import FastJSONResponse, dumps, event_to_dict, ndjson_response, wants_ndjson
+from ..services.http_cache import conditional_response, latest, version_of, PRIVATE_CACHE
+from ..services.event_index import event_index
+from ..services.event_replica import event_replica
+from ..services import event_stats, event_lifecycle
+from ..services.loader import document_loader, MissingDocument
+from ..services.purchase_queue import purchase_queue, QueueFull
+from ..services.tickets import discard_ticket, generate_signature, join_response, prepare_ticket, ticket_issued
+from ..services.shared_cache import shared_cache, EVENT_KEY, QR_KEY
+from ..services.checkin_feed import checkin_hub
+from ..services import media
+from ..services.idempotency import idempotency_store, fingerprint
+from .. import config
 import logging, traceback
-import qrcode as qr
 from io import BytesIO
-import uuid
 
 
 router = APIRouter()
 
+# Optimistic tier count updates retried by a direct joinEvent before it answers 503
+MAX_TIER_UPDATE_ATTEMPTS = 10
+TIER_UPDATE_BACKOFF = 0.05
+
 from pydantic import Field, ConfigDict
 
 
@@ -71,51 +92,153 @@ class updateTicketStatusPayload(BaseModel):
     new_status: str
 
 
-@router.get("/listEvents")
-def list_events():
-    """Retrieve all events with proper field mapping."""
+@router.get("/listEvents", response_model=EventListResponse, response_class=FastJSONResponse)
+def list_events(request: Request):
+    """Retrieve the events that are not archived, with proper field mapping.
+
+    With EVENT_LIFECYCLE_ENABLED the list may come from the active events
+    summary, whose tier sold counts can be up to EVENT_SUMMARY_INTERVAL old.
+    """
     try:
-        query = db.collection("Events").get()
-        retrieved_events = []
-        for doc in query:
-            data = doc.to_dict() or {}
-            start_raw = data.get("date_start")
-            end_raw = data.get("date_end")
-            if start_raw is not None and hasattr(start_raw, "to_datetime"):
-                data["date_start"] = start_raw.to_datetime()
-            if end_raw is not None and hasattr(end_raw, "to_datetime"):
-                data["date_end"] = end_raw.to_datetime()
-
-            tiers_raw = data.get("ticketTiers", [])
-            tiers: list[EventTiers] = []
-            for t in tiers_raw:
-                if isinstance(t, dict):
-                    tiers.append(EventTiers(**t))
-
-            event_obj = Event(
-                event_id=doc.id,
-                event_link=data.get("eventLink", ""),
-                event_title=data.get("title", ""),
-                date_start=data.get("startDate", dt.datetime.now()),
-                date_end=data.get("endDate", dt.datetime.now()),
-                description=data.get("description", ""),
-                host_address=data.get("hostAddress", ""),
-                image_url=data.get("imageUrl"),
-                status=data.get("status", ""),
-                ticket_tiers=tiers,
-                created_at=data.get("createdAt", dt.datetime.utcnow()),
+        if wants_ndjson(request):
+            if event_replica.is_fresh():
+                return ndjson_response(decoded for _, decoded, _ in _active_replica_items())
+            return ndjson_response(
+                event_to_dict(doc.id, doc.to_dict() or {}) for doc in event_lifecycle.active_query().stream()
             )
-            retrieved_events.append(event_obj)
+        if event_replica.is_fresh():
+            entries = [(event_id, update_time, decoded) for event_id, decoded, update_time in _active_replica_items()]
+        else:
+            # The precomputed summary is one read and is sent without re-encoding.
+            summary = event_lifecycle.load_summary()
+            if summary is not None:
+                body, update_time = summary
+                return conditional_response(
+                    request,
+                    body,
+                    version=version_of(event_lifecycle.ACTIVE_SUMMARY_ID, update_time),
+                    last_modified=update_time,
+                )
+            entries = [(doc.id, doc.update_time, doc) for doc in event_lifecycle.active_query().get()]
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error("Error retrieving events: %s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error retrieving events: {str(e)}")
     
-    return EventListResponse(events=retrieved_events)
+    def body():
+        return {"events": [
+            item if isinstance(item, dict) else event_to_dict(item.id, item.to_dict() or {})
+            for _, _, item in entries
+        ]}
+
+    # The id/update_time pairs change whenever any event changes, so polls
+    # that get a 304 skip decoding and encoding the whole list.
+    return conditional_response(
+        request,
+        body,
+        version=version_of(*(f"{event_id}@{version_of(update_time)}" for event_id, update_time, _ in entries)),
+        last_modified=latest(update_time for _, update_time, _ in entries),
+    )
+
+
+def _active_replica_items():
+    return [item for item in event_replica.items() if item[1]["status"] != event_lifecycle.ARCHIVED_STATUS]
+
+
+@router.get("/archivedEvents", response_class=FastJSONResponse)
+def list_archived_events(page_size: int = 20, cursor: str | None = None):
+    """Page through archived events, most recently ended first."""
+    if not 1 <= page_size <= 100:
+        raise HTTPException(status_code=400, detail="page_size must be between 1 and 100.")
+
+    try:
+        events, next_cursor = event_lifecycle.list_archived(page_size, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Error retrieving archived events: %s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error retrieving archived events: {str(e)}")
+
+    return FastJSONResponse({"events": events, "next_cursor": next_cursor})
+
+
+@router.post("/archiveFinished")
+def archive_finished_events():
+    """Archive finished events and refresh the active events summary now."""
+    if not config.EVENT_LIFECYCLE_ENABLED:
+        raise HTTPException(status_code=409, detail="Event archiving is disabled (EVENT_LIFECYCLE_ENABLED).")
+    try:
+        result = event_lifecycle.run_once(archive=True)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Error archiving events: %s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error archiving events: {str(e)}")
+
+    return {"success": True, "archived": len(result["archived"]), "summary": result["summary"]}
+
+
+@router.get("/replicaStatus")
+def replica_status():
+    """Report the state and lag of the local Events replica."""
+    return event_replica.stats()
+
+
+def _load_events_for_index():
+    if event_replica.is_fresh():
+        return event_replica.raw_items()
+    return [(doc.id, doc.to_dict() or {}) for doc in db.collection("Events").get()]
+
+
+@router.get("/searchEvents", response_class=FastJSONResponse)
+def search_events(
+    q: str | None = None,
+    status: str | None = None,
+    host: str | None = None,
+    start_after: dt.datetime | None = None,
+    start_before: dt.datetime | None = None,
+    end_after: dt.datetime | None = None,
+    end_before: dt.datetime | None = None,
+    page: int = 1,
+    page_size: int = 20,
+):
+    """Search events by title/description tokens, status, host and date ranges."""
+    if page < 1 or not 1 <= page_size <= 100:
+        raise HTTPException(status_code=400, detail="page must be >= 1 and page_size between 1 and 100.")
+
+    try:
+        event_index.ensure_built(_load_events_for_index)
+        total, results = event_index.search(
+            q=q,
+            status=status,
+            host=host,
+            start_after=start_after,
+            start_before=start_before,
+            end_after=end_after,
+            end_before=end_before,
+            page=page,
+            page_size=page_size,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Error searching events: %s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error searching events: {str(e)}")
+
+    return FastJSONResponse({
+        "total": total,
+        "page": page,
+        "page_size": page_size,
+        "events": [event_to_dict(event_id, data) for event_id, data in results],
+    })
 
 
 @router.get("/retrieveTickets/{wallet_address}")
-def retrieve_tickets(wallet_address: str):
+def retrieve_tickets(wallet_address: str, request: Request):
     """Retrieve tickets for a given wallet address."""
     
     if not wallet_address:
@@ -123,8 +246,12 @@ def retrieve_tickets(wallet_address: str):
     
     try:
         query = db.collection("Tickets")\
-        .where("walletAddress", "==", wallet_address)\
-        .get()
+        .where("walletAddress", "==", wallet_address)
+
+        if wants_ndjson(request):
+            return ndjson_response(data for doc in query.stream() if (data := doc.to_dict()))
+
+        query = query.get()
 
         tickets = []
         for doc in query:
@@ -132,8 +259,10 @@ def retrieve_tickets(wallet_address: str):
             if not data:
                 continue
             tickets.append(data)
-        return {"wallet_address": wallet_address, "tickets": tickets}
+        return FastJSONResponse({"wallet_address": wallet_address, "tickets": tickets})
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving tickets: {str(e)}")
 
@@ -166,13 +295,11 @@ async def create_event(
             # Read image content
             image_content = await image.read()
             
-            # Generate unique filename
-            file_extension = image.filename.split('.')[-1]
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
+            # Content-addressed filename: the URL can be cached forever
+            blob_path = media.hashed_path("events/images", image_content, image.filename)
             
             # Upload to Firebase Storage
             bucket = storage_bucket
-            blob_path = f"events/images/{unique_filename}"
             blob = bucket.blob(blob_path)
             
             # Upload from bytes
@@ -180,10 +307,7 @@ async def create_event(
                 image_content,
                 content_type=image.content_type or 'image/jpeg'
             )
-            
-            # Make publicly accessible
-            blob.make_public()
-            image_url = blob.public_url
+            image_url = media.publish(blob)
         
         now = dt.datetime.utcnow()
         event = Event(
@@ -214,9 +338,14 @@ async def create_event(
         }
         _, doc_ref = db.collection("Events").add(firestore_doc)
         event.event_id = doc_ref.id
+        event_index.upsert(doc_ref.id, firestore_doc)
+        event_index.publish_change()
+        event_lifecycle.refresh_summary_soon()
 
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=400, detail=f"Invalid ticket_tiers JSON: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error("Error creating event: %s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error creating event: {str(e)}")
@@ -224,44 +353,45 @@ async def create_event(
     return ResponseModel(message="Event created successfully", eventInfo=event)
 
 
-@router.get("/getEventById/{event_id}")
-def get_event_by_id(event_id: str):
+@router.get("/getEventById/{event_id}", response_model=ResponseModel, response_class=FastJSONResponse)
+def get_event_by_id(event_id: str, request: Request):
     """Retrieve an event by its ID."""
 
     try:
-        doc_ref = db.collection("Events").document(event_id)
-        doc = doc_ref.get()
-        if not doc.exists:
-            raise HTTPException(status_code=404, detail="Event not found.")
-        
-        data = doc.to_dict() or {}
-        start_raw = data.get("date_start")
-        end_raw = data.get("date_end")
-        if start_raw is not None and hasattr(start_raw, "to_datetime"):
-            data["date_start"] = start_raw.to_datetime()
-        if end_raw is not None and hasattr(end_raw, "to_datetime"):
-            data["date_end"] = end_raw.to_datetime()
-
-        tiers_raw = data.get("ticketTiers", [])
-        tiers: list[EventTiers] = []
-        for t in tiers_raw:
-            if isinstance(t, dict):
-                tiers.append(EventTiers(**t))
-        event = Event(
-            event_id=doc.id,
-            event_link=data.get("eventLink", ""),
-            event_title=data.get("title", ""),
-            date_start=data.get("startDate", dt.datetime.utcnow()),
-            date_end=data.get("endDate", dt.datetime.utcnow()),
-            description=data.get("description", ""),
-            host_address=data.get("hostAddress", ""),
-            image_url=data.get("imageUrl"),
-            status=data.get("status", ""),
-            ticket_tiers=tiers,
-            created_at=data.get("createdAt", dt.datetime.utcnow()),
-        )
+        replicated = event_replica.get(event_id) if event_replica.is_fresh() else None
+        if replicated is not None:
+            event_info, update_time = replicated
+            return conditional_response(
+                request,
+                {"message": "Event retrieved successfully", "eventInfo": event_info},
+                version=version_of(event_id, update_time) if update_time else None,
+                last_modified=update_time,
+            )
 
-        return ResponseModel(message="Event retrieved successfully", eventInfo=event)
+        # Encoded response shared by all workers: "<update time>\n<json body>"
+        cache_key = EVENT_KEY.format(event_id)
+        cached = shared_cache.get(cache_key)
+        if cached is not None:
+            stamp, body = cached.split(b"\n", 1)
+            update_time = dt.datetime.fromisoformat(stamp.decode()) if stamp else None
+        else:
+            doc = document_loader.load("Events", event_id)
+            if not doc.exists:
+                raise HTTPException(status_code=404, detail="Event not found.")
+            update_time = doc.update_time
+            body = dumps({
+                "message": "Event retrieved successfully",
+                "eventInfo": event_to_dict(doc.id, doc.to_dict() or {}),
+            })
+            stamp = version_of(update_time) if update_time else ""
+            shared_cache.set(cache_key, stamp.encode() + b"\n" + body, ttl=config.SHARED_CACHE_EVENT_TTL)
+        
+        return conditional_response(
+            request,
+            body,
+            version=version_of(event_id, update_time) if update_time else None,
+            last_modified=update_time,
+        )
 
     except HTTPException:
         raise
@@ -271,141 +401,185 @@ def get_event_by_id(event_id: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving event: {str(e)}")
     
 
-def generate_signature(payload: dict) -> str:
-    """Generate a simple signature for the QR code payload."""
-    import hashlib
-    payload_str = json.dumps(payload, sort_keys=True)
-    return hashlib.sha256(payload_str.encode()).hexdigest()
-
-
 @router.post("/joinEvent/{event_id}/{wallet_address}")
-def join_event(event_id: str, wallet_address: str, payload: JoinEventPayload):
+async def join_event(
+    event_id: str,
+    wallet_address: str,
+    payload: JoinEventPayload,
+    idempotency_key: Optional[str] = Header(None),
+):
     """Add a wallet address to an event's participants, generates and stores QR-code."""
-    
-    try:
-        # Generate unique ticket ID first
-        ticket_id = str(uuid.uuid4())
-        
-        # Create QR payload with ticket information (including ticketId)
-        qr_payload = {
-            "eventTitle": payload.eventTitle,
-            "eventId": event_id,
-            "walletAddress": wallet_address,
-            "ticketId": ticket_id,
-            "purchasedAt": dt.datetime.now().isoformat(),
-            "priceBought": payload.priceBought,
-            "tierName": payload.tierName,
-            "status": "active",
-        }
+    if idempotency_key is None:
+        return await _join_event(event_id, wallet_address, payload)
+    # Retries with the same key get the first response instead of a second ticket.
+    return await idempotency_store.run(
+        f"joinEvent:{wallet_address.lower()}:{idempotency_key}",
+        fingerprint(event_id, wallet_address.lower(), payload.model_dump()),
+        lambda: _join_event(event_id, wallet_address, payload),
+    )
+
+
+async def _join_event(event_id: str, wallet_address: str, payload: JoinEventPayload):
+    if not config.PURCHASE_QUEUE_ENABLED:
+        return await run_in_threadpool(_join_event_now, event_id, wallet_address, payload)
 
-        # Generate signature for security
-        qr_signature = generate_signature(qr_payload)
-        qr_payload["signature"] = qr_signature
-
-        # Generate QR code
-        qr_string = json.dumps(qr_payload)
-        qr_code = qr.QRCode(
-            version=1,
-            error_correction=qr.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
+    try:
+        purchase = purchase_queue.enqueue(
+            event_id, wallet_address, payload.eventTitle, payload.priceBought, payload.tierName
         )
-        qr_code.add_data(qr_string)
-        qr_code.make(fit=True)
-        
-        # Create QR code image (PIL Image object)
-        img = qr_code.make_image(fill_color="black", back_color="white")
-        
-        # Convert PIL image to bytes
-        img_byte_arr = BytesIO()
-        img.save(img_byte_arr, 'PNG')  # PIL Image.save takes format as positional arg
-        img_byte_arr.seek(0)
-        
-        # Generate filename
-        qr_filename = f"{ticket_id}.png"
-        
-        # Upload to Firebase Storage
-        bucket = storage_bucket
-        blob_path = f"qrcodes/events/{event_id}/{wallet_address}/{qr_filename}"
-        blob = bucket.blob(blob_path)
-        
-        blob.upload_from_file(
-            img_byte_arr,
-            content_type='image/png'
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many people are joining this event, please retry.",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
         )
-        
-        # Make the QR code publicly accessible
-        blob.make_public()
-        qr_url = blob.public_url
-        
-        # Prepare ticket document for Firestore
-        ticket_doc = {
-            **qr_payload,
-            "ticketId": ticket_id,
-            "qrCodeUrl": qr_url,
-            "qrCodePath": blob_path,
-            "purchasedAtTimestamp": dt.datetime.now(),  # Keep datetime for queries
-            # purchasedAt from qr_payload (ISO string) is preserved for signature verification
-        }
-        
-        # Save ticket to Firestore
-        db.collection("Tickets").document(ticket_id).set(ticket_doc)
 
-        # Update ticket tier counts
+    if await purchase_queue.wait(purchase, config.PURCHASE_QUEUE_WAIT):
+        return _purchase_outcome(purchase)
+    return JSONResponse(
+        status_code=202,
+        content={
+            **purchase_queue.describe(purchase),
+            "statusUrl": f"/events/purchaseStatus/{purchase.id}",
+            "streamUrl": f"/events/purchaseStatus/{purchase.id}/stream",
+        },
+    )
+
+
+def _purchase_outcome(purchase):
+    if purchase.status == "failed":
+        raise HTTPException(status_code=purchase.status_code or 500, detail=purchase.error)
+    return purchase.result
+
+
+def _unchanged_since(snapshot):
+    """Write option that fails the write if the document changed after ``snapshot`` was read."""
+    return db.write_option(last_update_time=snapshot.update_time) if snapshot.update_time else None
+
+
+def _join_event_now(event_id: str, wallet_address: str, payload: JoinEventPayload):
+    from google.api_core.exceptions import FailedPrecondition
+
+    ticket_doc = None
+    committed = False
+    try:
+        ticket_doc, png = prepare_ticket(
+            event_id, wallet_address, payload.eventTitle, payload.priceBought, payload.tierName
+        )
+
+        # Update ticket tier counts. Read the event directly (not through the loader) and write
+        # with a precondition, so concurrent joins re-read instead of overwriting each other's counts.
+        # The ticket is saved in the same batch: it exists exactly when its reservation does.
         event_ref = db.collection("Events").document(event_id)
-        event_doc = event_ref.get()
-        
- 
+        ticket_ref = db.collection("Tickets").document(ticket_doc["ticketId"])
+        for _ in range(MAX_TIER_UPDATE_ATTEMPTS):
+            event_doc = event_ref.get()
+            batch = db.batch()
+            batch.set(ticket_ref, ticket_doc)
+            event_stats.stage_sales(batch, event_id, [(payload.tierName, payload.priceBought)])
+            if not event_doc.exists:
+                batch.commit()
+                committed = True
+                break
 
-        if event_doc.exists:
             event_data = event_doc.to_dict()
             if event_data is None:
                 raise HTTPException(status_code=500, detail="Event data is corrupted.")
-            
+
             ticket_tiers = event_data.get("ticketTiers", [])
-            
+
             # Find and update the matching tier
             for tier in ticket_tiers:
                 if tier.get("tierName") == payload.tierName:
+                    if tier.get("ticketCount", 0) <= 0:
+                        raise HTTPException(status_code=409, detail="Tier sold out.")
                     # Decrement available tickets and increment sold count
-                    tier["ticketCount"] = max(0, tier.get("ticketCount", 0) - 1)
+                    tier["ticketCount"] = tier.get("ticketCount", 0) - 1
                     tier["ticketsSold"] = tier.get("ticketsSold", 0) + 1
                     break
-            
-            # Update the event in Firestore
-            event_ref.update({"ticketTiers": ticket_tiers})
-        
-        return {
-            "success": True,
-            "message": "Successfully joined event and generated ticket",
-            "ticketId": ticket_id,
-            "qrCodeUrl": qr_url,
-            "eventId": event_id,
-            "walletAddress": wallet_address,
-            "tierName": payload.tierName,
-            "priceBought": payload.priceBought
-        }
-        
+
+            batch.update(event_ref, {"ticketTiers": ticket_tiers}, option=_unchanged_since(event_doc))
+            try:
+                batch.commit()
+            except FailedPrecondition:
+                time.sleep(random.uniform(0, TIER_UPDATE_BACKOFF))  # spread the re-reads of racing joins
+                continue
+            committed = True
+            event_index.update_tiers(event_id, ticket_tiers)
+            shared_cache.delete(EVENT_KEY.format(event_id))
+            break
+        else:
+            raise HTTPException(status_code=503, detail="Event is busy, please retry.",
+                                headers={"Retry-After": "1"})
+
+        ticket_issued(ticket_doc, png)
+
+        return join_response(ticket_doc)
+
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error("Error joining event: %s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error joining event: {str(e)}")
+    finally:
+        if ticket_doc is not None and not committed:
+            discard_ticket(ticket_doc)
+
+
+@router.get("/purchaseStatus/{request_id}")
+def get_purchase_status(request_id: str):
+    """Queue position and outcome of a queued joinEvent request."""
+    purchase = purchase_queue.get(request_id)
+    if purchase is None:
+        raise HTTPException(status_code=404, detail="Purchase request not found.")
+    return purchase_queue.describe(purchase)
+
+
+@router.get("/purchaseStatus/{request_id}/stream")
+async def stream_purchase_status(request_id: str):
+    """Server-sent events with the queue position until a queued joinEvent request finishes."""
+    purchase = purchase_queue.get(request_id)
+    if purchase is None:
+        raise HTTPException(status_code=404, detail="Purchase request not found.")
+
+    async def updates():
+        last, idle = None, 0
+        while True:
+            body = purchase_queue.describe(purchase)
+            if body != last:
+                yield f"event: {purchase.status}\ndata: {json.dumps(body, default=str)}\n\n"
+                last, idle = body, 0
+            elif idle >= 15:
+                yield ": keep-alive\n\n"
+                idle = 0
+            if purchase.done:
+                return
+            await purchase_queue.wait(purchase, 1.0)
+            idle += 1
+
+    return StreamingResponse(updates(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @router.get("/getTicket/{ticket_id}")
-def get_ticket(ticket_id: str):
+def get_ticket(ticket_id: str, request: Request):
     """Retrieve a ticket by its ID."""
     try:
-        doc_ref = db.collection("Tickets").document(ticket_id)
-        doc = doc_ref.get()
+        doc = document_loader.load("Tickets", ticket_id)
         
         if not doc.exists:
             raise HTTPException(status_code=404, detail="Ticket not found.")
         
         ticket_data = doc.to_dict()
-        return {
-            "success": True,
-            "ticket": ticket_data
-        }
+        return conditional_response(
+            request,
+            {
+                "success": True,
+                "ticket": ticket_data
+            },
+            version=version_of(doc.id, doc.update_time) if doc.update_time else None,
+            last_modified=doc.update_time,
+            cache_control=PRIVATE_CACHE,
+        )
         
     except HTTPException:
         raise
@@ -414,6 +588,22 @@ def get_ticket(ticket_id: str):
         raise HTTPException(status_code=500, detail=f"Error retrieving ticket: {str(e)}")
 
 
+def _check_in(doc_ref, snapshot, event_id: str, checked_in_at: dt.datetime):
+    """Mark the ticket checked in (and count it), unless another scan changed it since ``snapshot`` was read."""
+    from google.api_core.exceptions import FailedPrecondition
+
+    batch = db.batch()
+    batch.update(doc_ref, {
+        "status": "checkedIn",
+        "checkedInAt": checked_in_at
+    }, option=_unchanged_since(snapshot))
+    event_stats.stage_checkin(batch, event_id, (snapshot.to_dict() or {}).get("tierName"), at=checked_in_at)
+    try:
+        batch.commit()
+    except FailedPrecondition:
+        raise HTTPException(status_code=409, detail="Ticket was updated concurrently, please retry.")
+
+
 @router.post("/verifyTicket/{event_id}")
 def verify_ticket(event_id: str, qr_data: dict):
     """Verify a ticket's authenticity using its signature and check it in."""
@@ -491,10 +681,9 @@ def verify_ticket(event_id: str, qr_data: dict):
             raise HTTPException(status_code=400, detail=f"Ticket is not active. Current status: {current_status}")
         
         # Update status to checkedIn and add timestamp
-        doc_ref.update({
-            "status": "checkedIn",
-            "checkedInAt": dt.datetime.now()
-        })
+        checked_in_at = dt.datetime.now()
+        _check_in(doc_ref, doc, event_id, checked_in_at)
+        checkin_hub.publish_ticket(event_id, ticket_id, ticket_data, "checkedIn", current_status, checked_in_at)
 
         return {
             "status": "checkedIn",
@@ -521,14 +710,15 @@ def verify_ticket_by_id(ticket_id: str, event_id: str):
         raise HTTPException(status_code=400, detail="Event ID is required.")
     
     try:
-        # Check if event exists
-        event_check = db.collection("Events").document(event_id).get()
+        # Fetch event and ticket together (one round trip). The ticket feeds the check-in
+        # write, so it is read directly rather than through the coalescing loader.
+        event_ref = db.collection("Events").document(event_id)
+        doc_ref = db.collection("Tickets").document(ticket_id)
+        snapshots = {snapshot.reference.path: snapshot for snapshot in db.get_all([event_ref, doc_ref])}
+        event_check = snapshots.get(event_ref.path) or MissingDocument(event_id)
+        doc = snapshots.get(doc_ref.path) or MissingDocument(ticket_id)
         if not event_check.exists:
             raise HTTPException(status_code=404, detail="Event not found.")
-
-        # Get ticket
-        doc_ref = db.collection("Tickets").document(ticket_id)
-        doc = doc_ref.get()
         
         if not doc.exists:
             raise HTTPException(status_code=404, detail="Ticket not found.")
@@ -562,13 +752,12 @@ def verify_ticket_by_id(ticket_id: str, event_id: str):
             )
         
         # Update status to checkedIn and add timestamp
-        doc_ref.update({
-            "status": "checkedIn",
-            "checkedInAt": dt.datetime.now()
-        })
+        checked_in_at = dt.datetime.now()
+        _check_in(doc_ref, doc, event_id, checked_in_at)
+        checkin_hub.publish_ticket(event_id, ticket_id, ticket_data, "checkedIn", current_status, checked_in_at)
         
-        # Get updated ticket data
-        updated_ticket = doc_ref.get().to_dict()
+        # Updated ticket data is the read plus the fields just written
+        updated_ticket = {**ticket_data, "status": "checkedIn", "checkedInAt": checked_in_at}
         
         return {
             "valid": True,
@@ -591,32 +780,36 @@ async def set_event_image_url(file:UploadFile = File(...)):
     """Set or update the image URL for an event by uploading a new image."""
     try:
         image_bytes = await file.read()
-        time_now = dt.datetime.now().strftime("%Y%m%d%H%M%S")
-        filepath = f"uploads/{time_now}_{file.filename}"
+        filepath = media.hashed_path("uploads", image_bytes, file.filename)
 
         blob = storage_bucket.blob(filepath)
 
         if not file.content_type:
             return {"error": "file content type is missing."}
         blob.upload_from_string(image_bytes, content_type=file.content_type)
-        blob.make_public()
-        image_url = blob.public_url
+        image_url = media.publish(blob)
 
         return {
             "imageUrl": image_url
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error("Error setting event image URL: %s", traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error setting event image URL: {str(e)}")
     
 
 @router.get("/attendees/{eventId}")
-def get_event_attendees(eventId: str):
+def get_event_attendees(eventId: str, request: Request):
     """Retrieve all attendees for a given event ID."""
     try:
         query = db.collection("Tickets")\
-        .where("eventId", "==", eventId)\
-        .get()
+        .where("eventId", "==", eventId)
+
+        if wants_ndjson(request):
+            return ndjson_response(data for doc in query.stream() if (data := doc.to_dict()))
+
+        query = query.get()
 
         attendees = []
         for doc in query:
@@ -624,15 +817,87 @@ def get_event_attendees(eventId: str):
             if not data:
                 continue
             attendees.append(data)
-        return {"event_id": eventId, "attendees": attendees}
+        return FastJSONResponse({"event_id": eventId, "attendees": attendees})
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving attendees: {str(e)}")
 
 
+def _feed_hello(eventId: str) -> dict:
+    return {"type": "subscribed", "eventId": eventId, "seq": checkin_hub.sequence(eventId)}
+
+
+def _feed_overflow(eventId: str) -> dict:
+    return {"type": "overflow", "eventId": eventId, "detail": "Client too slow, reconnect and reload attendees."}
+
+
+@router.websocket("/attendees/{eventId}/live")
+async def attendees_live(websocket: WebSocket, eventId: str):
+    """Push ticket status changes of an event over WebSocket."""
+    await websocket.accept()
+    subscription = checkin_hub.subscribe(eventId)
+
+    async def drain_incoming():
+        # Clients do not send anything; reading notices when they go away.
+        while True:
+            await websocket.receive_text()
+
+    reader = asyncio.ensure_future(drain_incoming())
+    try:
+        await websocket.send_json(_feed_hello(eventId))
+        while not reader.done():
+            getter = asyncio.ensure_future(subscription.get(config.CHECKIN_FEED_KEEPALIVE))
+            await asyncio.wait({getter, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                break
+            message = getter.result()
+            if message is not None:
+                await websocket.send_json(message)
+            elif subscription.dropped:
+                await websocket.send_json(_feed_overflow(eventId))
+                await websocket.close(code=1013)
+                break
+            else:
+                await websocket.send_json({"type": "keepalive"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        subscription.close()
+
+
+@router.get("/attendees/{eventId}/stream")
+async def attendees_stream(eventId: str):
+    """Server-sent events with the ticket status changes of an event."""
+    subscription = checkin_hub.subscribe(eventId)
+
+    async def updates():
+        try:
+            hello = _feed_hello(eventId)
+            yield f"event: {hello['type']}\ndata: {json.dumps(hello)}\n\n"
+            while True:
+                message = await subscription.get(config.CHECKIN_FEED_KEEPALIVE)
+                if message is not None:
+                    yield f"id: {message['seq']}\nevent: {message['type']}\ndata: {json.dumps(message)}\n\n"
+                elif subscription.dropped:
+                    yield f"event: overflow\ndata: {json.dumps(_feed_overflow(eventId))}\n\n"
+                    return
+                else:
+                    yield ": keep-alive\n\n"
+        finally:
+            subscription.close()
+
+    return StreamingResponse(updates(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @router.post("/updateTicketStatus/{ticketId}")
 def update_ticket_status(ticketId: str, ticket_payload: updateTicketStatusPayload):
     """Update the status of a ticket."""
+    from google.api_core.exceptions import FailedPrecondition
+
     try:
         ticket_ref = db.collection("Tickets").document(ticketId)
         ticket_doc = ticket_ref.get()
@@ -640,7 +905,27 @@ def update_ticket_status(ticketId: str, ticket_payload: updateTicketStatusPayloa
         if not ticket_doc.exists:
             raise HTTPException(status_code=404, detail="Ticket not found.")
         
-        ticket_ref.update({"status": ticket_payload.new_status})
+        ticket_data = ticket_doc.to_dict() or {}
+        # Stats and feed deltas are computed from the status just read: it must still hold.
+        batch = db.batch()
+        batch.update(ticket_ref, {"status": ticket_payload.new_status}, option=_unchanged_since(ticket_doc))
+        if ticket_data.get("eventId"):
+            event_stats.stage_status_change(
+                batch,
+                ticket_data["eventId"],
+                ticket_data.get("tierName"),
+                ticket_data.get("status"),
+                ticket_payload.new_status,
+            )
+        try:
+            batch.commit()
+        except FailedPrecondition:
+            raise HTTPException(status_code=409, detail="Ticket was updated concurrently, please retry.")
+        if ticket_data.get("eventId"):
+            checkin_hub.publish_ticket(
+                ticket_data["eventId"], ticketId, ticket_data,
+                ticket_payload.new_status, ticket_data.get("status"),
+            )
         
         return {
             "success": True,
@@ -655,6 +940,53 @@ def update_ticket_status(ticketId: str, ticket_payload: updateTicketStatusPayloa
         raise HTTPException(status_code=500, detail=f"Error updating ticket status: {str(e)}")
     
 
+@router.get("/stats/{event_id}")
+def get_event_stats(event_id: str, minutes: int = 60):
+    """Return materialized sales and check-in aggregates for an event (one batched read of its counter shards)."""
+    if not 1 <= minutes <= 1440:
+        raise HTTPException(status_code=400, detail="minutes must be between 1 and 1440.")
+
+    try:
+        stats = event_stats.get_stats(event_id, minutes)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Error retrieving event stats: %s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error retrieving event stats: {str(e)}")
+
+    if stats is None:
+        raise HTTPException(status_code=404, detail="No stats for this event. Run /rebuildStats first.")
+    return FastJSONResponse(stats)
+
+
+@router.post("/rebuildStats/{event_id}")
+def rebuild_event_stats(event_id: str):
+    """Recompute an event's aggregates from its tickets (backfill / repair)."""
+    try:
+        stats = event_stats.rebuild(event_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Error rebuilding event stats: %s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error rebuilding event stats: {str(e)}")
+
+    return FastJSONResponse({"success": True, "stats": stats})
+
+
+@router.post("/rebuildStats")
+def rebuild_all_event_stats():
+    """Backfill aggregates for every event."""
+    try:
+        sold = event_stats.rebuild_all()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Error rebuilding event stats: %s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error rebuilding event stats: {str(e)}")
+
+    return {"success": True, "events": len(sold), "ticketsSold": sold}
+
+
 @router.get("/downloadTicketQr/{ticket_id}")
 def download_ticket_qr(ticket_id: str):
     """Download the QR code image for a given ticket ID."""
@@ -679,7 +1011,7 @@ def download_ticket_qr(ticket_id: str):
         if not blob.exists():
             raise HTTPException(status_code=404, detail="QR code image not found in storage.")
         
-        qr_image_url = blob.public_url
+        qr_image_url = media.url_for(blob)
         
         return {
             "ticketId": ticket_id,
@@ -693,6 +1025,38 @@ def download_ticket_qr(ticket_id: str):
         raise HTTPException(status_code=500, detail=f"Error downloading ticket QR code: {str(e)}")
 
 
+@router.get("/ticketQrImage/{ticket_id}")
+def get_ticket_qr_image(ticket_id: str):
+    """Return the QR code PNG of a ticket, from the shared cache when possible."""
+    from google.api_core.exceptions import NotFound
+
+    try:
+        cache_key = QR_KEY.format(ticket_id)
+        png = shared_cache.get(cache_key)
+        if png is None:
+            doc = document_loader.load("Tickets", ticket_id)
+            if not doc.exists:
+                raise HTTPException(status_code=404, detail="Ticket not found.")
+            qr_code_path = (doc.to_dict() or {}).get("qrCodePath")
+            if not qr_code_path:
+                raise HTTPException(status_code=404, detail="QR code path not found for this ticket.")
+            try:
+                png = storage_bucket.blob(qr_code_path).download_as_bytes()
+            except NotFound:
+                raise HTTPException(status_code=404, detail="QR code image not found in storage.")
+            shared_cache.set(cache_key, png, ttl=config.SHARED_CACHE_QR_TTL)
+
+        # A ticket's QR never changes; it embeds the signature, so keep it private.
+        return Response(content=png, media_type="image/png",
+                        headers={"Cache-Control": "private, max-age=86400, immutable"})
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Error retrieving ticket QR image: %s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error retrieving ticket QR image: {str(e)}")
+
+
 @router.get("/downloadAttendeesList/{event_id}")
 def download_attendees_list(event_id: str):
     """Generate and provide a download link for the attendees list of a given event (xlsx)."""
@@ -741,8 +1105,7 @@ def download_attendees_list(event_id: str):
             content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
         
-        blob.make_public()
-        download_url = blob.public_url
+        download_url = media.export_url(blob)
         
         return {
             "eventId": event_id,
@@ -0,0 +1,75 @@
+from email.utils import format_datetime
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+import logging, traceback
+
+from ..services.http_cache import etag_matches, not_modified, to_datetime
+from ..services.media import media_cache, cache_control, is_servable
+
+
+router = APIRouter()
+
+
+def _byte_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Parse a single ``bytes=`` range; None means send the whole object."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None  # multiple ranges: the full body is a valid answer
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1  # suffix range: the last N bytes
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable.",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+@router.api_route("/{path:path}", methods=["GET", "HEAD"])
+async def get_media(path: str, request: Request):
+    """Stream an uploaded file (image, QR code, export) with range and cache support."""
+    if not is_servable(path):
+        raise HTTPException(status_code=404, detail="Media not found.")
+    try:
+        obj = await run_in_threadpool(media_cache.lookup, path)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error("Error retrieving media: %s", traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error retrieving media: {str(e)}")
+    if obj is None:
+        raise HTTPException(status_code=404, detail="Media not found.")
+
+    etag = f'"{obj.etag}"'
+    last_modified = to_datetime(obj.updated)
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": cache_control(path),
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or etag_matches(if_range, etag):
+        byte_range = _byte_range(request.headers.get("range"), obj.size)
+    start, end = byte_range or (0, obj.size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    status_code = 200
+    if byte_range is not None:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{obj.size}"
+
+    if request.method == "HEAD" or obj.size == 0:
+        return Response(status_code=status_code, headers=headers, media_type=obj.content_type)
+    return StreamingResponse(media_cache.iter_bytes(obj, start, end), status_code=status_code,
+                             headers=headers, media_type=obj.content_type)
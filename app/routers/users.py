@@ -1,5 +1,8 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from ..services.firebase import db
+from ..services import tasks as task_service
+from ..services.leaderboard import leaderboard, ORDERINGS
+from ..services.serialization import ndjson_response, wants_ndjson
 from pydantic import BaseModel
 from datetime import datetime
 import logging, traceback
@@ -26,6 +29,14 @@ class taskResponse(BaseModel):
     walletAddress: str | None
     identifier: str | None
 
+class TaskGenerationRequest(BaseModel):
+    walletAddresses: list[str] | None = None  # None: every wallet
+    period: str | None = None  # ISO week, e.g. "2026-W42"; defaults to the current week
+    templateIds: list[str] | None = None
+
+class ClaimTasksRequest(BaseModel):
+    taskIds: list[str]
+
 
 router = APIRouter()
 
@@ -43,7 +54,8 @@ def create_user(wallet_address) -> WalletInfoResponse:
         "username": wallet_address[:6] + "...",
     }
 
-    db.collection(COLLECTION_NAME).add(user_data)
+    _, doc_ref = db.collection(COLLECTION_NAME).add(user_data)
+    leaderboard.upsert(doc_ref.id, user_data)
     return WalletInfoResponse(**user_data)
     
 
@@ -94,38 +106,56 @@ def retrieve_wallet_info(req: WalletRequest):
         )
 
 
+def _task_row(doc) -> dict:
+    data = doc.to_dict()
+    if not data:
+        raise HTTPException(status_code=500, detail="corrupted task data")
+
+    # Use a simple dict format matching frontend expectations
+    return {
+        "eventId": data.get("eventId"),
+        "taskId": doc.id,
+        "taskTitle": data.get("taskTitle"),
+        "taskDescription": data.get("taskDescription"),
+        "taskRewards": data.get("taskRewards"),
+        "claimed": data.get("claimed"),
+        "walletAddress": data.get("walletAddress"),
+        "identifier": data.get("identifier")
+    }
+
+
+def _task_rows(docs):
+    """NDJSON rows: a corrupted task becomes an error row instead of cutting the stream short."""
+    for doc in docs:
+        try:
+            yield _task_row(doc)
+        except HTTPException as e:
+            logging.warning("Skipping task %s in stream: %s", doc.id, e.detail)
+            yield {"taskId": doc.id, "error": e.detail}
+
+
 @router.get("/retrieveTasks/{wallet_address}")
-def get_task_logs(wallet_address: str):
+def get_task_logs(wallet_address: str, request: Request):
     """Return list of tasks for user."""
     if not wallet_address:
         raise HTTPException(status_code=404, detail="missing wallet_address")
 
     try:
+        # Generated tasks store the lowercased address; older tasks the address as given.
+        addresses = sorted({wallet_address, task_service.normalize_wallet(wallet_address)})
         query = db.collection('Task_logs') \
-            .where("walletAddress", "==", wallet_address) \
-            .get()
+            .where("walletAddress", "in", addresses)
+
+        if wants_ndjson(request):
+            return ndjson_response(_task_rows(query.stream()))
+
+        query = query.get()
 
         # If Firestore returns None (unexpected), treat as not found
         if query is None:
             raise HTTPException(status_code=404, detail="user/task not found")
 
-        tasks = []
-        for doc in query:
-            data = doc.to_dict()
-            if not data:
-                raise HTTPException(status_code=500, detail="corrupted task data")
-
-            # Use a simple dict format matching frontend expectations
-            tasks.append({
-                "eventId": data.get("eventId"),
-                "taskId": doc.id,
-                "taskTitle": data.get("taskTitle"),
-                "taskDescription": data.get("taskDescription"),
-                "taskRewards": data.get("taskRewards"),
-                "claimed": data.get("claimed"),
-                "walletAddress": data.get("walletAddress"),
-                "identifier": data.get("identifier")
-            })
+        tasks = [_task_row(doc) for doc in query]
 
         # Return tasks under `tasks` key (frontend expects `response.data.tasks`)
         return {"tasks": tasks}
@@ -138,11 +168,48 @@ def get_task_logs(wallet_address: str):
 
 
 #create / refresh set of tasks for users
+@router.post("/createTasks", status_code=202)
+def create_tasks_bulk(req: TaskGenerationRequest):
+    """Start generating this week's tasks for many wallets (all wallets when none are given)."""
+    try:
+        job = task_service.start_bulk(req.walletAddresses, req.period, req.templateIds)
+        return {**job, "statusUrl": f"/users/taskJobs/{job['jobId']}"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error creating tasks: {str(e)}")
+
+
+@router.get("/taskJobs/{job_id}")
+def get_task_job(job_id: str):
+    """Status and result of a bulk task generation job."""
+    try:
+        job = task_service.get_job(job_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error retrieving task job: {str(e)}")
+    if job is None:
+        raise HTTPException(status_code=404, detail="Task job not found.")
+    return job
+
+
 @router.post("/createTasks/{wallet_address}")
-def create_task(wallet_address: str):
-    """Create a new task for user."""
-    # TODO: implement task creation
-    raise HTTPException(status_code=501, detail="Not implemented")
+def create_task(wallet_address: str, req: TaskGenerationRequest | None = None):
+    """Create this week's tasks for user; tasks that already exist are skipped."""
+    if not wallet_address:
+        raise HTTPException(status_code=404, detail="missing wallet_address")
+
+    try:
+        req = req or TaskGenerationRequest()
+        return task_service.generate_for_wallet(wallet_address, req.period, req.templateIds)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error creating tasks: {str(e)}")
 
 
 @router.get("/claimTask/{task_id}")
@@ -160,3 +227,59 @@ def claim_task(task_id: str):
         logging.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error claiming task: {str(e)}")
     
+
+
+@router.post("/claimTasks/{wallet_address}")
+def claim_tasks(wallet_address: str, req: ClaimTasksRequest):
+    """Claim several tasks of a user at once."""
+    if not req.taskIds:
+        raise HTTPException(status_code=400, detail="taskIds is required.")
+
+    try:
+        result = task_service.claim_tasks(wallet_address, req.taskIds)
+        return {"message": f"{len(result['claimed'])} task(s) claimed.", **result}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error claiming tasks: {str(e)}")
+
+
+@router.get("/leaderboard")
+def get_leaderboard(limit: int = 10, offset: int = 0, by: str = "reputation"):
+    """Top wallets by reputation (or eventsJoined)."""
+    if by not in ORDERINGS:
+        raise HTTPException(status_code=400, detail=f"by must be one of: {', '.join(ORDERINGS)}")
+    limit = max(1, min(limit, 100))
+
+    try:
+        leaderboard.ensure_loaded()
+        total, entries = leaderboard.top(limit, max(offset, 0), by)
+        return {"by": by, "total": total, "offset": offset, "entries": entries}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error retrieving leaderboard: {str(e)}")
+
+
+@router.get("/leaderboard/rank/{wallet_address}")
+def get_leaderboard_rank(wallet_address: str, by: str = "reputation"):
+    """Rank of a wallet on the leaderboard."""
+    if by not in ORDERINGS:
+        raise HTTPException(status_code=400, detail=f"by must be one of: {', '.join(ORDERINGS)}")
+
+    try:
+        leaderboard.ensure_loaded()
+        entry = leaderboard.rank(wallet_address, by)
+        if entry is None:
+            raise HTTPException(status_code=404, detail="Wallet not found.")
+        return {"by": by, "total": len(leaderboard), **entry}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error retrieving rank: {str(e)}")
@@ -0,0 +1,232 @@
+"""Admission control: per-wallet / per-IP token buckets and per-route concurrency caps.
+
+An ``AdmissionController`` is attached to a router as a dependency in
+``create_app``::
+
+    app.include_router(
+        events.router, prefix="/events",
+        dependencies=[Depends(AdmissionController(AdmissionPolicy(...)), scope="function")],
+    )
+
+For every request it
+
+1. charges a token bucket keyed by the wallet address found in the path
+   params (``wallet_address``/``walletAddress``) and one keyed by client IP;
+2. takes a slot from the route's concurrency gate, waiting in a bounded
+   queue when the route is saturated. The slot is held while the handler
+   runs; with ``scope="function"`` it is released before a streamed body is
+   sent, so long exports and status streams do not hold it.
+
+Requests that run out of tokens, find the queue full or wait longer than
+``queue_timeout`` get ``429`` with ``Retry-After``. Gates live in the event
+loop, so shed requests never occupy a threadpool worker.
+
+Admission control is off unless ``ADMISSION_ENABLED`` is set. The per-IP
+bucket keys on the socket peer unless ``ADMISSION_TRUST_FORWARDED`` is set,
+in which case it keys on the first ``X-Forwarded-For`` address; behind a
+reverse proxy (Cloud Run, a load balancer) that setting is required, or all
+clients share the proxy's bucket.
+
+Buckets live in this process (``InMemoryBucketStore``) unless the app runs
+under the multi-worker launcher, where ``SharedBucketStore`` keeps them in
+the shared-memory cache so a limit holds across all workers. Concurrency
+gates are always per worker.
+"""
+import asyncio
+import math
+import struct
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+
+WALLET_PARAMS = ("wallet_address", "walletAddress")
+
+
+@dataclass(frozen=True)
+class AdmissionPolicy:
+    # Token buckets: sustained requests/second and burst size. 0 disables.
+    wallet_rate: float = 0
+    wallet_burst: int = 0
+    ip_rate: float = 0
+    ip_burst: int = 0
+    # Concurrency gate per route. 0 disables.
+    max_concurrency: int = 0
+    max_queue: int = 0
+    queue_timeout: float = 2.0
+    # Per-route overrides keyed by full route path, e.g. "/events/joinEvent/{event_id}/{wallet_address}".
+    routes: dict = field(default_factory=dict)
+
+    def for_route(self, path: str) -> "AdmissionPolicy":
+        override = self.routes.get(path)
+        return replace(self, routes={}, **override) if override else self
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, rate: float, burst: float, now: float) -> float:
+        """Take one token; return 0 on success or the seconds until one is available."""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class InMemoryBucketStore:
+    """Token buckets for this process, bounded to ``max_keys`` (least recently used evicted)."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(burst, now)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.take(rate, burst, now)
+
+
+class SharedBucketStore:
+    """Token buckets kept in a ``SharedCache`` and updated atomically across workers."""
+
+    _STATE = struct.Struct("<dd")  # tokens, updated (wall clock: shared between processes)
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.time()
+
+        def charge(raw):
+            bucket = TokenBucket(burst, now)
+            if raw is not None and len(raw) == self._STATE.size:
+                bucket.tokens, updated = self._STATE.unpack(raw)
+                bucket.updated = min(updated, now)
+            wait = bucket.take(rate, burst, now)
+            return self._STATE.pack(bucket.tokens, bucket.updated), wait
+
+        # An idle bucket refills completely in burst / rate seconds; after that it can be dropped.
+        return self.cache.update(f"bucket:{key}", charge, ttl=max(1.0, burst / rate) * 2)
+
+
+class _RouteGate:
+    def __init__(self, limit: int, max_queue: int, timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self) -> bool:
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            self.active += 1
+            return True
+        if self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+def _too_many(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionController:
+    def __init__(self, policy: AdmissionPolicy, store=None, trust_forwarded: bool = False):
+        self.policy = policy
+        self.store = store or InMemoryBucketStore()
+        self.trust_forwarded = trust_forwarded
+        self._gates: dict[str, _RouteGate] = {}
+        self.shed = 0
+        self.limited = 0
+
+    def _client_ip(self, request: HTTPConnection) -> str:
+        if self.trust_forwarded:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                return forwarded.split(",")[0].strip()
+        return request.client.host if request.client else "unknown"
+
+    def _charge(self, key: str, rate: float, burst: int, detail: str):
+        if rate <= 0:
+            return
+        wait = self.store.take(key, rate, max(burst, 1))
+        if wait > 0:
+            self.limited += 1
+            raise _too_many(detail, wait)
+
+    def _gate(self, path: str, policy: AdmissionPolicy) -> _RouteGate | None:
+        if policy.max_concurrency <= 0:
+            return None
+        gate = self._gates.get(path)
+        if gate is None:
+            gate = self._gates[path] = _RouteGate(policy.max_concurrency, policy.max_queue, policy.queue_timeout)
+        return gate
+
+    async def __call__(self, request: HTTPConnection):
+        route = request.scope.get("route")
+        path = getattr(route, "path", request.url.path)
+        policy = self.policy.for_route(path)
+
+        wallet = next((request.path_params[p] for p in WALLET_PARAMS if request.path_params.get(p)), None)
+        if wallet:
+            self._charge(f"wallet:{wallet.lower()}:{path}", policy.wallet_rate, policy.wallet_burst,
+                         "Too many requests for this wallet.")
+        self._charge(f"ip:{self._client_ip(request)}:{path}", policy.ip_rate, policy.ip_burst,
+                     "Too many requests from this address.")
+
+        gate = self._gate(path, policy)
+        if gate is None:
+            yield
+            return
+        if not await gate.acquire():
+            self.shed += 1
+            raise _too_many("Server is busy, please retry.", policy.queue_timeout)
+        try:
+            yield
+        finally:
+            gate.release()
+
+    def stats(self) -> dict:
+        return {
+            "limited": self.limited,
+            "shed": self.shed,
+            "routes": {
+                path: {"active": gate.active, "waiting": gate.waiting, "limit": gate.limit}
+                for path, gate in self._gates.items()
+            },
+        }
@@ -0,0 +1,142 @@
+"""Live check-in feed: ticket status changes pushed to event dashboards.
+
+Organizer dashboards and scanner stations subscribe to an event over
+WebSocket (``/events/attendees/{eventId}/live``) or server-sent events
+(``/events/attendees/{eventId}/stream``) instead of polling the attendee
+list. ``verifyTicket``, ``verifyTicketById`` and ``updateTicketStatus`` call
+``checkin_hub.publish_ticket`` after their write, and every subscriber of
+the event receives a compact delta::
+
+    {"type": "ticket", "seq": 42, "eventId": ..., "ticketId": ...,
+     "walletAddress": ..., "tierName": ..., "status": "checkedIn",
+     "previousStatus": "active", "checkedInAt": "2025-..."}
+
+``seq`` increases by one per delta of the event in this worker, so a client
+that sees a gap (or reconnects) reloads ``/events/attendees/{eventId}`` once
+and applies deltas from there.
+
+Publishing never waits for a client. Each subscription has a buffer of
+``CHECKIN_FEED_BUFFER`` messages filled from the publishing thread via the
+subscriber's event loop; a client that lets its buffer fill up is dropped
+(its connection ends with an ``overflow`` message) so it cannot hold memory
+or slow the others down.
+
+The hub is per process: under the multi-worker launcher a subscriber sees
+the check-ins handled by the worker it is connected to.
+"""
+import asyncio
+import datetime as dt
+import logging
+import threading
+
+from .. import config
+
+
+class Subscription:
+    def __init__(self, hub: "CheckinHub", event_id: str, loop: asyncio.AbstractEventLoop, buffer: int):
+        self.hub = hub
+        self.event_id = event_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer)
+        self.closed = False
+        self.dropped = False
+
+    def _offer(self, message: dict):
+        """Runs on the subscriber's loop."""
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logging.info("Dropping slow check-in feed subscriber of event %s", self.event_id)
+            self.dropped = True
+            self.hub.dropped += 1
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.hub.unsubscribe(self)
+        # Wake the reader; what it had not read yet is discarded.
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self, timeout: float) -> dict | None:
+        """Next message, or None on timeout or once the subscription is closed."""
+        if self.closed and self.queue.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class CheckinHub:
+    def __init__(self, buffer: int = config.CHECKIN_FEED_BUFFER):
+        self.buffer = buffer
+        self._lock = threading.Lock()
+        self._topics: dict[str, set[Subscription]] = {}
+        self._sequences: dict[str, int] = {}
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, event_id: str) -> Subscription:
+        """Subscribe the running event loop to ``event_id``'s deltas."""
+        subscription = Subscription(self, event_id, asyncio.get_running_loop(), self.buffer)
+        with self._lock:
+            self._topics.setdefault(event_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            topic = self._topics.get(subscription.event_id)
+            if topic is not None:
+                topic.discard(subscription)
+                if not topic:
+                    del self._topics[subscription.event_id]
+
+    def sequence(self, event_id: str) -> int:
+        """Seq of the last delta published for ``event_id`` (0 if none)."""
+        with self._lock:
+            return self._sequences.get(event_id, 0)
+
+    def publish(self, event_id: str, message: dict):
+        """Fan ``message`` out to the event's subscribers; safe to call from any thread."""
+        with self._lock:
+            seq = self._sequences[event_id] = self._sequences.get(event_id, 0) + 1
+            message = {**message, "seq": seq}
+            subscribers = list(self._topics.get(event_id, ()))
+        self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, message)
+            except RuntimeError:  # the subscriber's loop is gone
+                self.unsubscribe(subscription)
+
+    def publish_ticket(self, event_id: str, ticket_id: str, ticket: dict, status: str,
+                       previous_status: str | None = None, checked_in_at: dt.datetime | None = None):
+        """Publish the delta of a ticket whose status changed to ``status``."""
+        if previous_status == status:
+            return
+        checked_in_at = checked_in_at or ticket.get("checkedInAt")
+        self.publish(event_id, {
+            "type": "ticket",
+            "eventId": event_id,
+            "ticketId": ticket_id,
+            "walletAddress": ticket.get("walletAddress"),
+            "tierName": ticket.get("tierName"),
+            "status": status,
+            "previousStatus": previous_status,
+            "checkedInAt": checked_in_at.isoformat() if hasattr(checked_in_at, "isoformat") else checked_in_at,
+        })
+
+    def subscribers(self, event_id: str | None = None) -> int:
+        with self._lock:
+            if event_id is not None:
+                return len(self._topics.get(event_id, ()))
+            return sum(len(topic) for topic in self._topics.values())
+
+
+checkin_hub = CheckinHub()
@@ -0,0 +1,196 @@
+"""Per-request deadline budgets for Firestore and Storage calls.
+
+When ``REQUEST_DEADLINE_ENABLED`` is set (it is off by default), the
+``request_deadline`` middleware in ``create_app`` gives every HTTP request
+a ``Budget`` of ``REQUEST_DEADLINE`` seconds (``DEADLINE_ROUTES`` overrides
+it per route prefix). The budget lives in a context variable, so it
+follows the request into the threadpool. ``TracedProxy`` consults it on
+every backend call:
+
+- each attempt gets ``timeout=min(remaining budget, policy attempt timeout)``
+  and ``retry=None`` (the client library's own retry would ignore the
+  budget);
+- transient failures (unavailable, timeouts, 429, 5xx, dropped connections)
+  are retried with jittered backoff according to the operation's
+  ``RetryPolicy``: reads and idempotent writes are retried, writes that may
+  apply twice (``update`` with transforms, ``commit``, ``add``, ``create``)
+  are not;
+- once the budget is spent the call raises ``DeadlineExceeded``, a 503.
+
+Routes that turn every exception into a 500 cannot hide an exhausted
+budget: the middleware replaces their 5xx with the same 503. Outside a
+request (background jobs, queue consumers) calls are left to the library
+defaults.
+"""
+import contextvars
+import random
+import time
+from dataclasses import dataclass
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from .. import config
+
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self, detail: str = "Request deadline exceeded, please retry."):
+        super().__init__(status_code=503, detail=detail, headers={"Retry-After": "1"})
+
+
+def exceeded_response() -> JSONResponse:
+    error = DeadlineExceeded()
+    return JSONResponse(status_code=error.status_code, content={"detail": error.detail}, headers=error.headers)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int  # total attempts, 1 = no retry
+    attempt_timeout: float  # seconds, capped by the remaining budget
+    backoff: float = 0.05  # first backoff in seconds, doubled per retry
+    max_backoff: float = 1.0
+
+    def delay(self, retry: int) -> float:
+        # Full jitter: spread retries from concurrent requests.
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+
+
+READ_POLICY = RetryPolicy(config.DEADLINE_READ_ATTEMPTS, config.DEADLINE_READ_TIMEOUT)
+WRITE_POLICY = RetryPolicy(config.DEADLINE_WRITE_ATTEMPTS, config.DEADLINE_WRITE_TIMEOUT)
+UNSAFE_WRITE_POLICY = RetryPolicy(1, config.DEADLINE_WRITE_TIMEOUT)
+
+READ_OPS = {"get", "get_all", "get_blob", "exists", "reload", "download_as_bytes", "download_as_string",
+            "download_to_file"}
+# Repeating these leaves the same result: set/delete a document, upload to a fixed path
+# (``upload_from_file`` rewinds its stream before each attempt, see ``call_with_budget``).
+IDEMPOTENT_WRITE_OPS = {"set", "delete", "upload_from_string", "upload_from_file", "upload_from_filename",
+                        "make_public", "patch"}
+UNSAFE_WRITE_OPS = {"update", "commit", "add", "create"}
+# Ops whose client methods take ``timeout`` / ``retry`` keyword arguments.
+BUDGETED_OPS = READ_OPS | IDEMPOTENT_WRITE_OPS | UNSAFE_WRITE_OPS
+
+
+def policy_for(op: str) -> RetryPolicy:
+    if op in READ_OPS:
+        return READ_POLICY
+    if op in IDEMPOTENT_WRITE_OPS:
+        return WRITE_POLICY
+    return UNSAFE_WRITE_POLICY
+
+
+class Budget:
+    __slots__ = ("expires_at", "exhausted", "retries")
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+        self.exhausted = False
+        self.retries = 0
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def check(self) -> float:
+        """Remaining seconds; raises DeadlineExceeded when nothing is left."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            self.exhausted = True
+            raise DeadlineExceeded()
+        return remaining
+
+
+_current_budget: contextvars.ContextVar[Budget | None] = contextvars.ContextVar("deadline_budget", default=None)
+
+
+def start_budget(seconds: float) -> tuple[Budget, contextvars.Token]:
+    budget = Budget(seconds)
+    return budget, _current_budget.set(budget)
+
+
+def end_budget(token: contextvars.Token):
+    _current_budget.reset(token)
+
+
+def current_budget() -> Budget | None:
+    return _current_budget.get()
+
+
+def remaining() -> float | None:
+    """Seconds left in the current request's budget (None outside a request)."""
+    budget = _current_budget.get()
+    return None if budget is None else budget.remaining()
+
+
+def budget_for(path: str) -> float | None:
+    """Seconds allowed for a request to ``path``; None when it has no deadline."""
+    seconds = config.REQUEST_DEADLINE
+    for prefix, route_seconds in config.DEADLINE_ROUTES.items():
+        if path.startswith(prefix):
+            seconds = route_seconds
+            break
+    return seconds if seconds > 0 else None
+
+
+def _transient_errors() -> tuple:
+    errors = [ConnectionError, TimeoutError]
+    try:
+        from google.api_core import exceptions as gexc
+        errors += [gexc.ServiceUnavailable, gexc.InternalServerError, gexc.TooManyRequests,
+                   gexc.DeadlineExceeded, gexc.GatewayTimeout, gexc.BadGateway]
+    except ImportError:
+        pass
+    try:
+        import requests
+        errors += [requests.ConnectionError, requests.Timeout]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+_TRANSIENT: tuple | None = None
+
+
+def is_transient(exc: Exception) -> bool:
+    global _TRANSIENT
+    if _TRANSIENT is None:
+        _TRANSIENT = _transient_errors()
+    return isinstance(exc, _TRANSIENT)
+
+
+def _upload_stream(args: tuple, kwargs: dict):
+    """Return (stream, start offset) of an ``upload_from_file`` call; offset None if it cannot seek."""
+    stream = args[0] if args else kwargs.get("file_obj")
+    try:
+        return stream, stream.tell() if stream.seekable() else None
+    except (AttributeError, OSError):
+        return stream, None
+
+
+def call_with_budget(budget: Budget, op: str, fn, args: tuple, kwargs: dict):
+    """Run a backend call within ``budget``, retrying transient errors per the op's policy."""
+    policy = policy_for(op)
+    # Transactions retry as a whole; their reads are not retried one by one.
+    attempts = 1 if kwargs.get("transaction") is not None else policy.attempts
+    stream, start = _upload_stream(args, kwargs) if op == "upload_from_file" else (None, None)
+    if op == "upload_from_file" and start is None:
+        attempts = 1  # a retry would upload from wherever the failed attempt stopped
+    attempt = 0
+    while True:
+        if start is not None:
+            stream.seek(start)
+        call_kwargs = dict(kwargs)
+        call_kwargs.setdefault("timeout", min(budget.check(), policy.attempt_timeout))
+        call_kwargs.setdefault("retry", None)
+        try:
+            return fn(*args, **call_kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            delay = policy.delay(attempt)
+            attempt += 1
+            if budget.remaining() <= (delay if attempt < attempts else 0):
+                budget.exhausted = True
+                raise DeadlineExceeded() from e
+            if attempt >= attempts:
+                raise
+            budget.retries += 1
+            time.sleep(delay)
@@ -0,0 +1,277 @@
+"""In-process search index over the Events collection.
+
+- inverted token index on ``title`` and ``description`` (title hits weigh more)
+- sorted ``(timestamp, id)`` arrays on ``startDate`` / ``endDate`` for ranges
+- hash maps on ``status`` and ``hostAddress``
+
+The index is built from one scan of ``Events`` on first use, kept current by
+``upsert`` / ``update_tiers`` from the write endpoints, and rebuilt after
+``EVENT_INDEX_TTL`` seconds to pick up writes made elsewhere. Workers that
+share a cache also rebuild as soon as another worker bumps ``NAMESPACE``.
+"""
+import bisect
+import datetime as dt
+import re
+import threading
+import time
+
+from .. import config
+from .shared_cache import shared_cache
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+
+def tokenize(text) -> list[str]:
+    return _TOKEN_RE.findall(str(text or "").lower())
+
+
+def _timestamp(value) -> float | None:
+    if value is None:
+        return None
+    if hasattr(value, "to_datetime"):
+        value = value.to_datetime()
+    if isinstance(value, str):
+        try:
+            value = dt.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, dt.datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt.timezone.utc)
+    return value.timestamp()
+
+
+class EventIndex:
+    NAMESPACE = "event-index"
+
+    def __init__(self, ttl: float = config.EVENT_INDEX_TTL):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._built_at: float | None = None
+        self._generation = 0
+        self._clear()
+
+    def _clear(self):
+        self._docs: dict[str, dict] = {}
+        self._postings: dict[str, dict[str, int]] = {}
+        self._vocabulary: list[str] = []  # sorted, for prefix lookups
+        self._doc_tokens: dict[str, dict[str, int]] = {}
+        self._by_status: dict[str, set[str]] = {}
+        self._by_host: dict[str, set[str]] = {}
+        self._by_start: list[tuple[float, str]] = []
+        self._by_end: list[tuple[float, str]] = []
+        self._keys: dict[str, tuple[float | None, float | None, str, str]] = {}
+
+    @property
+    def built(self) -> bool:
+        return self._built_at is not None
+
+    def __len__(self):
+        return len(self._docs)
+
+    # -- building ---------------------------------------------------------
+
+    def rebuild(self, docs):
+        """Replace the index contents with ``docs`` (iterable of (id, data))."""
+        with self._lock:
+            self._clear()
+            self._generation = shared_cache.generation(self.NAMESPACE)
+            for event_id, data in docs:
+                self._add(event_id, data, bulk=True)
+            self._vocabulary.sort()
+            self._by_start.sort()
+            self._by_end.sort()
+            self._built_at = time.monotonic()
+
+    def ensure_built(self, loader):
+        """Build (or refresh after the TTL or a bump from another worker) using ``loader()``."""
+        with self._lock:
+            fresh = (
+                self.built
+                and (self.ttl <= 0 or time.monotonic() - self._built_at < self.ttl)
+                and shared_cache.generation(self.NAMESPACE) == self._generation
+            )
+            if not fresh:
+                self.rebuild(loader())
+
+    def publish_change(self):
+        """Make other workers rebuild their index; this one is already up to date."""
+        generation = shared_cache.bump(self.NAMESPACE)
+        with self._lock:
+            if self.built and self._generation == generation - 1:
+                self._generation = generation
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    # -- incremental updates ----------------------------------------------
+
+    def upsert(self, event_id: str, data: dict):
+        """Index a new or changed event. No-op until the index has been built."""
+        with self._lock:
+            if not self.built:
+                return
+            self._remove(event_id)
+            self._add(event_id, data)
+
+    def update_tiers(self, event_id: str, ticket_tiers: list):
+        """Refresh the stored tiers of an event (tiers are not searchable)."""
+        with self._lock:
+            if event_id in self._docs:
+                self._docs[event_id] = {**self._docs[event_id], "ticketTiers": ticket_tiers}
+
+    def apply_change(self, kind: str, event_id: str | None, raw):
+        """Replica listener: keep the index in step with the Events snapshot stream."""
+        if kind == "reset":
+            self.rebuild(raw)
+        elif kind == "upsert":
+            self.upsert(event_id, raw)
+        elif kind == "remove":
+            self.remove(event_id)
+
+    def remove(self, event_id: str):
+        with self._lock:
+            self._remove(event_id)
+
+    def get(self, event_id: str) -> dict | None:
+        return self._docs.get(event_id)
+
+    def _add(self, event_id: str, data: dict, bulk: bool = False):
+        # In bulk mode the sorted arrays are appended to and sorted once by rebuild().
+        insert = list.append if bulk else bisect.insort
+        self._docs[event_id] = data
+
+        counts: dict[str, int] = {}
+        for token in tokenize(data.get("title")):
+            counts[token] = counts.get(token, 0) + TITLE_WEIGHT
+        for token in tokenize(data.get("description")):
+            counts[token] = counts.get(token, 0) + DESCRIPTION_WEIGHT
+        self._doc_tokens[event_id] = counts
+        for token, weight in counts.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                insert(self._vocabulary, token)
+            postings[event_id] = weight
+
+        status = str(data.get("status") or "")
+        host = str(data.get("hostAddress") or "").lower()
+        self._by_status.setdefault(status, set()).add(event_id)
+        self._by_host.setdefault(host, set()).add(event_id)
+
+        start = _timestamp(data.get("startDate"))
+        end = _timestamp(data.get("endDate"))
+        if start is not None:
+            insert(self._by_start, (start, event_id))
+        if end is not None:
+            insert(self._by_end, (end, event_id))
+        self._keys[event_id] = (start, end, status, host)
+
+    def _remove(self, event_id: str):
+        if event_id not in self._docs:
+            return
+        del self._docs[event_id]
+
+        for token in self._doc_tokens.pop(event_id, {}):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(event_id, None)
+            if not postings:
+                del self._postings[token]
+                i = bisect.bisect_left(self._vocabulary, token)
+                if i < len(self._vocabulary) and self._vocabulary[i] == token:
+                    del self._vocabulary[i]
+
+        start, end, status, host = self._keys.pop(event_id)
+        self._by_status.get(status, set()).discard(event_id)
+        self._by_host.get(host, set()).discard(event_id)
+        for array, key in ((self._by_start, start), (self._by_end, end)):
+            if key is None:
+                continue
+            i = bisect.bisect_left(array, (key, event_id))
+            if i < len(array) and array[i] == (key, event_id):
+                del array[i]
+
+    # -- queries ----------------------------------------------------------
+
+    def _token_matches(self, term: str) -> dict[str, int]:
+        """Postings for every indexed token starting with ``term`` (best weight per event)."""
+        matches: dict[str, int] = {}
+        i = bisect.bisect_left(self._vocabulary, term)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(term):
+            token = self._vocabulary[i]
+            # Exact token hits rank above prefix hits.
+            bonus = 1 if token == term else 0
+            for event_id, weight in self._postings[token].items():
+                score = weight + bonus
+                if score > matches.get(event_id, 0):
+                    matches[event_id] = score
+            i += 1
+        return matches
+
+    @staticmethod
+    def _range(array, low: float | None, high: float | None) -> set[str]:
+        lo = 0 if low is None else bisect.bisect_left(array, (low, ""))
+        hi = len(array) if high is None else bisect.bisect_right(array, (high, "\uffff"))
+        return {event_id for _, event_id in array[lo:hi]}
+
+    def search(
+        self,
+        q: str | None = None,
+        status: str | None = None,
+        host: str | None = None,
+        start_after=None,
+        start_before=None,
+        end_after=None,
+        end_before=None,
+        page: int = 1,
+        page_size: int = 20,
+    ) -> tuple[int, list[tuple[str, dict]]]:
+        """Return (total matches, page of (event_id, data)) ranked by relevance then start date."""
+        with self._lock:
+            candidates: set[str] | None = None
+
+            def narrow(ids: set[str]):
+                nonlocal candidates
+                candidates = set(ids) if candidates is None else candidates & ids
+
+            if status:
+                narrow(self._by_status.get(status, set()))
+            if host:
+                narrow(self._by_host.get(host.lower(), set()))
+            if start_after is not None or start_before is not None:
+                narrow(self._range(self._by_start, _timestamp(start_after), _timestamp(start_before)))
+            if end_after is not None or end_before is not None:
+                narrow(self._range(self._by_end, _timestamp(end_after), _timestamp(end_before)))
+
+            scores: dict[str, int] = {}
+            terms = tokenize(q)
+            if terms:
+                for term in terms:
+                    matches = self._token_matches(term)
+                    narrow(set(matches))
+                    for event_id, score in matches.items():
+                        scores[event_id] = scores.get(event_id, 0) + score
+
+            if candidates is None:
+                candidates = set(self._docs)
+
+            far_future = float("inf")
+            ranked = sorted(
+                candidates,
+                key=lambda event_id: (
+                    -scores.get(event_id, 0),
+                    self._keys[event_id][0] if self._keys[event_id][0] is not None else far_future,
+                    event_id,
+                ),
+            )
+            start = (max(page, 1) - 1) * page_size
+            return len(ranked), [(event_id, self._docs[event_id]) for event_id in ranked[start:start + page_size]]
+
+
+event_index = EventIndex()
@@ -0,0 +1,200 @@
+"""Hot/archived partitioning of the Events collection.
+
+Finished events stay in ``Events`` (tickets, ``getEventById`` and check-in
+keep working) but are moved out of the default listing:
+
+- ``archive_finished`` sets ``status`` to "archived" (the old status is kept
+  in ``statusBeforeArchive``) on events whose ``endDate`` is more than
+  ``EVENT_ARCHIVE_AFTER_HOURS`` in the past, 500 updates per batch;
+- ``refresh_summary`` stores the encoded ``listEvents`` body of the
+  non-archived events in ``Event_summaries/active``, so ``listEvents`` is one
+  document read whose body is sent as is.
+
+All of this is opt-in (``EVENT_LIFECYCLE_ENABLED``); while it is off
+``listEvents`` queries every event as before. When enabled,
+``run_scheduled`` runs both from the app lifespan: the summary every
+``EVENT_SUMMARY_INTERVAL`` seconds, archiving every
+``EVENT_ARCHIVE_INTERVAL``. Under the multi-worker launcher one worker at a
+time holds the job lease. Tier sold counts in the summary can therefore lag
+by up to one interval (60s by default); ``create_event`` refreshes it right
+away, joins do not. ``listEvents`` ignores a summary older than
+``EVENT_SUMMARY_MAX_AGE`` and queries the live events instead.
+
+Archived events are listed, newest first, by ``archivedEvents``; that query
+needs a composite index on (status, endDate desc).
+"""
+import asyncio
+import datetime as dt
+import logging
+import os
+import threading
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from .. import config
+from .event_index import event_index
+from .firebase import db
+from .serialization import dumps, event_to_dict
+from .shared_cache import shared_cache, EVENT_KEY
+
+COLLECTION_NAME = "Events"
+SUMMARY_COLLECTION = "Event_summaries"
+ACTIVE_SUMMARY_ID = "active"
+ARCHIVED_STATUS = "archived"
+MAX_BATCH_WRITES = 500
+# Firestore documents are limited to 1 MiB; past this the listing is queried instead.
+MAX_SUMMARY_BYTES = 900 * 1024
+LEASE_KEY = "lease:event-lifecycle"
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def summary_ref():
+    return db.collection(SUMMARY_COLLECTION).document(ACTIVE_SUMMARY_ID)
+
+
+def active_query():
+    if not config.EVENT_LIFECYCLE_ENABLED:
+        # Nothing is archived; a != filter would also drop events without a status.
+        return db.collection(COLLECTION_NAME)
+    return db.collection(COLLECTION_NAME).where("status", "!=", ARCHIVED_STATUS)
+
+
+def archive_finished(now: dt.datetime | None = None) -> list[str]:
+    """Archive events that ended more than ``EVENT_ARCHIVE_AFTER_HOURS`` ago; return their IDs."""
+    now = now or _now()
+    cutoff = now - dt.timedelta(hours=config.EVENT_ARCHIVE_AFTER_HOURS)
+    finished = db.collection(COLLECTION_NAME).where("endDate", "<", cutoff).select(["status"]).stream()
+
+    archived, batch = [], db.batch()
+    for doc in finished:
+        status = (doc.to_dict() or {}).get("status")
+        if status == ARCHIVED_STATUS:
+            continue
+        batch.update(db.collection(COLLECTION_NAME).document(doc.id), {
+            "status": ARCHIVED_STATUS,
+            "statusBeforeArchive": status,
+            "archivedAt": now,
+        })
+        archived.append(doc.id)
+        if len(archived) % MAX_BATCH_WRITES == 0:
+            batch.commit()
+            batch = db.batch()
+    if len(archived) % MAX_BATCH_WRITES:
+        batch.commit()
+
+    if archived:
+        for event_id in archived:
+            shared_cache.delete(EVENT_KEY.format(event_id))
+        event_index.invalidate()
+        event_index.publish_change()
+        logging.info("Archived %d finished event(s)", len(archived))
+    return archived
+
+
+def refresh_summary() -> dict:
+    """Rewrite ``Event_summaries/active`` from the non-archived events."""
+    events = sorted(
+        (event_to_dict(doc.id, doc.to_dict() or {}) for doc in active_query().stream()),
+        key=lambda event: event["event_id"],
+    )
+    body = dumps({"events": events})
+    if len(body) > MAX_SUMMARY_BYTES:
+        logging.warning("Active events summary is %d bytes; listEvents will query instead", len(body))
+        summary_ref().delete()
+        return {"events": len(events), "bytes": len(body), "stored": False}
+    summary_ref().set({"body": body.decode("utf-8"), "count": len(events), "refreshedAt": _now()})
+    return {"events": len(events), "bytes": len(body), "stored": True}
+
+
+def load_summary() -> tuple[bytes, object] | None:
+    """(encoded listEvents body, update time) of a current summary, else None."""
+    if not config.EVENT_LIFECYCLE_ENABLED:
+        return None
+    snapshot = summary_ref().get()
+    data = snapshot.to_dict() if snapshot.exists else None
+    if not data or "body" not in data:
+        return None
+    refreshed_at = data.get("refreshedAt")
+    if hasattr(refreshed_at, "timestamp"):
+        if refreshed_at.tzinfo is None:
+            refreshed_at = refreshed_at.replace(tzinfo=dt.timezone.utc)
+        if (_now() - refreshed_at).total_seconds() > config.EVENT_SUMMARY_MAX_AGE:
+            return None
+    return data["body"].encode("utf-8"), snapshot.update_time or refreshed_at
+
+
+def list_archived(page_size: int = 20, cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """One page of archived events, most recently ended first, and the cursor of the next page."""
+    query = db.collection(COLLECTION_NAME) \
+        .where("status", "==", ARCHIVED_STATUS) \
+        .order_by("endDate", direction="DESCENDING")
+    if cursor:
+        snapshot = db.collection(COLLECTION_NAME).document(cursor).get()
+        if not snapshot.exists:
+            raise ValueError("Unknown cursor.")
+        query = query.start_after(snapshot)
+    docs = query.limit(page_size).get()
+    events = [event_to_dict(doc.id, doc.to_dict() or {}) for doc in docs]
+    return events, (docs[-1].id if len(docs) == page_size else None)
+
+
+# -- scheduling -------------------------------------------------------------
+
+_refreshing = threading.Lock()
+
+
+def _refresh_in_background():
+    try:
+        refresh_summary()
+    except Exception:
+        logging.error("Active events summary refresh failed", exc_info=True)
+    finally:
+        _refreshing.release()
+
+
+def refresh_summary_soon():
+    """Refresh the summary in a background thread (skipped if one is already running)."""
+    if not config.EVENT_LIFECYCLE_ENABLED:
+        return
+    if _refreshing.acquire(blocking=False):
+        threading.Thread(target=_refresh_in_background, name="event-summary", daemon=True).start()
+
+
+def _take_lease(ttl: float) -> bool:
+    """Only one worker sharing the cache runs the job per interval."""
+    if not shared_cache.shared:
+        return True
+    me = str(os.getpid()).encode()
+
+    def claim(holder):
+        if holder is None or holder == me:
+            return me, True
+        return holder, False
+
+    return shared_cache.update(LEASE_KEY, claim, ttl=ttl)
+
+
+def run_once(archive: bool) -> dict:
+    result = {"archived": archive_finished() if archive else []}
+    result["summary"] = refresh_summary()
+    return result
+
+
+async def run_scheduled():
+    """Lifespan task: refresh the summary every interval and archive when due."""
+    next_archive = 0.0
+    while True:
+        interval = config.EVENT_SUMMARY_INTERVAL
+        if _take_lease(interval * 2):
+            archive = time.monotonic() >= next_archive
+            try:
+                await run_in_threadpool(run_once, archive)
+                if archive:
+                    next_archive = time.monotonic() + config.EVENT_ARCHIVE_INTERVAL
+            except Exception:
+                logging.error("Event lifecycle job failed", exc_info=True)
+        await asyncio.sleep(interval)
@@ -0,0 +1,236 @@
+"""Local replica of the Events collection fed by a Firestore snapshot listener.
+
+When ``EVENTS_REPLICA_ENABLED`` is set, ``start()`` subscribes to
+``Events.on_snapshot``. The first callback carries every document and resets
+the replica; later callbacks carry only the changed documents, which are
+applied incrementally. Reads are served from memory while the listener is
+healthy and the apply lag stays under ``EVENTS_REPLICA_MAX_STALENESS``;
+otherwise ``is_fresh()`` is False and callers fall back to direct reads while
+the listener is restarted and resynced.
+
+A listener can also stall without reporting an error, so the lag is
+measured from ``read_time``: the time of the latest consistent snapshot the
+watch stream delivered. Firestore invokes the callback only when documents
+change, but the stream keeps confirming snapshots (``Watch.push``) while
+the collection is quiet; ``_subscribe`` records those read times too. While
+the latest read time is more than ``EVENTS_REPLICA_MAX_SILENCE`` seconds
+old, reads fall back to Firestore without resyncing; the library resumes
+the stream itself. Only a stream that is down, or silent for
+``STALL_RESYNC_FACTOR`` times that long, is resubscribed (a full read).
+"""
+import datetime as dt
+import logging
+import threading
+import time
+
+from .. import config
+from .serialization import event_to_dict
+
+# A stream silent this many times the max silence is presumed wedged and resubscribed.
+STALL_RESYNC_FACTOR = 10
+
+
+def _as_datetime(read_time) -> dt.datetime:
+    if hasattr(read_time, "to_datetime"):
+        read_time = read_time.to_datetime()
+    if read_time.tzinfo is None:
+        read_time = read_time.replace(tzinfo=dt.timezone.utc)
+    return read_time
+
+
+class EventReplica:
+    def __init__(self, max_staleness: float = config.EVENTS_REPLICA_MAX_STALENESS,
+                 max_silence: float = config.EVENTS_REPLICA_MAX_SILENCE):
+        self.max_staleness = max_staleness
+        self.max_silence = max_silence
+        self._lock = threading.RLock()
+        self._docs: dict[str, tuple[dict, dict, object]] = {}  # id -> (raw, decoded, update_time)
+        self._items: list | None = None  # sorted view of _docs, rebuilt after changes
+        self._collection = None
+        self._watch = None
+        self._synced = False
+        self._listeners = []
+        self._lag = 0.0  # apply lag of the last callback
+        self._last_change_at: float | None = None
+        self._read_time: dt.datetime | None = None  # latest consistent snapshot of the stream
+        self._resyncs = 0
+        self._next_restart = 0.0
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def start(self, collection_ref):
+        """Subscribe to ``collection_ref``; reads stay direct until the first snapshot."""
+        with self._lock:
+            self._collection = collection_ref
+            self._subscribe()
+
+    def stop(self):
+        with self._lock:
+            watch, self._watch = self._watch, None
+            self._collection = None
+            self._synced = False
+        if watch is not None:
+            watch.unsubscribe()
+
+    def _subscribe(self):
+        self._synced = False
+        self._read_time = None
+        watch = self._collection.on_snapshot(self._on_snapshot)
+        push = getattr(watch, "push", None)
+        if push is not None:
+            # Watch.push runs for every consistent snapshot, with or without changes.
+            def push_tracked(read_time, resume_token):
+                self._observe(read_time)
+                return push(read_time, resume_token)
+            watch.push = push_tracked
+        self._watch = watch
+
+    def _restart(self, reason: str = "is down"):
+        """Drop a dead listener and resubscribe (rate-limited)."""
+        now = time.monotonic()
+        if self._collection is None or now < self._next_restart:
+            return
+        self._next_restart = now + 5.0
+        self._resyncs += 1
+        logging.warning("Events replica listener %s; resyncing", reason)
+        old = self._watch
+        try:
+            self._subscribe()
+        except Exception:
+            logging.error("Events replica resubscribe failed", exc_info=True)
+            return
+        if old is not None:
+            try:
+                old.unsubscribe()
+            except Exception:
+                pass
+
+    def add_listener(self, callback):
+        """Call ``callback(kind, event_id, raw)`` on every applied change.
+
+        ``kind`` is "reset" after a full sync (``raw`` is then the list of
+        ``(event_id, raw)`` pairs), then "upsert" or "remove" per document.
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    # -- snapshot handling ----------------------------------------------------
+
+    def _on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            if not self._synced:
+                self._docs = {}
+                for snapshot in docs:
+                    self._store(snapshot)
+                self._synced = True
+                self._notify("reset", None, [(event_id, raw) for event_id, (raw, _, _) in self._docs.items()])
+            else:
+                for change in changes:
+                    snapshot = change.document
+                    if change.type.name == "REMOVED":
+                        self._docs.pop(snapshot.id, None)
+                        self._notify("remove", snapshot.id, None)
+                    else:
+                        raw = self._store(snapshot)
+                        self._notify("upsert", snapshot.id, raw)
+            self._items = None
+            self._last_change_at = time.monotonic()
+            self._lag = self._lag_behind(read_time)
+            self._observe(read_time)
+
+    def _store(self, snapshot) -> dict:
+        raw = snapshot.to_dict() or {}
+        self._docs[snapshot.id] = (raw, event_to_dict(snapshot.id, raw), snapshot.update_time)
+        return raw
+
+    def _notify(self, kind, event_id, raw):
+        for callback in self._listeners:
+            try:
+                callback(kind, event_id, raw)
+            except Exception:
+                logging.error("Events replica listener failed", exc_info=True)
+
+    def _observe(self, read_time):
+        # Called from the stream thread without the lock: a single assignment.
+        if read_time is not None:
+            read_time = _as_datetime(read_time)
+            if self._read_time is None or read_time > self._read_time:
+                self._read_time = read_time
+
+    @staticmethod
+    def _lag_behind(read_time) -> float:
+        if read_time is None:
+            return 0.0
+        return max(0.0, (dt.datetime.now(dt.timezone.utc) - _as_datetime(read_time)).total_seconds())
+
+    # -- reads ----------------------------------------------------------------
+
+    @property
+    def enabled(self) -> bool:
+        return self._collection is not None
+
+    def _healthy(self) -> bool:
+        return self._watch is not None and getattr(self._watch, "is_active", True)
+
+    def lag(self) -> float:
+        """Seconds between now and the latest consistent snapshot of the stream (0 before the first)."""
+        return self._lag_behind(self._read_time)
+
+    def _fresh(self) -> bool:
+        return (self.enabled and self._healthy() and self._synced
+                and self._lag <= self.max_staleness and self.lag() <= self.max_silence)
+
+    def is_fresh(self) -> bool:
+        """True when reads may be served from the replica."""
+        with self._lock:
+            if not self.enabled:
+                return False
+            if not self._healthy():
+                self._restart()
+                return False
+            lag = self.lag()
+            if self._synced and lag > self.max_silence * STALL_RESYNC_FACTOR:
+                self._restart(f"has confirmed nothing for {lag:.0f}s")
+                return False
+            return self._fresh()
+
+    def get(self, event_id: str) -> tuple[dict, object] | None:
+        """Return (decoded event, update_time) or None when the replica does not have it."""
+        entry = self._docs.get(event_id)
+        return (entry[1], entry[2]) if entry else None
+
+    def items(self) -> list[tuple[str, dict, object]]:
+        """Return [(event_id, decoded event, update_time)] in document id order, like a collection get."""
+        with self._lock:
+            if self._items is None:
+                self._items = [
+                    (event_id, decoded, update_time)
+                    for event_id, (_, decoded, update_time) in sorted(self._docs.items())
+                ]
+            return self._items
+
+    def raw_items(self) -> list[tuple[str, dict]]:
+        with self._lock:
+            return [(event_id, raw) for event_id, (raw, _, _) in self._docs.items()]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "synced": self._synced,
+                "healthy": self._healthy(),
+                "fresh": self._fresh(),
+                "documents": len(self._docs),
+                "lag_seconds": round(self.lag(), 3),
+                "apply_lag_seconds": round(self._lag, 3),
+                "max_staleness_seconds": self.max_staleness,
+                "max_silence_seconds": self.max_silence,
+                "read_time": self._read_time.isoformat() if self._read_time else None,
+                "seconds_since_last_change": (
+                    round(time.monotonic() - self._last_change_at, 3) if self._last_change_at else None
+                ),
+                "resyncs": self._resyncs,
+            }
+
+
+event_replica = EventReplica()
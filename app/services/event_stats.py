@@ -0,0 +1,229 @@
+"""Materialized per-event sales and check-in aggregates.
+
+Running totals are split over ``EVENT_STATS_SHARDS`` shard documents,
+``EventStats/{event_id}/shards/{n}``. Each sale or check-in bumps one shard
+picked at random with Firestore ``Increment`` transforms, so a drop or a
+check-in rush spreads its writes instead of hitting one document. The
+increments are staged in the same ``WriteBatch`` as the ticket write they
+count (``stage_*``), which costs no extra round trip. ``EventStats/{event_id}``
+itself holds the base written by ``rebuild()``:
+
+    {
+        "eventId": "...",
+        "sold": 120, "revenue": 340.0, "checkedIn": 87,
+        "tiers": {"General": {"sold": 100, "revenue": 0.0, "checkedIn": 80}, ...},
+        "checkinsPerMinute": {"202610191205": 4, ...},
+        "updatedAt": <server timestamp>,
+    }
+
+``get_stats`` reads the base and every shard with one ``get_all`` and sums
+them. Per-minute buckets older than ``EVENT_STATS_MINUTES_KEPT`` are
+deleted from the documents it read, and ``rebuild()`` recomputes the base
+from the Tickets collection (dropping the shards) to backfill or repair it.
+"""
+import datetime as dt
+import logging
+import random
+
+from .. import config
+from .firebase import db
+
+COLLECTION_NAME = "EventStats"
+SHARDS_COLLECTION = "shards"
+MINUTE_FORMAT = "%Y%m%d%H%M"
+
+
+def _minute_key(at: dt.datetime | None = None) -> str:
+    at = at or dt.datetime.now(dt.timezone.utc)
+    if at.tzinfo is not None:
+        at = at.astimezone(dt.timezone.utc)
+    return at.strftime(MINUTE_FORMAT)
+
+
+def _shard_refs(event_id: str) -> list:
+    shards = db.collection(COLLECTION_NAME).document(event_id).collection(SHARDS_COLLECTION)
+    return [shards.document(str(n)) for n in range(max(1, config.EVENT_STATS_SHARDS))]
+
+
+def stage(batch, event_id: str, changes: dict):
+    """Add ``changes`` (increment fields) for ``event_id`` to a WriteBatch, on a random shard."""
+    from google.cloud.firestore import SERVER_TIMESTAMP
+
+    batch.set(random.choice(_shard_refs(event_id)), {**changes, "updatedAt": SERVER_TIMESTAMP}, merge=True)
+
+
+def sale_changes(tier_name: str | None, price: float | None, count: int = 1) -> dict:
+    """Increment fields for ``count`` tickets sold in ``tier_name`` at ``price``."""
+    from google.cloud.firestore import Increment
+
+    revenue = float(price or 0) * count
+    return {
+        "sold": Increment(count),
+        "revenue": Increment(revenue),
+        "tiers": {str(tier_name or ""): {"sold": Increment(count), "revenue": Increment(revenue)}},
+    }
+
+
+def checkin_changes(tier_name: str | None, delta: int = 1, at: dt.datetime | None = None) -> dict:
+    """Increment fields for a check-in (``delta=1``) or an undone check-in (``delta=-1``)."""
+    from google.cloud.firestore import Increment
+
+    changes = {
+        "checkedIn": Increment(delta),
+        "tiers": {str(tier_name or ""): {"checkedIn": Increment(delta)}},
+    }
+    if delta > 0:
+        changes["checkinsPerMinute"] = {_minute_key(at): Increment(delta)}
+    return changes
+
+
+def stage_sales(batch, event_id: str, sales: list[tuple[str | None, float | None]]):
+    """Add one merged increment for ``sales`` ([(tier_name, price), ...]) to a WriteBatch."""
+    from google.cloud.firestore import Increment
+
+    tiers: dict[str, list] = {}
+    for tier_name, price in sales:
+        totals = tiers.setdefault(str(tier_name or ""), [0, 0.0])
+        totals[0] += 1
+        totals[1] += float(price or 0)
+    stage(batch, event_id, {
+        "sold": Increment(len(sales)),
+        "revenue": Increment(sum(revenue for _, revenue in tiers.values())),
+        "tiers": {
+            name: {"sold": Increment(count), "revenue": Increment(revenue)}
+            for name, (count, revenue) in tiers.items()
+        },
+    })
+
+
+def stage_checkin(batch, event_id: str, tier_name: str | None, delta: int = 1, at: dt.datetime | None = None):
+    stage(batch, event_id, checkin_changes(tier_name, delta, at))
+
+
+def stage_status_change(batch, event_id: str, tier_name: str | None, old_status: str | None,
+                        new_status: str | None):
+    """Keep ``checkedIn`` in step when a ticket's status is set directly."""
+    if old_status != "checkedIn" and new_status == "checkedIn":
+        stage_checkin(batch, event_id, tier_name, 1)
+    elif old_status == "checkedIn" and new_status != "checkedIn":
+        stage_checkin(batch, event_id, tier_name, -1)
+
+
+def _as_datetime(value):
+    if hasattr(value, "to_datetime"):
+        value = value.to_datetime()
+    return value if isinstance(value, dt.datetime) else None
+
+
+def compute(event_id: str, tickets) -> dict:
+    """Aggregate ``tickets`` (iterable of ticket dicts) into a stats document."""
+    stats = {
+        "eventId": event_id,
+        "sold": 0,
+        "revenue": 0.0,
+        "checkedIn": 0,
+        "tiers": {},
+        "checkinsPerMinute": {},
+    }
+    for ticket in tickets:
+        tier = stats["tiers"].setdefault(
+            str(ticket.get("tierName") or ""), {"sold": 0, "revenue": 0.0, "checkedIn": 0}
+        )
+        price = float(ticket.get("priceBought") or 0)
+        stats["sold"] += 1
+        stats["revenue"] += price
+        tier["sold"] += 1
+        tier["revenue"] += price
+        if ticket.get("status") == "checkedIn":
+            stats["checkedIn"] += 1
+            tier["checkedIn"] += 1
+            checked_in_at = _as_datetime(ticket.get("checkedInAt"))
+            if checked_in_at is not None:
+                key = _minute_key(checked_in_at)
+                stats["checkinsPerMinute"][key] = stats["checkinsPerMinute"].get(key, 0) + 1
+    return stats
+
+
+def _cutoff() -> str:
+    """Per-minute buckets at or before this key are no longer kept."""
+    return _minute_key(dt.datetime.now(dt.timezone.utc) - dt.timedelta(minutes=config.EVENT_STATS_MINUTES_KEPT))
+
+
+def rebuild(event_id: str) -> dict:
+    """Recompute and overwrite the stats of ``event_id`` from its tickets."""
+    from google.cloud.firestore import SERVER_TIMESTAMP
+
+    tickets = (
+        doc.to_dict() or {}
+        for doc in db.collection("Tickets").where("eventId", "==", event_id).stream()
+    )
+    stats = compute(event_id, tickets)
+    cutoff = _cutoff()
+    stats["checkinsPerMinute"] = {k: v for k, v in stats["checkinsPerMinute"].items() if k > cutoff}
+    batch = db.batch()
+    batch.set(db.collection(COLLECTION_NAME).document(event_id), {**stats, "updatedAt": SERVER_TIMESTAMP})
+    for ref in _shard_refs(event_id):
+        batch.delete(ref)
+    batch.commit()
+    return stats
+
+
+def rebuild_all() -> dict:
+    """Backfill stats for every event. Returns {event_id: tickets sold}."""
+    results = {}
+    for doc in db.collection("Events").stream():
+        results[doc.id] = rebuild(doc.id)["sold"]
+    return results
+
+
+def _add(total: dict, data: dict):
+    """Sum the numbers of ``data`` into ``total`` (nested maps included)."""
+    for key, value in data.items():
+        if isinstance(value, dict):
+            _add(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + value
+
+
+def _trim(ref, data: dict, cutoff: str):
+    """Delete the per-minute buckets of ``data`` (read from ``ref``) that are no longer kept (best effort)."""
+    from google.cloud.firestore import DELETE_FIELD
+
+    stale = [k for k in (data.get("checkinsPerMinute") or {}) if k <= cutoff]
+    if not stale:
+        return
+    try:
+        ref.update({f"checkinsPerMinute.`{k}`": DELETE_FIELD for k in stale})
+    except Exception:
+        logging.warning("Could not trim per-minute stats of %s", ref.path, exc_info=True)
+
+
+def get_stats(event_id: str, minutes: int = 60) -> dict | None:
+    """Sum the base and shard documents (one get_all) and trim the per-minute series to ``minutes``."""
+    refs = [db.collection(COLLECTION_NAME).document(event_id)] + _shard_refs(event_id)
+    snapshots = [snapshot for snapshot in db.get_all(refs) if snapshot.exists]
+    if not snapshots:
+        return None
+    data, updated = {}, []
+    kept_after = _cutoff()
+    for snapshot in snapshots:
+        part = snapshot.to_dict() or {}
+        _add(data, part)
+        if part.get("updatedAt") is not None:
+            updated.append(part["updatedAt"])
+        _trim(snapshot.reference, part, kept_after)
+    now = dt.datetime.now(dt.timezone.utc)
+    cutoff = _minute_key(now - dt.timedelta(minutes=minutes))
+    series = {k: v for k, v in (data.get("checkinsPerMinute") or {}).items() if k > cutoff}
+    current_minute = series.get(_minute_key(now), 0)
+    previous_minute = series.get(_minute_key(now - dt.timedelta(minutes=1)), 0)
+    return {
+        "eventId": event_id,
+        "sold": data.get("sold", 0),
+        "revenue": data.get("revenue", 0.0),
+        "checkedIn": data.get("checkedIn", 0),
+        "tiers": data.get("tiers", {}),
+        "checkinsPerMinute": dict(sorted(series.items())),
+        "checkinRate": max(current_minute, previous_minute),
+        "updatedAt": max(updated, default=None),
+    }
@@ -1,13 +1,19 @@
 import os, json
 from functools import lru_cache
-import firebase_admin
-from firebase_admin import credentials, firestore as fa_firestore, storage
 from dotenv import load_dotenv
+from .tracing import traced
 
 load_dotenv()
 
+# Clients installed by override_clients() (benchmarks, local stand-ins).
+_overrides: dict = {}
+
+
 def initialize_firebase():
     """Initialize Firebase app once with both Firestore and Storage."""
+    import firebase_admin
+    from firebase_admin import credentials
+
     if not firebase_admin._apps:
         cred_json = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
@@ -26,17 +32,57 @@ def initialize_firebase():
 @lru_cache(maxsize=1)
 def get_db():
 	"""Return a singleton Firestore client."""
+	if "db" in _overrides:
+		return _overrides["db"]
+	from firebase_admin import firestore as fa_firestore
 	initialize_firebase()
-	return fa_firestore.client()
+	return traced(fa_firestore.client())
 
 
 @lru_cache(maxsize=1)
 def get_storage_bucket():
 	"""Return the Firebase Storage bucket."""
+	if "storage_bucket" in _overrides:
+		return _overrides["storage_bucket"]
+	from firebase_admin import storage
 	initialize_firebase()
-	return storage.bucket()
+	return traced(storage.bucket(), "bucket")
+
+
+def override_clients(db=None, storage_bucket=None):
+    """Serve the given clients instead of the Firebase ones (benchmarks, local runs)."""
+    if db is not None:
+        _overrides["db"] = db
+        get_db.cache_clear()
+    if storage_bucket is not None:
+        _overrides["storage_bucket"] = storage_bucket
+        get_storage_bucket.cache_clear()
+
+
+def warm_up():
+    """Build the Firestore and Storage clients ahead of the first request."""
+    get_db()
+    get_storage_bucket()
+
+
+class _LazyClient:
+    """Module-level handle that builds its client on first use.
+
+    Importing this module no longer parses credentials or opens channels; the
+    cost is paid by the first request that touches the backend, or up front
+    by warm_up() when the app is started with SERVICE_WARMUP enabled.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __getattr__(self, name):
+        return getattr(self._factory(), name)
+
+    def __repr__(self):
+        return f"<lazy {self._factory.__name__}>"
 
 
 # Convenience aliases
-db = get_db()
-storage_bucket = get_storage_bucket()
\ No newline at end of file
+db = _LazyClient(get_db)
+storage_bucket = _LazyClient(get_storage_bucket)
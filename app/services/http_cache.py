@@ -0,0 +1,116 @@
+"""ETag / Last-Modified handling for polled read endpoints.
+
+Validators are derived from Firestore ``update_time`` when the caller has it
+(no need to serialize the body to answer a 304) and from a hash of the
+encoded body otherwise.
+"""
+import datetime as dt
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable
+
+from fastapi import Request, Response
+
+from .. import config
+from .serialization import dumps
+
+PUBLIC_CACHE = f"public, max-age={config.HTTP_CACHE_MAX_AGE}, stale-while-revalidate={config.HTTP_CACHE_SWR}"
+# Ticket payloads carry the QR signature: revalidate with 304s, but keep them
+# out of shared caches.
+PRIVATE_CACHE = "private, max-age=0, must-revalidate"
+
+
+def to_datetime(value) -> dt.datetime | None:
+    """Return a Firestore timestamp or datetime as an aware UTC datetime (None if neither)."""
+    if value is None:
+        return None
+    if hasattr(value, "to_datetime"):
+        value = value.to_datetime()
+    if not isinstance(value, dt.datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=dt.timezone.utc)
+    return value.astimezone(dt.timezone.utc)
+
+
+def version_of(*parts) -> str:
+    """Build a version string from ids and update times."""
+    rendered = []
+    for part in parts:
+        when = to_datetime(part)
+        rendered.append(when.isoformat() if when is not None else str(part))
+    return "|".join(rendered)
+
+
+def latest(times: Iterable) -> dt.datetime | None:
+    """Return the most recent of the given update times."""
+    converted = [t for t in (to_datetime(v) for v in times) if t is not None]
+    return max(converted) if converted else None
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match / If-Range header value names ``etag``."""
+    if header.strip() == "*":
+        return True
+    candidates = [c.strip() for c in header.split(",")]
+    return any(c.removeprefix("W/") == etag for c in candidates)
+
+
+def not_modified(request: Request, etag: str, last_modified: dt.datetime | None) -> bool:
+    """Whether the request's validators show the client already has this version."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have second precision.
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def _encode(content) -> bytes:
+    return content if isinstance(content, bytes) else dumps(content)
+
+
+def conditional_response(
+    request: Request,
+    content: Any,
+    *,
+    version: str | None = None,
+    last_modified=None,
+    cache_control: str = PUBLIC_CACHE,
+) -> Response:
+    """Return ``content`` as JSON, or ``304 Not Modified`` if the client copy is current.
+
+    ``content`` may be a zero-argument callable when a ``version`` is given; it
+    is only called when the body actually has to be sent. ``bytes`` content is
+    sent as already-encoded JSON.
+    """
+    last_modified = to_datetime(last_modified)
+    body = None
+    if version is not None:
+        etag = _etag(version.encode("utf-8"))
+    else:
+        if callable(content):
+            content = content()
+        body = _encode(content)
+        etag = _etag(body)
+
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    if not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    if body is None:
+        body = _encode(content() if callable(content) else content)
+    return Response(content=body, media_type="application/json", headers=headers)
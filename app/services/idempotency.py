@@ -0,0 +1,308 @@
+"""Idempotency-Key support for retried POSTs (``joinEvent``).
+
+A client that retries a request with the same ``Idempotency-Key`` header
+gets the first request's response back instead of a second ticket:
+
+- the first request claims the key and runs; its response (2xx, or a 4xx
+  such as "Tier sold out.") is recorded for ``IDEMPOTENCY_TTL`` seconds;
+- a duplicate that arrives while the first is still running waits up to
+  ``IDEMPOTENCY_WAIT`` seconds for its result (then 409 + Retry-After);
+- a later duplicate replays the recorded response, marked with an
+  ``Idempotent-Replayed: true`` header;
+- a 5xx, an exception or a "retry later" answer (408, 409, 429, or any
+  response carrying ``Retry-After``) releases the key, so the retry runs
+  again instead of replaying it for a day;
+- reusing a key for a different request is a 422.
+
+Records are kept in memory (bounded LRU) and, so that duplicates landing on
+another worker or after a restart are caught too, in the
+``Idempotency_keys`` collection: one ``create`` claims a key, one ``set``
+records the response. A pending claim older than ``IDEMPOTENCY_LOCK_SECONDS``
+is treated as abandoned (the worker died) and taken over, with an update
+conditioned on the record just read, so only one of several racing
+duplicates wins the takeover. Documents carry
+``expiresAt`` for a Firestore TTL policy; expired ones are ignored on read.
+If Firestore is unavailable the store degrades to memory only.
+"""
+import asyncio
+import datetime as dt
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+
+from .. import config
+from .firebase import db
+from .serialization import dumps
+
+COLLECTION_NAME = "Idempotency_keys"
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# Create/take-over rounds before a contended key is treated as held by another request
+MAX_CLAIM_ATTEMPTS = 5
+# Answers that tell the client to retry; recording them would replay them to that retry.
+RETRYABLE_STATUSES = {408, 409, 429}
+
+
+def _retryable(status_code: int, headers) -> bool:
+    return status_code >= 500 or status_code in RETRYABLE_STATUSES or "retry-after" in {
+        name.lower() for name in (headers or {})
+    }
+
+
+def fingerprint(*parts) -> str:
+    """Hash of what identifies the request, to reject a key reused for another request."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def _aware(value) -> dt.datetime | None:
+    if not isinstance(value, dt.datetime):
+        return None
+    return value if value.tzinfo else value.replace(tzinfo=dt.timezone.utc)
+
+
+class _Record:
+    __slots__ = ("fingerprint", "expires_at", "status_code", "body", "done")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.status_code: int | None = None
+        self.body: bytes | None = None
+        self.done = asyncio.Event()
+
+    def complete(self, status_code: int, body: bytes):
+        self.status_code = status_code
+        self.body = body
+
+    def response(self) -> Response:
+        return Response(content=self.body, status_code=self.status_code, media_type="application/json",
+                        headers={"Idempotent-Replayed": "true"})
+
+
+def _in_progress() -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail="A request with this Idempotency-Key is still in progress, please retry.",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _mismatch() -> HTTPException:
+    return HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request.")
+
+
+class IdempotencyStore:
+    def __init__(self, ttl: float = config.IDEMPOTENCY_TTL, wait: float = config.IDEMPOTENCY_WAIT,
+                 lock_seconds: float = config.IDEMPOTENCY_LOCK_SECONDS, max_keys: int = config.IDEMPOTENCY_MAX_KEYS,
+                 use_firestore: bool = config.IDEMPOTENCY_FIRESTORE):
+        self.ttl = ttl
+        self.wait = wait
+        self.lock_seconds = lock_seconds
+        self.max_keys = max_keys
+        self.use_firestore = use_firestore
+        self._records: OrderedDict[str, _Record] = OrderedDict()
+        self.executed = 0
+        self.replayed = 0
+
+    # -- memory -------------------------------------------------------------
+
+    def _get(self, key: str) -> _Record | None:
+        record = self._records.get(key)
+        if record is not None and record.done.is_set() and record.expires_at <= time.monotonic():
+            del self._records[key]
+            return None
+        return record
+
+    def _remember(self, key: str, record: _Record):
+        self._records[key] = record
+        self._records.move_to_end(key)
+        while len(self._records) > self.max_keys:
+            self._records.popitem(last=False)
+
+    def _forget(self, key: str, record: _Record):
+        if self._records.get(key) is record:
+            del self._records[key]
+
+    # -- Firestore ------------------------------------------------------------
+
+    def _ref(self, key: str):
+        return db.collection(COLLECTION_NAME).document(hashlib.sha256(key.encode()).hexdigest())
+
+    def _live(self, data: dict | None, now: dt.datetime) -> dict | None:
+        """The record if it still counts: not expired, and not a pending claim left by a dead worker."""
+        if data is None:
+            return None
+        expires_at = _aware(data.get("expiresAt"))
+        if expires_at is not None and expires_at <= now:
+            return None
+        created_at = _aware(data.get("createdAt"))
+        if data.get("status") == "pending" and created_at is not None \
+                and (now - created_at).total_seconds() > self.lock_seconds:
+            return None
+        return data
+
+    def _claim(self, key: str, request_fingerprint: str) -> dict | None:
+        """Claim ``key`` in Firestore: None if this request owns it, else the record held by another."""
+        from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+        from google.cloud.firestore import DELETE_FIELD
+
+        ref = self._ref(key)
+        now = _now()
+        doc = {
+            "key": key,
+            "fingerprint": request_fingerprint,
+            "status": "pending",
+            "createdAt": now,
+            "expiresAt": now + dt.timedelta(seconds=self.ttl),
+        }
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            try:
+                ref.create(doc)
+                return None
+            except AlreadyExists:
+                snapshot = ref.get()
+            if not snapshot.exists:
+                continue  # released in between: create again
+            data = self._live(snapshot.to_dict(), now)
+            if data is not None:
+                return data
+            # Expired or abandoned: take it over, unless another duplicate did since the read.
+            try:
+                ref.update({**doc, "statusCode": DELETE_FIELD, "body": DELETE_FIELD},
+                           option=db.write_option(last_update_time=snapshot.update_time))
+                return None
+            except (FailedPrecondition, NotFound):
+                continue
+        # Still contended: wait for whichever request holds it, as for a live claim.
+        return {"fingerprint": request_fingerprint, "status": "pending"}
+
+    def _read(self, key: str) -> dict | None:
+        snapshot = self._ref(key).get()
+        return self._live(snapshot.to_dict() if snapshot.exists else None, _now())
+
+    def _save(self, key: str, request_fingerprint: str, status_code: int, body: bytes):
+        now = _now()
+        self._ref(key).set({
+            "key": key,
+            "fingerprint": request_fingerprint,
+            "status": "completed",
+            "statusCode": status_code,
+            "body": body.decode("utf-8"),
+            "createdAt": now,
+            "expiresAt": now + dt.timedelta(seconds=self.ttl),
+        })
+
+    def _release(self, key: str):
+        self._ref(key).delete()
+
+    async def _claim_shared(self, key: str, request_fingerprint: str) -> dict | None:
+        """None once this request owns the key; the completed record when another request ran it."""
+        deadline = time.monotonic() + self.wait
+        delay = 0.05
+        while True:
+            try:
+                data = await run_in_threadpool(self._claim, key, request_fingerprint)
+            except Exception:
+                logging.warning("Idempotency store unavailable, using memory only", exc_info=True)
+                return None
+            if data is None:
+                return None
+            if data.get("fingerprint") != request_fingerprint:
+                raise _mismatch()
+            # Another worker holds the key: wait for its response (or for it to give the key up).
+            while data is not None and data.get("status") != "completed":
+                if time.monotonic() + delay > deadline:
+                    raise _in_progress()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.5)
+                data = await run_in_threadpool(self._read, key)
+            if data is not None:
+                return data
+
+    def _persist(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception:
+            logging.warning("Could not update idempotency record in Firestore", exc_info=True)
+
+    # -- public API -----------------------------------------------------------
+
+    async def run(self, key: str, request_fingerprint: str, call):
+        """Run ``call()`` once per ``key`` and replay its response to duplicates."""
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"{HEADER} must be at most {MAX_KEY_LENGTH} characters.")
+        while True:
+            record = self._get(key)
+            if record is None:
+                break
+            if record.fingerprint != request_fingerprint:
+                raise _mismatch()
+            if not record.done.is_set():
+                try:
+                    await asyncio.wait_for(record.done.wait(), self.wait)
+                except asyncio.TimeoutError:
+                    raise _in_progress() from None
+                continue  # completed, or released for this request to run again
+            self.replayed += 1
+            return record.response()
+
+        record = _Record(request_fingerprint, time.monotonic() + self.ttl)
+        self._remember(key, record)
+        try:
+            return await self._execute(key, request_fingerprint, record, call)
+        finally:
+            if record.status_code is None:
+                self._forget(key, record)
+            record.done.set()
+
+    async def _execute(self, key: str, request_fingerprint: str, record: _Record, call):
+        shared = self.use_firestore
+        if shared:
+            stored = await self._claim_shared(key, request_fingerprint)
+            if stored is not None:
+                record.complete(int(stored.get("statusCode") or 200), str(stored.get("body", "")).encode("utf-8"))
+                self.replayed += 1
+                return record.response()
+
+        self.executed += 1
+        try:
+            result = await call()
+        except HTTPException as e:
+            if _retryable(e.status_code, e.headers):
+                if shared:
+                    await run_in_threadpool(self._persist, self._release, key)
+                raise
+            status_code, body, outcome = e.status_code, dumps({"detail": e.detail}), e
+        except BaseException:
+            if shared:
+                await run_in_threadpool(self._persist, self._release, key)
+            raise
+        else:
+            if isinstance(result, Response):
+                if _retryable(result.status_code, result.headers):
+                    if shared:
+                        await run_in_threadpool(self._persist, self._release, key)
+                    return result
+                status_code, body = result.status_code, bytes(result.body)
+            else:
+                status_code, body = 200, dumps(result)
+            outcome = None
+
+        record.complete(status_code, body)
+        if shared:
+            await run_in_threadpool(self._persist, self._save, key, request_fingerprint, status_code, body)
+        if outcome is not None:
+            raise outcome
+        return result
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,210 @@
+"""In-memory reputation leaderboard over the Wallets collection.
+
+Two ordered indexes are kept per process, one by ``reputation`` (ties broken
+by ``eventsJoined``) and one by ``eventsJoined`` (ties broken by
+``reputation``). Each is a ``SortedList`` of ``(-primary, -secondary, wallet)``
+keys, so top-N is a slice and the rank of a wallet is one ``bisect_left``:
+both O(log n).
+
+The index is loaded with one scan of ``Wallets`` on first use. After that,
+the write paths that change a wallet (``create_user``) call ``upsert`` /
+``adjust``, and a background scan reconciles it every
+``LEADERBOARD_RECONCILE_SECONDS`` to pick up writes made by other workers or
+outside the API. Reads never wait for that scan; updates made while it runs
+are applied to the current index and replayed on the new one after the swap.
+"""
+import logging
+import threading
+import time
+
+from sortedcontainers import SortedList
+
+from .. import config
+from .firebase import db
+
+COLLECTION_NAME = "Wallets"
+ORDERINGS = ("reputation", "eventsJoined")
+
+
+def _score(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class _Entry:
+    __slots__ = ("doc_id", "wallet_address", "username", "reputation", "events_joined")
+
+    def __init__(self, doc_id: str | None, data: dict):
+        self.doc_id = doc_id
+        self.wallet_address = data.get("walletAddress", "")
+        self.username = data.get("username") or self.wallet_address[:6] + "..."
+        self.reputation = _score(data.get("reputation"))
+        self.events_joined = _score(data.get("eventsJoined"))
+
+    def key(self, by: str) -> tuple:
+        wallet = self.wallet_address.lower()
+        if by == "eventsJoined":
+            return (-self.events_joined, -self.reputation, wallet)
+        return (-self.reputation, -self.events_joined, wallet)
+
+    def to_dict(self, rank: int) -> dict:
+        return {
+            "rank": rank,
+            "walletAddress": self.wallet_address,
+            "username": self.username,
+            "reputation": self.reputation,
+            "eventsJoined": self.events_joined,
+        }
+
+
+class Leaderboard:
+    def __init__(self, reconcile_interval: float = config.LEADERBOARD_RECONCILE_SECONDS):
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.RLock()
+        self._entries: dict[str, _Entry] = {}
+        self._orders = {by: SortedList() for by in ORDERINGS}
+        self._reconciled_at: float | None = None
+        self._reconciling = False
+        self._pending: list | None = None  # updates made during a reconcile scan
+        self.reconciliations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    # -- loading ------------------------------------------------------------
+
+    def _scan(self) -> dict[str, _Entry]:
+        entries = {}
+        fields = ["walletAddress", "username", "reputation", "eventsJoined"]
+        for doc in db.collection(COLLECTION_NAME).select(fields).stream():
+            entry = _Entry(doc.id, doc.to_dict() or {})
+            if entry.wallet_address:
+                entries.setdefault(entry.wallet_address.lower(), entry)
+        return entries
+
+    def reconcile(self):
+        """Replace the index with a fresh scan of Wallets."""
+        with self._lock:
+            self._pending = []
+        try:
+            entries = self._scan()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        orders = {by: SortedList(entry.key(by) for entry in entries.values()) for by in ORDERINGS}
+        with self._lock:
+            self._entries, self._orders = entries, orders
+            pending, self._pending = self._pending, None
+            for update in pending:
+                update()
+            self._reconciled_at = time.monotonic()
+            self.reconciliations += 1
+
+    def _reconcile_in_background(self):
+        try:
+            self.reconcile()
+        except Exception:
+            logging.error("Leaderboard reconciliation failed", exc_info=True)
+        finally:
+            self._reconciling = False
+
+    def ensure_loaded(self):
+        """Load on first use (blocking); afterwards refresh in the background when due."""
+        with self._lock:
+            if self._reconciled_at is None:
+                self.reconcile()
+                return
+            due = time.monotonic() - self._reconciled_at >= self.reconcile_interval
+            if not due or self._reconciling:
+                return
+            self._reconciling = True
+        threading.Thread(target=self._reconcile_in_background, name="leaderboard-reconcile", daemon=True).start()
+
+    # -- incremental updates --------------------------------------------------
+
+    def _replace(self, old: _Entry | None, new: _Entry):
+        for by, order in self._orders.items():
+            if old is not None:
+                order.remove(old.key(by))
+            order.add(new.key(by))
+        self._entries[new.wallet_address.lower()] = new
+
+    def _apply(self, update):
+        # A reconcile scan may have read Wallets before this write: replay it after the swap.
+        update()
+        if self._pending is not None:
+            self._pending.append(update)
+
+    def upsert(self, doc_id: str | None, data: dict):
+        """Index a new or rewritten Wallets document. No-op until the index is loaded."""
+        if not data.get("walletAddress"):
+            return
+
+        def update():
+            entry = _Entry(doc_id, data)
+            old = self._entries.get(entry.wallet_address.lower())
+            if old is not None and entry.doc_id is None:
+                entry.doc_id = old.doc_id
+            self._replace(old, entry)
+
+        with self._lock:
+            if self._reconciled_at is not None:
+                self._apply(update)
+
+    def adjust(self, wallet_address: str, reputation: int = 0, events_joined: int = 0):
+        """Apply increments already written to Firestore."""
+        def update():
+            old = self._entries.get(wallet_address.lower())
+            if old is None:
+                return
+            new = _Entry(old.doc_id, {
+                "walletAddress": old.wallet_address,
+                "username": old.username,
+                "reputation": old.reputation + reputation,
+                "eventsJoined": old.events_joined + events_joined,
+            })
+            self._replace(old, new)
+
+        with self._lock:
+            self._apply(update)
+
+    # -- queries ------------------------------------------------------------
+
+    def _rank(self, order, entry: _Entry, by: str) -> int:
+        # Wallets with the same scores share a rank (1, 2, 2, 4, ...).
+        return order.bisect_left(entry.key(by)[:2]) + 1
+
+    def top(self, limit: int = 10, offset: int = 0, by: str = "reputation") -> tuple[int, list[dict]]:
+        """Return (total wallets, ranked entries ``offset`` .. ``offset + limit``)."""
+        with self._lock:
+            order = self._orders[by]
+            keys = order[offset:offset + limit]
+            results = []
+            for key in keys:
+                entry = self._entries[key[2]]
+                results.append(entry.to_dict(self._rank(order, entry, by)))
+            return len(order), results
+
+    def rank(self, wallet_address: str, by: str = "reputation") -> dict | None:
+        with self._lock:
+            entry = self._entries.get(wallet_address.lower())
+            if entry is None:
+                return None
+            return entry.to_dict(self._rank(self._orders[by], entry, by))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "wallets": len(self._entries),
+                "reconciliations": self.reconciliations,
+                "secondsSinceReconcile": (
+                    round(time.monotonic() - self._reconciled_at, 3) if self._reconciled_at else None
+                ),
+                "reconcileIntervalSeconds": self.reconcile_interval,
+            }
+
+
+leaderboard = Leaderboard()
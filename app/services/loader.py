@@ -0,0 +1,156 @@
+"""DataLoader-style document reads: single-flight per key, batched across keys.
+
+Route handlers run on threadpool workers, so the loader is thread based.
+The first caller that brings a key nobody is fetching becomes the batch
+leader: it waits ``LOADER_WINDOW_MS`` for other requests to join, then
+fetches every pending key with one ``db.get_all`` call. Callers asking for a
+key that is already pending or in flight wait on the same result instead of
+issuing their own ``get``. Nothing is cached after the fetch completes, so a
+read never returns data older than the round trip it joined.
+
+Only read-only endpoints use the loader. Concurrent callers share one
+snapshot, so a read that feeds a write (tier counts, check-ins) must go to
+Firestore directly and write with a ``last_update_time`` precondition.
+"""
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from .. import config
+from . import deadlines
+from .firebase import db
+
+
+# Times a request re-reads a key whose shared batch failed on another request's deadline
+MAX_REISSUES = 3
+
+
+class MissingDocument:
+    """Stand-in snapshot for a key that ``get_all`` did not return."""
+
+    exists = False
+    update_time = None
+
+    def __init__(self, doc_id: str):
+        self.id = doc_id
+
+    def to_dict(self):
+        return None
+
+
+class DocumentLoader:
+    def __init__(self, window: float = config.LOADER_WINDOW_MS / 1000, max_batch: int = config.LOADER_MAX_BATCH):
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._inflight: dict[str, Future] = {}
+        self._pending: dict[str, tuple[str, str]] = {}
+        self._dispatch_scheduled = False
+        self.requested = 0
+        self.fetched = 0
+        self.batches = 0
+
+    def load(self, collection: str, doc_id: str):
+        """Return the DocumentSnapshot of ``collection/doc_id`` (``exists`` may be False)."""
+        return self.load_many([(collection, doc_id)])[0]
+
+    def load_many(self, keys: list[tuple[str, str]]) -> list:
+        """Return snapshots for ``[(collection, doc_id), ...]`` in the same order."""
+        futures = []
+        with self._lock:
+            self.requested += len(keys)
+            for collection, doc_id in keys:
+                path = f"{collection}/{doc_id}"
+                future = self._inflight.get(path)
+                if future is None:
+                    future = self._inflight[path] = Future()
+                    self._pending[path] = (collection, doc_id)
+                futures.append(future)
+            lead = bool(self._pending) and not self._dispatch_scheduled
+            if lead:
+                self._dispatch_scheduled = True
+
+        if lead:
+            if self.window > 0:
+                time.sleep(self.window)
+            self._dispatch()
+        return [self._result(key, future) for key, future in zip(keys, futures)]
+
+    def _result(self, key: tuple[str, str], future: Future):
+        """Wait for a batch, but no longer than this request's own deadline allows.
+
+        The batch runs under its leader's deadline. If that ran out while this
+        request still has time, the key is read again instead of failing too.
+        """
+        for attempt in range(MAX_REISSUES + 1):
+            budget = deadlines.current_budget()
+            try:
+                if budget is None:
+                    return future.result()
+                return future.result(timeout=max(budget.remaining(), 0))
+            except FutureTimeout:
+                budget.exhausted = True
+                raise deadlines.DeadlineExceeded() from None
+            except deadlines.DeadlineExceeded:
+                own = budget is not None and (budget.exhausted or budget.remaining() <= 0)
+                if own or attempt == MAX_REISSUES:
+                    raise
+                future = self._submit(key)
+
+    def _submit(self, key: tuple[str, str]) -> Future:
+        """Queue ``key`` again (joining a pending read when there is one) and dispatch if nobody will."""
+        collection, doc_id = key
+        path = f"{collection}/{doc_id}"
+        with self._lock:
+            future = self._inflight.get(path)
+            if future is None:
+                future = self._inflight[path] = Future()
+                self._pending[path] = key
+            lead = bool(self._pending) and not self._dispatch_scheduled
+            if lead:
+                self._dispatch_scheduled = True
+        if lead:
+            self._dispatch()
+        return future
+
+    def _dispatch(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._dispatch_scheduled = False
+
+        items = list(pending.items())
+        for start in range(0, len(items), self.max_batch):
+            chunk = items[start:start + self.max_batch]
+            try:
+                refs = [db.collection(collection).document(doc_id) for _, (collection, doc_id) in chunk]
+                snapshots = {snapshot.reference.path: snapshot for snapshot in db.get_all(refs)}
+            except Exception as e:
+                self._resolve(chunk, error=e)
+                continue
+            self._resolve(chunk, snapshots=snapshots)
+
+    def _resolve(self, chunk, snapshots=None, error=None):
+        with self._lock:
+            futures = [(path, self._inflight.pop(path, None)) for path, _ in chunk]
+            if error is None:
+                self.fetched += len(chunk)
+                self.batches += 1
+        for path, future in futures:
+            if future is None:
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                snapshot = snapshots.get(path)
+                future.set_result(snapshot if snapshot is not None else MissingDocument(path.rsplit("/", 1)[-1]))
+
+    def stats(self) -> dict:
+        return {
+            "requested": self.requested,
+            "fetched": self.fetched,
+            "batches": self.batches,
+            "inflight": len(self._inflight),
+        }
+
+
+document_loader = DocumentLoader()
@@ -0,0 +1,275 @@
+"""Media served through the API instead of public bucket URLs.
+
+With ``MEDIA_BASE_URL`` set, uploads are stored without ``make_public`` and
+referenced by ``media_url(path)`` (``{MEDIA_BASE_URL}/media/{path}``); the ``/media``
+route streams them from the bucket with
+
+- ``Range`` requests (single byte range, ``If-Range``) for large downloads;
+- ``ETag`` / ``Last-Modified`` validators and 304s;
+- ``Cache-Control: public, max-age=31536000, immutable`` for paths whose
+  file name is a content hash or a UUID (``is_immutable``), which are never
+  rewritten; other paths are revalidated. Ticket QR codes (``qrcodes/``)
+  carry the ticket signature and are only cached privately, as
+  ``ticketQrImage`` does.
+
+The attendee list export holds personal data and is never served by the
+route: ``export_url`` hands out a signed bucket URL valid for
+``MEDIA_EXPORT_URL_TTL`` seconds instead.
+
+``MEDIA_BASE_URL`` must be absolute: the URLs are stored in Firestore and
+used by the frontend on another origin. ``create_app`` fails at startup
+(``check_config``) when ``MEDIA_MAKE_PUBLIC`` is turned off without one.
+
+Hot objects are kept in a per-process disk cache bounded to
+``MEDIA_CACHE_MB`` (least recently used evicted). Objects larger than
+``MEDIA_CACHE_MAX_OBJECT_MB`` are streamed from the bucket in ranged chunks
+and never cached. Cached immutable objects are served without touching the
+bucket; mutable ones are rechecked (one metadata call) after
+``MEDIA_CACHE_REVALIDATE`` seconds.
+
+Without ``MEDIA_BASE_URL`` the old behaviour is kept: ``MEDIA_MAKE_PUBLIC``
+defaults to on and uploads get a public ACL and bucket URLs.
+"""
+import atexit
+import datetime as dt
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from .. import config
+from .firebase import storage_bucket
+from .http_cache import PRIVATE_CACHE
+
+# Bucket prefixes the media route may serve.
+MEDIA_PREFIXES = ("events/", "qrcodes/", "uploads/")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+# Ticket QR codes embed the signature: like ticketQrImage, keep them out of shared caches.
+PRIVATE_PREFIXES = ("qrcodes/",)
+PRIVATE_IMMUTABLE_CACHE = "private, max-age=86400, immutable"
+CHUNK_SIZE = 1024 * 1024
+FILL_LOCKS = 64
+
+# Attendee exports (personal data): only reachable through a signed URL.
+_PRIVATE_EXPORT = re.compile(r"^events/[^/]+/attendees_list\.xlsx$")
+_IMMUTABLE_NAME = re.compile(
+    r"^(?:[0-9a-f]{32,64}|[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(?:\.[A-Za-z0-9]+)?$"
+)
+
+
+def hashed_path(prefix: str, data: bytes, filename: str | None = None) -> str:
+    """Content-addressed blob path: ``{prefix}/{sha256}{.ext}``."""
+    extension = os.path.splitext(filename or "")[1].lower()
+    return f"{prefix}/{hashlib.sha256(data).hexdigest()[:32]}{extension}"
+
+
+def is_immutable(path: str) -> bool:
+    return _IMMUTABLE_NAME.match(path.rsplit("/", 1)[-1]) is not None
+
+
+def is_servable(path: str) -> bool:
+    return (path.startswith(MEDIA_PREFIXES) and ".." not in path.split("/")
+            and _PRIVATE_EXPORT.match(path) is None)
+
+
+def cache_control(path: str) -> str:
+    if path.startswith(PRIVATE_PREFIXES):
+        return PRIVATE_IMMUTABLE_CACHE if is_immutable(path) else PRIVATE_CACHE
+    return IMMUTABLE_CACHE if is_immutable(path) else REVALIDATE_CACHE
+
+
+def check_config():
+    """Refuse to start when media URLs are stored without an absolute ``MEDIA_BASE_URL``."""
+    if config.MEDIA_MAKE_PUBLIC:
+        return
+    scheme, _, host = config.MEDIA_BASE_URL.partition("://")
+    if scheme not in ("http", "https") or not host.strip("/"):
+        raise RuntimeError(
+            "MEDIA_BASE_URL must be an absolute http(s) URL (e.g. https://api.example.com): "
+            "media URLs are stored in Firestore and read by clients on other origins. "
+            "Leave MEDIA_BASE_URL unset or set MEDIA_MAKE_PUBLIC=1 to store public bucket URLs instead."
+        )
+
+
+def media_url(path: str) -> str:
+    return f"{config.MEDIA_BASE_URL.rstrip('/')}/media/{path}"
+
+
+def url_for(blob) -> str:
+    return blob.public_url if config.MEDIA_MAKE_PUBLIC else media_url(blob.name)
+
+
+def publish(blob) -> str:
+    """URL to store for a blob just uploaded."""
+    if config.MEDIA_MAKE_PUBLIC:
+        blob.make_public()
+    return url_for(blob)
+
+
+def export_url(blob) -> str:
+    """Download URL for a private export: public as before, otherwise a short-lived signed URL."""
+    if config.MEDIA_MAKE_PUBLIC:
+        return publish(blob)
+    return blob.generate_signed_url(
+        version="v4", expiration=dt.timedelta(seconds=config.MEDIA_EXPORT_URL_TTL), method="GET"
+    )
+
+
+@dataclass
+class MediaObject:
+    path: str
+    size: int
+    content_type: str
+    etag: str
+    updated: object
+    file: str | None = None  # cached copy on disk
+    checked_at: float = 0.0
+
+
+class MediaCache:
+    def __init__(self, directory: str | None = None, max_bytes: int = config.MEDIA_CACHE_MB * 1024 * 1024,
+                 max_object_bytes: int = config.MEDIA_CACHE_MAX_OBJECT_MB * 1024 * 1024,
+                 revalidate_after: float = config.MEDIA_CACHE_REVALIDATE):
+        self._directory = directory
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.revalidate_after = revalidate_after
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, MediaObject] = OrderedDict()
+        # Striped locks so concurrent misses on one path download it once.
+        self._fills = [threading.Lock() for _ in range(FILL_LOCKS)]
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def directory(self) -> str:
+        if self._directory is None:
+            with self._lock:
+                if self._directory is None:
+                    base = config.MEDIA_CACHE_DIR or None
+                    if base:
+                        os.makedirs(base, exist_ok=True)
+                    # One directory per process: workers do not share index or files.
+                    self._directory = tempfile.mkdtemp(prefix="hackconnect-media-", dir=base)
+                    atexit.register(shutil.rmtree, self._directory, True)
+        return self._directory
+
+    def _cached(self, path: str) -> MediaObject | None:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+            return entry
+
+    def _fresh(self, entry: MediaObject) -> bool:
+        return is_immutable(entry.path) or time.monotonic() - entry.checked_at < self.revalidate_after
+
+    def _drop(self, path: str):
+        entry = self._entries.pop(path, None)
+        if entry is not None and entry.file:
+            self.bytes -= entry.size
+            try:
+                os.unlink(entry.file)
+            except FileNotFoundError:
+                pass
+
+    def _store(self, obj: MediaObject, data: bytes):
+        file = os.path.join(self.directory, hashlib.sha1(f"{obj.path}|{obj.etag}".encode()).hexdigest())
+        with open(file + ".tmp", "wb") as fh:
+            fh.write(data)
+        os.replace(file + ".tmp", file)
+        obj.file = file
+        with self._lock:
+            self._drop(obj.path)
+            self._entries[obj.path] = obj
+            self.bytes += obj.size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _fill_lock(self, path: str) -> threading.Lock:
+        return self._fills[int(hashlib.sha1(path.encode()).hexdigest()[:8], 16) % FILL_LOCKS]
+
+    def lookup(self, path: str) -> MediaObject | None:
+        """Metadata of ``path`` (cached on disk when small enough), or None if it does not exist."""
+        entry = self._cached(path)
+        if entry is not None and self._fresh(entry):
+            self.hits += 1
+            return entry
+        with self._fill_lock(path):
+            entry = self._cached(path)
+            if entry is not None and self._fresh(entry):
+                self.hits += 1
+                return entry
+            self.misses += 1
+            blob = storage_bucket.get_blob(path)
+            if blob is None:
+                with self._lock:
+                    self._drop(path)
+                return None
+            obj = MediaObject(
+                path=path,
+                size=blob.size or 0,
+                content_type=blob.content_type or "application/octet-stream",
+                etag=blob.etag or "",
+                updated=blob.updated,
+                checked_at=time.monotonic(),
+            )
+            if entry is not None and entry.etag == obj.etag:
+                entry.checked_at = obj.checked_at
+                return entry
+            if obj.size <= self.max_object_bytes:
+                try:
+                    self._store(obj, storage_bucket.blob(path).download_as_bytes())
+                except OSError:
+                    logging.warning("Media cache write failed for %s", path, exc_info=True)
+            else:
+                with self._lock:
+                    self._drop(path)
+            return obj
+
+    def iter_bytes(self, obj: MediaObject, start: int, end: int):
+        """Yield bytes ``start`` .. ``end`` (inclusive) of ``obj``."""
+        if obj.file is not None:
+            try:
+                fh = open(obj.file, "rb")
+            except FileNotFoundError:  # evicted since the lookup
+                fh = None
+            if fh is not None:
+                with fh:
+                    fh.seek(start)
+                    remaining = end - start + 1
+                    while remaining > 0:
+                        chunk = fh.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            return
+                        remaining -= len(chunk)
+                        yield chunk
+                return
+        blob = storage_bucket.blob(obj.path)
+        for offset in range(start, end + 1, CHUNK_SIZE):
+            yield blob.download_as_bytes(start=offset, end=min(offset + CHUNK_SIZE, end + 1) - 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "objects": len(self._entries),
+                "bytes": self.bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+media_cache = MediaCache()
@@ -0,0 +1,342 @@
+"""Per-event purchase queue ("waiting room") for ``joinEvent``.
+
+Joins for the same event are appended to that event's queue and drained by a
+single consumer thread. The consumer takes up to ``PURCHASE_QUEUE_BATCH``
+requests at a time (waiting ``PURCHASE_QUEUE_WINDOW_MS`` for a batch to fill),
+reserves tier inventory against one read of the Event document, renders and
+uploads the QR codes in parallel, then writes every ticket, the new tier
+counts and the stats increment in a single ``WriteBatch`` commit. The Event
+update carries a ``last_update_time`` precondition, so a concurrent writer
+(another worker, a direct join) makes the commit fail and the batch is
+re-reserved against a fresh read instead of overselling. QR codes are cached
+only for committed tickets; the uploaded QR of a request that ends up sold
+out, busy or failed is deleted again.
+
+One hot event therefore costs one Event write per batch instead of one per
+ticket. Callers get a ``PurchaseRequest`` whose ``status`` moves from
+"queued" to "processing" to "completed" or "failed"; ``position()`` reports
+how many requests are ahead of it and ``wait()`` lets async handlers await
+the outcome without holding a threadpool worker.
+"""
+import asyncio
+import copy
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import config
+from . import event_stats
+from .event_index import event_index
+from .firebase import db
+from .shared_cache import shared_cache, EVENT_KEY
+from .tickets import discard_ticket, join_response, prepare_ticket, ticket_issued
+
+# A WriteBatch takes at most 500 writes; each batch adds the event update and the stats set.
+MAX_BATCH_WRITES = 500
+MAX_COMMIT_ATTEMPTS = 5
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__("Purchase queue is full")
+        self.retry_after = retry_after
+
+
+class PurchaseRequest:
+    def __init__(self, event_id: str, wallet_address: str, event_title: str, price_bought: float,
+                 tier_name: str, seq: int):
+        self.id = uuid.uuid4().hex
+        self.event_id = event_id
+        self.wallet_address = wallet_address
+        self.event_title = event_title
+        self.price_bought = price_bought
+        self.tier_name = tier_name
+        self.seq = seq
+        self.status = "queued"
+        self.status_code: int | None = None
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.created_at = time.monotonic()
+        self.finished_at: float | None = None
+        self._waiters: list = []  # (loop, future) pairs awaiting the outcome
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+
+class _EventLane:
+    def __init__(self):
+        self.queue: deque[PurchaseRequest] = deque()
+        self.next_seq = 1
+        self.taken = 0
+        self.running = False
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class PurchaseQueue:
+    def __init__(
+        self,
+        batch_size: int = config.PURCHASE_QUEUE_BATCH,
+        window: float = config.PURCHASE_QUEUE_WINDOW_MS / 1000,
+        max_pending: int = config.PURCHASE_QUEUE_MAX_PENDING,
+        workers: int = config.PURCHASE_QUEUE_WORKERS,
+        result_ttl: float = config.PURCHASE_QUEUE_RESULT_TTL,
+    ):
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_WRITES - 2))
+        self.window = window
+        self.max_pending = max_pending
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._lanes: dict[str, _EventLane] = {}
+        self._requests: OrderedDict[str, PurchaseRequest] = OrderedDict()
+        self._executor: ThreadPoolExecutor | None = None
+        self.batches = 0
+        self.completed = 0
+        self.failed = 0
+        self.conflicts = 0
+
+    # -- producer side ----------------------------------------------------
+
+    def enqueue(self, event_id: str, wallet_address: str, event_title: str, price_bought: float,
+                tier_name: str) -> PurchaseRequest:
+        """Queue a join; raises ``QueueFull`` when the event already has ``max_pending`` waiting."""
+        with self._lock:
+            self._prune()
+            lane = self._lanes.get(event_id)
+            if lane is None:
+                lane = self._lanes[event_id] = _EventLane()
+            if len(lane.queue) >= self.max_pending:
+                raise QueueFull(self._drain_estimate(len(lane.queue)))
+            request = PurchaseRequest(event_id, wallet_address, event_title, price_bought, tier_name, lane.next_seq)
+            lane.next_seq += 1
+            lane.queue.append(request)
+            self._requests[request.id] = request
+            if not lane.running:
+                lane.running = True
+                threading.Thread(
+                    target=self._drain, args=(event_id, lane), name=f"purchase-queue-{event_id}", daemon=True
+                ).start()
+        return request
+
+    def get(self, request_id: str) -> PurchaseRequest | None:
+        return self._requests.get(request_id)
+
+    def position(self, request: PurchaseRequest) -> int:
+        """Requests ahead of ``request`` plus one while it is queued, 0 once it is being processed."""
+        if request.status != "queued":
+            return 0
+        lane = self._lanes.get(request.event_id)
+        return max(1, request.seq - lane.taken) if lane else 0
+
+    def describe(self, request: PurchaseRequest) -> dict:
+        body = {
+            "requestId": request.id,
+            "eventId": request.event_id,
+            "walletAddress": request.wallet_address,
+            "status": request.status,
+            "position": self.position(request),
+        }
+        if request.status == "completed":
+            body["result"] = request.result
+        elif request.status == "failed":
+            body["error"] = request.error
+        return body
+
+    async def wait(self, request: PurchaseRequest, timeout: float) -> bool:
+        """Wait up to ``timeout`` seconds for ``request`` to finish; True when it has."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = (loop, future)
+        with self._lock:
+            if request.done:
+                return True
+            request._waiters.append(entry)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                if entry in request._waiters:
+                    request._waiters.remove(entry)
+        return request.done
+
+    def _drain_estimate(self, queued: int) -> float:
+        return max(1.0, queued / self.batch_size * max(self.window, 0.05))
+
+    def _prune(self):
+        now = time.monotonic()
+        while self._requests:
+            request = next(iter(self._requests.values()))
+            if not request.done or now - request.finished_at < self.result_ttl:
+                break
+            self._requests.popitem(last=False)
+
+    # -- consumer side ----------------------------------------------------
+
+    def _drain(self, event_id: str, lane: _EventLane):
+        while True:
+            with self._lock:
+                if not lane.queue:
+                    lane.running = False
+                    if self._lanes.get(event_id) is lane:
+                        del self._lanes[event_id]
+                    return
+                short = len(lane.queue) < self.batch_size
+            if short and self.window > 0:
+                time.sleep(self.window)
+            with self._lock:
+                batch = [lane.queue.popleft() for _ in range(min(self.batch_size, len(lane.queue)))]
+                lane.taken += len(batch)
+                for request in batch:
+                    request.status = "processing"
+            try:
+                self._process(event_id, batch)
+            except Exception as e:
+                logging.error("Purchase batch for event %s failed", event_id, exc_info=True)
+                for request in batch:
+                    self._finish(request, 500, error=f"Error joining event: {str(e)}")
+
+    def _finish(self, request: PurchaseRequest, status_code: int, result: dict | None = None,
+                error: str | None = None):
+        with self._lock:
+            if request.done:
+                return
+            request.status = "completed" if error is None else "failed"
+            request.status_code = status_code
+            request.result = result
+            request.error = error
+            request.finished_at = time.monotonic()
+            waiters, request._waiters = request._waiters, []
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+    @staticmethod
+    def _reserve(event_data: dict, requests: list[PurchaseRequest]):
+        """Return (new ticketTiers, accepted, sold out) for ``requests`` in queue order."""
+        ticket_tiers = copy.deepcopy(event_data.get("ticketTiers", []))
+        by_name = {}
+        for tier in ticket_tiers:
+            by_name.setdefault(tier.get("tierName"), tier)
+        accepted, sold_out = [], []
+        for request in requests:
+            tier = by_name.get(request.tier_name)
+            if tier is not None:
+                if tier.get("ticketCount", 0) <= 0:
+                    sold_out.append(request)
+                    continue
+                tier["ticketCount"] = tier.get("ticketCount", 0) - 1
+                tier["ticketsSold"] = tier.get("ticketsSold", 0) + 1
+            accepted.append(request)
+        return ticket_tiers, accepted, sold_out
+
+    def _prepare(self, request: PurchaseRequest):
+        try:
+            return prepare_ticket(
+                request.event_id, request.wallet_address, request.event_title,
+                request.price_bought, request.tier_name,
+            )
+        except Exception as e:
+            logging.error("Error preparing ticket for %s", request.wallet_address, exc_info=True)
+            return e
+
+    def _process(self, event_id: str, batch: list[PurchaseRequest]):
+        prepared: dict[str, tuple[dict, bytes]] = {}
+        committed = False
+        try:
+            committed = self._commit(event_id, batch, prepared)
+        finally:
+            if not committed:
+                for ticket_doc, _ in prepared.values():
+                    discard_ticket(ticket_doc)
+
+    def _commit(self, event_id: str, batch: list[PurchaseRequest], prepared: dict) -> bool:
+        """Reserve, prepare and commit ``batch``; True when the prepared tickets were committed."""
+        from google.api_core.exceptions import FailedPrecondition
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="purchase-prepare")
+        event_ref = db.collection("Events").document(event_id)
+
+        for _ in range(MAX_COMMIT_ATTEMPTS):
+            pending = [request for request in batch if not request.done]
+            if not pending:
+                return False
+            snapshot = event_ref.get()
+            if not snapshot.exists:
+                for request in pending:
+                    self._finish(request, 404, error="Event not found.")
+                return False
+            ticket_tiers, accepted, sold_out = self._reserve(snapshot.to_dict() or {}, pending)
+
+            unprepared = [request for request in accepted if request.id not in prepared]
+            failed = False
+            for request, outcome in zip(unprepared, self._executor.map(self._prepare, unprepared)):
+                if isinstance(outcome, Exception):
+                    self._finish(request, 500, error=f"Error joining event: {str(outcome)}")
+                    failed = True
+                else:
+                    prepared[request.id] = outcome
+            if failed:
+                # Failed tickets give their reservation back; reserve again from a fresh read.
+                continue
+
+            for request in sold_out:
+                if request.id in prepared:  # reserved on an earlier attempt, sold out on this one
+                    discard_ticket(prepared.pop(request.id)[0])
+
+            write = db.batch()
+            for request in accepted:
+                ticket_doc = prepared[request.id][0]
+                write.set(db.collection("Tickets").document(ticket_doc["ticketId"]), ticket_doc)
+            option = db.write_option(last_update_time=snapshot.update_time) if snapshot.update_time else None
+            write.update(event_ref, {"ticketTiers": ticket_tiers}, option=option)
+            if accepted:
+                event_stats.stage_sales(write, event_id, [(r.tier_name, r.price_bought) for r in accepted])
+            try:
+                write.commit()
+            except FailedPrecondition:
+                self.conflicts += 1
+                continue
+
+            self.batches += 1
+            event_index.update_tiers(event_id, ticket_tiers)
+            shared_cache.delete(EVENT_KEY.format(event_id))
+            for request in sold_out:
+                self._finish(request, 409, error="Tier sold out.")
+            for request in accepted:
+                ticket_doc, png = prepared[request.id]
+                ticket_issued(ticket_doc, png)
+                self._finish(request, 200, result=join_response(ticket_doc))
+            return True
+
+        for request in batch:
+            self._finish(request, 503, error="Event is busy, please retry.")
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "completed": self.completed,
+                "failed": self.failed,
+                "conflicts": self.conflicts,
+                "tracked": len(self._requests),
+                "queued": {event_id: len(lane.queue) for event_id, lane in self._lanes.items()},
+            }
+
+
+purchase_queue = PurchaseQueue()
@@ -0,0 +1,135 @@
+"""Fast JSON encoding for list endpoints.
+
+``list_events`` and the ticket lists used to build a pydantic model per
+document and let FastAPI re-encode everything through ``jsonable_encoder``.
+The helpers here decode Firestore dicts straight into plain dicts shaped like
+the response models, and ``FastJSONResponse`` writes them with orjson when
+it is installed (stdlib ``json`` otherwise).
+
+List endpoints also answer ``Accept: application/x-ndjson`` with one JSON
+document per line (``ndjson_response``): rows are encoded as the Firestore
+query stream yields them, so memory does not grow with the result count.
+"""
+import datetime as dt
+import json
+import logging
+from typing import Any, Iterable
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Rows are flushed once this much is buffered (the first row right away).
+NDJSON_FLUSH_BYTES = 16 * 1024
+
+
+def _default(obj):
+    """Encode types orjson/json do not know (Firestore timestamps, refs, bytes)."""
+    if isinstance(obj, (dt.datetime, dt.date, dt.time)):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return obj.decode("utf-8", errors="replace")
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    path = getattr(obj, "path", None)  # DocumentReference
+    if isinstance(path, str):
+        return path
+    return str(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize ``content`` to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that skips jsonable_encoder and encodes with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def iso_datetime(value) -> str | None:
+    """Format a datetime the way pydantic does (UTC offsets become "Z")."""
+    if value is None:
+        return None
+    if hasattr(value, "to_datetime"):
+        value = value.to_datetime()
+    if not isinstance(value, dt.datetime):
+        return str(value)
+    text = value.isoformat()
+    return text[:-6] + "Z" if text.endswith("+00:00") else text
+
+
+def tier_to_dict(tier: dict) -> dict:
+    """Shape a stored ticket tier like ``EventTiers`` serialized by alias."""
+    return {
+        "tierName": str(tier.get("tierName", "")),
+        "ticketCount": int(tier.get("ticketCount") or 0),
+        "ticketsSold": int(tier.get("ticketsSold", tier.get("ticketSold")) or 0),
+        "price": float(tier.get("price") or 0),
+    }
+
+
+def event_to_dict(event_id: str, data: dict) -> dict:
+    """Shape a stored Events document like the ``Event`` response model."""
+    now = dt.datetime.utcnow()
+    return {
+        "event_id": event_id,
+        "event_link": data.get("eventLink") or "",
+        "event_title": data.get("title") or "",
+        "date_start": iso_datetime(data.get("startDate", now)),
+        "date_end": iso_datetime(data.get("endDate", now)),
+        "description": data.get("description") or "",
+        "host_address": data.get("hostAddress") or "",
+        "image_url": data.get("imageUrl"),
+        "status": data.get("status") or "",
+        "ticket_tiers": [tier_to_dict(t) for t in data.get("ticketTiers") or [] if isinstance(t, dict)],
+        "created_at": iso_datetime(data.get("createdAt", now)),
+    }
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _ndjson_lines(first, rows):
+    yield dumps(first) + b"\n"
+    buffer = bytearray()
+    try:
+        for row in rows:
+            buffer += dumps(row)
+            buffer += b"\n"
+            if len(buffer) >= NDJSON_FLUSH_BYTES:
+                yield bytes(buffer)
+                buffer.clear()
+    except Exception as e:
+        # The status line is gone already: end the stream with an error row.
+        logging.error("Error while streaming rows", exc_info=True)
+        buffer += dumps({"error": getattr(e, "detail", None) or str(e)}) + b"\n"
+    if buffer:
+        yield bytes(buffer)
+
+
+def ndjson_response(rows: Iterable[dict]) -> StreamingResponse:
+    """Stream ``rows`` as NDJSON (one object per line, no envelope).
+
+    The first row is fetched before returning, so an error starting the
+    query still reaches the caller as an exception (and a 500). The body is
+    sent row by row: the next row is only pulled once the previous chunk
+    has been written to the client.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return StreamingResponse(iter(()), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(_ndjson_lines(first, rows), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,285 @@
+"""Shared-memory key/value cache for hot read data.
+
+Workers started by ``app.launcher`` map the same file (``SHARED_CACHE_PATH``,
+created in /dev/shm when available), so a value cached by one worker is
+served by all of them and ``delete`` invalidates it everywhere. Without a
+path (``uvicorn --reload``, a single process) the cache maps anonymous
+memory private to the process; the API is the same.
+
+The file is a header, ``GENERATIONS`` namespace counters and a table of
+fixed-size slots. A key hashes to a window of ``PROBE`` slots; a write
+replaces the same key, else a free or expired slot, else the oldest entry in
+the window. Values that do not fit in a slot are not cached.
+
+Readers never lock: they copy a slot and check its CRC, so a slot caught
+mid-write reads as a miss. Writers serialize on an exclusive ``flock`` of
+the file (and a thread lock within the process). ``update`` runs a
+read-modify-write under that lock, which is what the shared admission
+buckets use.
+
+Namespace generations (``generation`` / ``bump``) let per-process caches
+notice writes made in other workers without scanning the table.
+"""
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from .. import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within the process
+    fcntl = None
+
+MAGIC = b"HCSHM001"
+_HEADER = struct.Struct("<8sII")  # magic, slot count, slot size
+HEADER_SIZE = 64
+GENERATIONS = 64
+_GENERATION = struct.Struct("<Q")
+_SLOT = struct.Struct("<IIIdd")  # crc, key length, value length, expires at, written at
+SLOT_HEADER_SIZE = 32
+_CHECKED = struct.Struct("<IId")  # the header fields covered by the crc
+PROBE = 4
+DATA_OFFSET = HEADER_SIZE + GENERATIONS * _GENERATION.size
+
+# Keys used by the app
+EVENT_KEY = "event:{}"
+QR_KEY = "qr:{}"
+
+
+def _hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def _crc(key: bytes, value: bytes, expires_at: float) -> int:
+    return zlib.crc32(value, zlib.crc32(key, zlib.crc32(_CHECKED.pack(len(key), len(value), expires_at))))
+
+
+class SharedCache:
+    def __init__(self, path: str | None = None, size: int = config.SHARED_CACHE_MB * 1024 * 1024,
+                 slot_size: int = config.SHARED_CACHE_SLOT_BYTES):
+        self._path = path
+        self.size = size
+        self.slot_size = slot_size
+        self.slots = 0
+        self._mm = None
+        self._fd = None
+        self._pid = None
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    @property
+    def path(self) -> str | None:
+        return self._path or config.SHARED_CACHE_PATH
+
+    @property
+    def shared(self) -> bool:
+        return self.path is not None
+
+    # -- mapping ------------------------------------------------------------
+
+    def _map(self) -> mmap.mmap:
+        mm = self._mm
+        if mm is not None and self._pid == os.getpid():
+            return mm
+        with self._lock:
+            if self._mm is not None and self._pid == os.getpid():
+                return self._mm
+            # A forked child must not share the parent's fd: flock locks are per open file.
+            self._mm = self._fd = None
+            slots = max(PROBE, (self.size - DATA_OFFSET) // self.slot_size)
+            total = DATA_OFFSET + slots * self.slot_size
+            path = self.path
+            if path is None:
+                mm = mmap.mmap(-1, total)
+                _HEADER.pack_into(mm, 0, MAGIC, slots, self.slot_size)
+            else:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+                self._fd = fd
+                with self._file_lock():
+                    if os.fstat(fd).st_size < DATA_OFFSET:
+                        os.ftruncate(fd, total)
+                    mm = mmap.mmap(fd, os.fstat(fd).st_size)
+                    magic, file_slots, file_slot_size = _HEADER.unpack_from(mm, 0)
+                    if magic != MAGIC:
+                        if len(mm) < total:
+                            mm.close()
+                            os.ftruncate(fd, total)
+                            mm = mmap.mmap(fd, total)
+                        _HEADER.pack_into(mm, 0, MAGIC, slots, self.slot_size)
+                    else:
+                        # Another worker created the file: use its geometry.
+                        slots, self.slot_size = file_slots, file_slot_size
+            self.slots = slots
+            self._mm = mm
+            self._pid = os.getpid()
+            return mm
+
+    @contextmanager
+    def _file_lock(self):
+        if self._fd is None or fcntl is None:
+            yield
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @contextmanager
+    def _write_lock(self):
+        mm = self._map()
+        with self._lock, self._file_lock():
+            yield mm
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.close()
+            if self._fd is not None:
+                os.close(self._fd)
+            self._mm = self._fd = self._pid = None
+
+    # -- slots ----------------------------------------------------------------
+
+    def _offsets(self, hashed: int):
+        first = hashed % self.slots
+        for i in range(PROBE):
+            yield DATA_OFFSET + ((first + i) % self.slots) * self.slot_size
+
+    def _read(self, mm, offset: int, key: bytes, now: float) -> bytes | None:
+        crc, key_len, value_len, expires_at, _ = _SLOT.unpack_from(mm, offset)
+        if key_len != len(key) or (expires_at and expires_at <= now):
+            return None
+        start = offset + SLOT_HEADER_SIZE
+        if SLOT_HEADER_SIZE + key_len + value_len > self.slot_size:
+            return None
+        data = mm[start:start + key_len + value_len]
+        if data[:key_len] != key:
+            return None
+        value = data[key_len:]
+        return value if _crc(key, value, expires_at) == crc else None
+
+    def _lookup(self, mm, key: bytes, now: float) -> bytes | None:
+        for offset in self._offsets(_hash(key)):
+            value = self._read(mm, offset, key, now)
+            if value is not None:
+                return value
+        return None
+
+    def _write(self, mm, key: bytes, value: bytes, ttl: float | None, now: float):
+        target, oldest, oldest_at = None, None, float("inf")
+        for offset in self._offsets(_hash(key)):
+            _, key_len, _, expires_at, written_at = _SLOT.unpack_from(mm, offset)
+            start = offset + SLOT_HEADER_SIZE
+            if key_len == len(key) and mm[start:start + key_len] == key:
+                target = offset
+                break
+            if key_len == 0 or (expires_at and expires_at <= now):
+                target = target or offset
+            elif written_at < oldest_at:
+                oldest, oldest_at = offset, written_at
+        if target is None:
+            target = oldest
+            self.evictions += 1
+        expires_at = now + ttl if ttl else 0.0
+        header = _SLOT.pack(_crc(key, value, expires_at), len(key), len(value), expires_at, now)
+        mm[target:target + SLOT_HEADER_SIZE + len(key) + len(value)] = (
+            header.ljust(SLOT_HEADER_SIZE, b"\0") + key + value
+        )
+
+    def _erase(self, mm, key: bytes):
+        for offset in self._offsets(_hash(key)):
+            _, key_len, _, _, _ = _SLOT.unpack_from(mm, offset)
+            start = offset + SLOT_HEADER_SIZE
+            if key_len == len(key) and mm[start:start + key_len] == key:
+                mm[offset:offset + SLOT_HEADER_SIZE] = b"\0" * SLOT_HEADER_SIZE
+
+    def fits(self, key: str, value: bytes) -> bool:
+        return SLOT_HEADER_SIZE + len(key.encode()) + len(value) <= self.slot_size
+
+    # -- public API -----------------------------------------------------------
+
+    def get(self, key: str) -> bytes | None:
+        value = self._lookup(self._map(), key.encode(), time.time())
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        """Store ``value`` for ``ttl`` seconds (None: until evicted); False if it does not fit."""
+        if not self.fits(key, value):
+            return False
+        with self._write_lock() as mm:
+            self._write(mm, key.encode(), bytes(value), ttl, time.time())
+            self.sets += 1
+        return True
+
+    def delete(self, key: str):
+        with self._write_lock() as mm:
+            self._erase(mm, key.encode())
+
+    def update(self, key: str, fn, ttl: float | None = None):
+        """Atomically replace the value: ``fn(old bytes or None) -> (new bytes or None, result)``."""
+        encoded = key.encode()
+        with self._write_lock() as mm:
+            now = time.time()
+            value, result = fn(self._lookup(mm, encoded, now))
+            if value is None:
+                self._erase(mm, encoded)
+            elif self.fits(key, value):
+                self._write(mm, encoded, value, ttl, now)
+            return result
+
+    def _generation_offset(self, namespace: str) -> int:
+        return HEADER_SIZE + (_hash(namespace.encode()) % GENERATIONS) * _GENERATION.size
+
+    def generation(self, namespace: str) -> int:
+        return _GENERATION.unpack_from(self._map(), self._generation_offset(namespace))[0]
+
+    def bump(self, namespace: str) -> int:
+        """Invalidate per-process data of ``namespace`` in every worker."""
+        with self._write_lock() as mm:
+            offset = self._generation_offset(namespace)
+            generation = _GENERATION.unpack_from(mm, offset)[0] + 1
+            _GENERATION.pack_into(mm, offset, generation)
+            return generation
+
+    def clear(self):
+        with self._write_lock() as mm:
+            for i in range(self.slots):
+                offset = DATA_OFFSET + i * self.slot_size
+                mm[offset:offset + SLOT_HEADER_SIZE] = b"\0" * SLOT_HEADER_SIZE
+
+    def stats(self) -> dict:
+        mm = self._map()
+        now = time.time()
+        used = 0
+        for i in range(self.slots):
+            _, key_len, _, expires_at, _ = _SLOT.unpack_from(mm, DATA_OFFSET + i * self.slot_size)
+            if key_len and not (expires_at and expires_at <= now):
+                used += 1
+        return {
+            "shared": self.shared,
+            "path": self.path,
+            "slots": self.slots,
+            "slotBytes": self.slot_size,
+            "used": used,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+        }
+
+
+shared_cache = SharedCache()
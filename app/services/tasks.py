@@ -0,0 +1,347 @@
+"""Reward task generation from templates and events.
+
+Templates live in ``Task_templates`` (``DEFAULT_TEMPLATES`` is used while the
+collection is empty) and come in two scopes:
+
+- ``weekly``: one task per wallet per ISO week;
+- ``event``: one task per wallet per event it holds a ticket for, for events
+  whose status is not in the template's ``skipStatuses`` (default "ended").
+
+Task IDs are derived from (template, period, event, lowercased wallet), and
+tasks store the same lowercased ``walletAddress``. Running a refresh twice
+creates nothing new: each chunk of up to 500 candidate tasks is checked
+with one ``get_all`` and the missing ones are written with one
+``WriteBatch`` of ``create`` writes, which never overwrite a task (a
+claimed one in particular). If a concurrent run created one of them first
+the batch fails as a whole and the chunk falls back to one ``create`` per
+task, skipping those that exist. Chunks are written ``TASKS_WRITE_CONCURRENCY`` at a
+time. Ticket holders come from one Tickets scan (or one ``in`` query per 30
+selected wallets) against the events Firestore returns for the templates'
+statuses, not one query per event.
+
+A bulk refresh runs as a background job (``start_bulk``): its progress and
+result are kept in ``Task_jobs/{jobId}`` so any worker can report them.
+
+``claim_tasks`` writes each ``claimed`` flag with a ``last_update_time``
+precondition, so two concurrent claims of one task report it claimed once.
+"""
+import datetime as dt
+import hashlib
+import itertools
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import config
+from .firebase import db
+from .loader import document_loader
+
+COLLECTION_NAME = "Task_logs"
+TEMPLATES_COLLECTION = "Task_templates"
+MAX_BATCH_WRITES = 500
+MAX_CLAIM_ATTEMPTS = 3
+JOBS_COLLECTION = "Task_jobs"
+# Firestore limits on the values of one "in" / "not-in" filter
+MAX_IN_VALUES = 30
+MAX_NOT_IN_VALUES = 10
+
+DEFAULT_TEMPLATES = [
+    {
+        "templateId": "weekly-checkin",
+        "scope": "weekly",
+        "taskTitle": "Weekly check-in",
+        "taskDescription": "Open HackConnect at least once this week.",
+        "taskRewards": 5,
+        "identifier": "weekly_checkin",
+    },
+    {
+        "templateId": "event-checkin",
+        "scope": "event",
+        "taskTitle": "Check in at {eventTitle}",
+        "taskDescription": "Show your ticket at the entrance of {eventTitle}.",
+        "taskRewards": 20,
+        "identifier": "event_checkin",
+    },
+]
+
+
+def current_period(now: dt.datetime | None = None) -> str:
+    year, week, _ = (now or dt.datetime.now(dt.timezone.utc)).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def normalize_wallet(wallet_address: str) -> str:
+    """Form of a wallet address used in task IDs and stored on tasks."""
+    return wallet_address.lower()
+
+
+def task_id(template_id: str, period: str, wallet_address: str, event_id: str | None = None) -> str:
+    """Deterministic document ID, so regenerating a task finds the existing one."""
+    key = "|".join((template_id, period, event_id or "", normalize_wallet(wallet_address)))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def load_templates(template_ids: list[str] | None = None) -> list[dict]:
+    templates = [
+        {"templateId": doc.id, **(doc.to_dict() or {})}
+        for doc in db.collection(TEMPLATES_COLLECTION).stream()
+    ]
+    templates = [t for t in templates if t.get("active", True)] or DEFAULT_TEMPLATES
+    if template_ids:
+        templates = [t for t in templates if t["templateId"] in template_ids]
+    return templates
+
+
+def _event_eligible(template: dict, event: dict) -> bool:
+    return event.get("status") not in template.get("skipStatuses", ["ended"])
+
+
+def build_task(template: dict, wallet_address: str, period: str,
+               event_id: str | None = None, event: dict | None = None) -> tuple[str, dict]:
+    fields = {"eventTitle": (event or {}).get("title", "")}
+    return task_id(template["templateId"], period, wallet_address, event_id), {
+        "eventId": event_id,
+        "taskTitle": str(template.get("taskTitle", "")).format_map(fields),
+        "taskDescription": str(template.get("taskDescription", "")).format_map(fields),
+        "taskRewards": template.get("taskRewards", 0),
+        "claimed": False,
+        "walletAddress": normalize_wallet(wallet_address),
+        "identifier": template.get("identifier"),
+        "templateId": template["templateId"],
+        "period": period,
+        "createdAt": dt.datetime.now(),
+    }
+
+
+def plan_tasks(templates: list[dict], wallets, period: str, participants: dict):
+    """Yield (task_id, task) for ``wallets`` and ``participants`` ({event_id: (event, wallets)})."""
+    for template in templates:
+        if template.get("scope") == "event":
+            for event_id, (event, event_wallets) in participants.items():
+                if _event_eligible(template, event):
+                    for wallet in event_wallets:
+                        yield build_task(template, wallet, period, event_id, event)
+        else:
+            for wallet in wallets:
+                yield build_task(template, wallet, period)
+
+
+def _write_chunk(chunk: list[tuple[str, dict]]) -> tuple[int, int]:
+    from google.api_core.exceptions import AlreadyExists
+
+    tasks = dict(chunk)  # wallets differing only in case plan the same task
+    refs = {tid: db.collection(COLLECTION_NAME).document(tid) for tid in tasks}
+    existing = {snapshot.id for snapshot in db.get_all(list(refs.values())) if snapshot.exists}
+    missing = [tid for tid in tasks if tid not in existing]
+    if not missing:
+        return 0, len(chunk)
+    batch = db.batch()
+    for tid in missing:
+        batch.create(refs[tid], tasks[tid])
+    try:
+        batch.commit()
+        created = len(missing)
+    except AlreadyExists:
+        # A concurrent run created some of them since the read; the batch applied nothing.
+        created = 0
+        for tid in missing:
+            try:
+                refs[tid].create(tasks[tid])
+                created += 1
+            except AlreadyExists:
+                pass
+    return created, len(chunk) - created
+
+
+def write_missing(tasks, concurrency: int = config.TASKS_WRITE_CONCURRENCY) -> dict:
+    """Write the tasks that do not exist yet in chunks of ``MAX_BATCH_WRITES``."""
+    started = time.monotonic()
+    result = {"created": 0, "skipped": 0, "batches": 0}
+    tasks = iter(tasks)
+    chunks = iter(lambda: list(itertools.islice(tasks, MAX_BATCH_WRITES)), [])
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="task-writer") as executor:
+        # Submit a bounded window of chunks so a full refresh never sits in memory at once.
+        while True:
+            window = list(itertools.islice(chunks, max(1, concurrency) * 2))
+            if not window:
+                break
+            for created, skipped in executor.map(_write_chunk, window):
+                result["created"] += created
+                result["skipped"] += skipped
+                result["batches"] += 1
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+def _all_wallets() -> list[str]:
+    wallets = set()
+    for doc in db.collection("Wallets").select(["walletAddress"]).stream():
+        wallet = (doc.to_dict() or {}).get("walletAddress")
+        if wallet:
+            wallets.add(wallet)
+    return sorted(wallets)
+
+
+def _eligible_events(event_templates: list[dict]) -> dict:
+    """{event_id: event} of the events at least one of ``event_templates`` applies to."""
+    query = db.collection("Events")
+    # A status every event template skips can be filtered out by Firestore.
+    skipped = set.intersection(*(set(t.get("skipStatuses", ["ended"])) for t in event_templates))
+    if skipped and len(skipped) <= MAX_NOT_IN_VALUES:
+        query = query.where("status", "not-in", sorted(skipped))
+    events = {}
+    for doc in query.stream():
+        event = doc.to_dict() or {}
+        if any(_event_eligible(t, event) for t in event_templates):
+            events[doc.id] = event
+    return events
+
+
+def _tickets(wallets: set[str] | None):
+    """Yield (event_id, wallet) of every ticket, or of the tickets held by ``wallets``."""
+    tickets = db.collection("Tickets").select(["eventId", "walletAddress"])
+    if wallets is None:
+        queries = [tickets]
+    else:
+        ordered = sorted(wallets)
+        queries = [tickets.where("walletAddress", "in", ordered[i:i + MAX_IN_VALUES])
+                   for i in range(0, len(ordered), MAX_IN_VALUES)]
+    for query in queries:
+        for ticket in query.stream():
+            data = ticket.to_dict() or {}
+            yield data.get("eventId"), data.get("walletAddress")
+
+
+def _participants(templates: list[dict], wallets: set[str] | None) -> dict:
+    """{event_id: (event, wallets)} from one Events query and one Tickets scan."""
+    event_templates = [t for t in templates if t.get("scope") == "event"]
+    if not event_templates:
+        return {}
+    events = _eligible_events(event_templates)
+    holders: dict[str, set] = {}
+    for event_id, wallet in _tickets(wallets):
+        if wallet and event_id in events:
+            holders.setdefault(event_id, set()).add(wallet)
+    return {event_id: (events[event_id], sorted(holders[event_id])) for event_id in sorted(holders)}
+
+
+def generate_bulk(wallets: list[str] | None = None, period: str | None = None,
+                  template_ids: list[str] | None = None) -> dict:
+    """Generate this period's tasks for ``wallets`` (default: every wallet in Wallets)."""
+    period = period or current_period()
+    templates = load_templates(template_ids)
+    selected = set(wallets) if wallets else None
+    wallets = sorted(selected) if selected else _all_wallets()
+    participants = _participants(templates, selected)
+    result = write_missing(plan_tasks(templates, wallets, period, participants))
+    return {"period": period, "wallets": len(wallets), "templates": len(templates), **result}
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def start_bulk(wallets: list[str] | None = None, period: str | None = None,
+               template_ids: list[str] | None = None) -> dict:
+    """Run ``generate_bulk`` as a background job; return its ``Task_jobs`` document."""
+    job_id = uuid.uuid4().hex
+    job = {
+        "jobId": job_id,
+        "status": "running",
+        "period": period or current_period(),
+        "requestedWallets": len(wallets) if wallets else None,
+        "startedAt": _now(),
+    }
+    ref = db.collection(JOBS_COLLECTION).document(job_id)
+    ref.set(job)
+    threading.Thread(
+        target=_run_job, args=(ref, wallets, job["period"], template_ids),
+        name=f"task-job-{job_id[:8]}", daemon=True,
+    ).start()
+    return job
+
+
+def _run_job(ref, wallets, period, template_ids):
+    try:
+        result = generate_bulk(wallets, period, template_ids)
+    except Exception as e:
+        logging.error("Task generation job %s failed", ref.id, exc_info=True)
+        ref.update({"status": "failed", "error": str(e), "finishedAt": _now()})
+        return
+    ref.update({"status": "completed", "result": result, "finishedAt": _now()})
+
+
+def get_job(job_id: str) -> dict | None:
+    snapshot = db.collection(JOBS_COLLECTION).document(job_id).get()
+    return snapshot.to_dict() if snapshot.exists else None
+
+
+def generate_for_wallet(wallet_address: str, period: str | None = None,
+                        template_ids: list[str] | None = None) -> dict:
+    """Generate this period's tasks for one wallet, using only the events it holds tickets for."""
+    period = period or current_period()
+    templates = load_templates(template_ids)
+    participants = {}
+    if any(t.get("scope") == "event" for t in templates):
+        tickets = db.collection("Tickets").where("walletAddress", "==", wallet_address).select(["eventId"]).stream()
+        event_ids = sorted({(t.to_dict() or {}).get("eventId") for t in tickets} - {None})
+        for snapshot in document_loader.load_many([("Events", event_id) for event_id in event_ids]):
+            if snapshot.exists:
+                participants[snapshot.id] = (snapshot.to_dict() or {}, [wallet_address])
+    planned = list(plan_tasks(templates, [wallet_address], period, participants))
+    result = write_missing(planned, concurrency=1)
+    return {"period": period, "taskIds": [tid for tid, _ in planned], **result}
+
+
+def _claim(wallet_address: str, refs: list, rejected: dict) -> tuple[list[str], int]:
+    """Claim the valid tasks of ``refs`` in one batch; return (claimed ids, their rewards).
+
+    Each task update carries a ``last_update_time`` precondition: if a concurrent claim
+    commits first, the batch fails and the tasks are read again (and found claimed).
+    """
+    from google.api_core.exceptions import FailedPrecondition
+
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        snapshots = db.get_all(refs)
+        batch = db.batch()
+        claimed, rewards, chunk_rejected = [], 0, {}
+        for snapshot in snapshots:
+            data = snapshot.to_dict() if snapshot.exists else None
+            if data is None:
+                chunk_rejected[snapshot.id] = "not found"
+            elif str(data.get("walletAddress", "")).lower() != wallet_address.lower():
+                chunk_rejected[snapshot.id] = "not owned by wallet"
+            elif data.get("claimed"):
+                chunk_rejected[snapshot.id] = "already claimed"
+            else:
+                batch.update(db.collection(COLLECTION_NAME).document(snapshot.id),
+                             {"claimed": True, "claimedAt": dt.datetime.now()},
+                             option=db.write_option(last_update_time=snapshot.update_time)
+                             if snapshot.update_time else None)
+                claimed.append(snapshot.id)
+                rewards += data.get("taskRewards") or 0
+        if claimed:
+            try:
+                batch.commit()
+            except FailedPrecondition:
+                continue
+        rejected.update(chunk_rejected)
+        return claimed, rewards
+
+    for ref in refs:
+        rejected.setdefault(ref.id, "claimed concurrently, please retry")
+    return [], 0
+
+
+def claim_tasks(wallet_address: str, task_ids: list[str]) -> dict:
+    """Claim ``task_ids`` for ``wallet_address`` with one read and one write per 500 tasks."""
+    claimed, rejected, rewards = [], {}, 0
+    task_ids = list(dict.fromkeys(task_ids))
+    for start in range(0, len(task_ids), MAX_BATCH_WRITES):
+        refs = [db.collection(COLLECTION_NAME).document(tid) for tid in task_ids[start:start + MAX_BATCH_WRITES]]
+        chunk_claimed, chunk_rewards = _claim(wallet_address, refs, rejected)
+        claimed += chunk_claimed
+        rewards += chunk_rewards
+    return {"claimed": claimed, "rejected": rejected, "rewards": rewards}
@@ -0,0 +1,101 @@
+"""Ticket issuing shared by ``joinEvent`` and the purchase queue.
+
+``prepare_ticket`` builds the signed QR payload, renders the QR code and
+uploads it; it returns the Tickets document without writing it, so callers
+decide whether the ticket is saved on its own or as part of a batch. Once
+the ticket and its tier reservation commit, ``ticket_issued`` caches the QR;
+if they do not, ``discard_ticket`` deletes the uploaded QR again.
+"""
+import datetime as dt
+import hashlib
+import json
+import logging
+import uuid
+from io import BytesIO
+
+from .. import config
+from .firebase import storage_bucket
+from .media import publish
+from .shared_cache import shared_cache, QR_KEY
+
+
+def generate_signature(payload: dict) -> str:
+    """Generate a simple signature for the QR code payload."""
+    payload_str = json.dumps(payload, sort_keys=True)
+    return hashlib.sha256(payload_str.encode()).hexdigest()
+
+
+def render_qr_png(qr_payload: dict) -> BytesIO:
+    import qrcode as qr  # deferred: pulls in PIL, only needed here
+
+    qr_code = qr.QRCode(
+        version=1,
+        error_correction=qr.ERROR_CORRECT_H,
+        box_size=10,
+        border=4,
+    )
+    qr_code.add_data(json.dumps(qr_payload))
+    qr_code.make(fit=True)
+
+    img = qr_code.make_image(fill_color="black", back_color="white")
+    img_byte_arr = BytesIO()
+    img.save(img_byte_arr, 'PNG')  # PIL Image.save takes format as positional arg
+    img_byte_arr.seek(0)
+    return img_byte_arr
+
+
+def prepare_ticket(event_id: str, wallet_address: str, event_title: str, price_bought: float,
+                   tier_name: str) -> tuple[dict, bytes]:
+    """Sign, render and upload the QR code of a new ticket; return (its Tickets document, QR PNG)."""
+    ticket_id = str(uuid.uuid4())
+    qr_payload = {
+        "eventTitle": event_title,
+        "eventId": event_id,
+        "walletAddress": wallet_address,
+        "ticketId": ticket_id,
+        "purchasedAt": dt.datetime.now().isoformat(),
+        "priceBought": price_bought,
+        "tierName": tier_name,
+        "status": "active",
+    }
+    qr_payload["signature"] = generate_signature(qr_payload)
+
+    png = render_qr_png(qr_payload)
+    blob_path = f"qrcodes/events/{event_id}/{wallet_address}/{ticket_id}.png"
+    blob = storage_bucket.blob(blob_path)
+    blob.upload_from_file(png, content_type='image/png')
+
+    return {
+        **qr_payload,
+        "qrCodeUrl": publish(blob),
+        "qrCodePath": blob_path,
+        "purchasedAtTimestamp": dt.datetime.now(),  # Keep datetime for queries
+        # purchasedAt (ISO string) is preserved for signature verification
+    }, png.getvalue()
+
+
+def ticket_issued(ticket_doc: dict, png: bytes):
+    """Cache the QR of a committed ticket: buyers usually open it right away."""
+    shared_cache.set(QR_KEY.format(ticket_doc["ticketId"]), png, ttl=config.SHARED_CACHE_QR_TTL)
+
+
+def discard_ticket(ticket_doc: dict):
+    """Delete the uploaded QR of a ticket that was never committed."""
+    try:
+        storage_bucket.blob(ticket_doc["qrCodePath"]).delete()
+    except Exception:
+        logging.warning("Could not delete QR code %s of a discarded ticket", ticket_doc["qrCodePath"],
+                        exc_info=True)
+
+
+def join_response(ticket_doc: dict) -> dict:
+    return {
+        "success": True,
+        "message": "Successfully joined event and generated ticket",
+        "ticketId": ticket_doc["ticketId"],
+        "qrCodeUrl": ticket_doc["qrCodeUrl"],
+        "eventId": ticket_doc["eventId"],
+        "walletAddress": ticket_doc["walletAddress"],
+        "tierName": ticket_doc["tierName"],
+        "priceBought": ticket_doc["priceBought"],
+    }
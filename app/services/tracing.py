@@ -0,0 +1,297 @@
+"""Per-request tracing of Firestore and Storage round trips.
+
+When ``TRACE_BACKEND_CALLS`` is enabled the Firestore client and the Storage
+bucket are wrapped in ``TracedProxy`` objects. Every call that actually hits
+the network (``get``, ``set``, ``update``, ``upload_from_file``, ``exists``...)
+is recorded on the trace of the current request together with its duration
+and the router line that issued it.
+
+The ``TRACE_HEADER`` response header is computed when the handler returns,
+so it does not include calls made while a streamed body (NDJSON exports,
+event streams) is produced. The trace log line is emitted after the body
+has been sent and covers the whole request.
+
+The same proxies enforce the request deadline budget (``deadlines``): they
+are installed whenever ``TRACE_BACKEND_CALLS`` or ``REQUEST_DEADLINE_ENABLED``
+is set, and each call is made through ``deadlines.call_with_budget``.
+"""
+import contextvars
+import logging
+import os
+import time
+import traceback
+from dataclasses import dataclass, field
+
+from .. import config
+from . import deadlines
+
+
+# Methods that trigger a network round trip.
+BACKEND_OPS = {
+    # Firestore
+    "get", "stream", "set", "update", "delete", "create", "add",
+    "get_all", "commit",
+    # Storage
+    "exists", "reload", "upload_from_string", "upload_from_file",
+    "upload_from_filename", "download_as_bytes", "download_as_string",
+    "download_to_file", "make_public", "patch",
+}
+
+# Methods that build a new reference/query; their results are traced too.
+BUILDER_OPS = {
+    "collection", "document", "where", "limit", "limit_to_last", "order_by",
+    "start_at", "start_after", "end_at", "end_before", "select", "offset",
+    "batch", "blob", "get_blob", "count",  # count() builds an aggregation query; its get() is the call
+}
+
+# Ops that only read; repeating one with the same target is flagged.
+READ_OPS = {"get", "stream", "get_all", "exists", "reload",
+            "download_as_bytes", "download_as_string", "download_to_file"}
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SERVICES_DIR = os.path.join(_APP_DIR, "services")
+
+
+@dataclass
+class BackendCall:
+    op: str
+    target: str
+    duration_ms: float
+    origin: str
+    error: str | None = None
+
+    @property
+    def collection(self) -> str:
+        target = self.target.split("[", 1)[-1]
+        return target.split("/", 1)[0].split(".", 1)[0]
+
+
+@dataclass
+class RequestTrace:
+    method: str
+    path: str
+    budget: int = config.TRACE_ROUNDTRIP_BUDGET
+    calls: list[BackendCall] = field(default_factory=list)
+
+    def record(self, call: BackendCall):
+        self.calls.append(call)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(c.duration_ms for c in self.calls)
+
+    def repeated_reads(self) -> dict[str, int]:
+        """Return read targets that were fetched more than once."""
+        seen: dict[str, int] = {}
+        for c in self.calls:
+            if c.op in READ_OPS:
+                key = f"{c.op} {c.target}"
+                seen[key] = seen.get(key, 0) + 1
+        return {k: n for k, n in seen.items() if n > 1}
+
+    @property
+    def over_budget(self) -> bool:
+        return len(self.calls) > self.budget
+
+    def summary_header(self) -> str:
+        dup = sum(n - 1 for n in self.repeated_reads().values())
+        return (
+            f"calls={len(self.calls)}; ms={self.total_ms:.1f}; "
+            f"budget={self.budget}; dup_reads={dup}; "
+            f"over_budget={int(self.over_budget)}"
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "calls": len(self.calls),
+            "total_ms": round(self.total_ms, 2),
+            "budget": self.budget,
+            "over_budget": self.over_budget,
+            "repeated_reads": self.repeated_reads(),
+            "detail": [
+                {
+                    "op": c.op,
+                    "collection": c.collection,
+                    "target": c.target,
+                    "ms": round(c.duration_ms, 2),
+                    "origin": c.origin,
+                    **({"error": c.error} if c.error else {}),
+                }
+                for c in self.calls
+            ],
+        }
+
+
+_current_trace: contextvars.ContextVar[RequestTrace | None] = contextvars.ContextVar(
+    "backend_trace", default=None
+)
+
+
+def start_trace(method: str, path: str) -> tuple[RequestTrace, contextvars.Token]:
+    trace = RequestTrace(method=method, path=path)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: contextvars.Token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> RequestTrace | None:
+    return _current_trace.get()
+
+
+def _call_origin() -> str:
+    """Return "file.py:line in func" of the innermost app frame outside services."""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(_APP_DIR) and not filename.startswith(_SERVICES_DIR):
+            rel = os.path.relpath(filename, os.path.dirname(_APP_DIR))
+            return f"{rel}:{frame.lineno} in {frame.name}"
+    return "<unknown>"
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, TracedProxy) else value
+
+
+def _traced_stream(iterator, finish):
+    error = None
+    try:
+        yield from iterator
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        finish(error)
+
+
+class TracedProxy:
+    """Transparent wrapper that records backend round trips on the current trace."""
+
+    __slots__ = ("_target", "_label")
+
+    def __init__(self, target, label: str = ""):
+        self._target = target
+        self._label = label
+
+    def _child_label(self, name: str, args, kwargs) -> str:
+        if name in ("collection", "document", "blob", "get_blob"):
+            part = "/".join(str(a) for a in args) if args else str(kwargs.get("blob_name", ""))
+            return f"{self._label}/{part}" if self._label else part
+        if name == "batch":
+            return "batch"
+        rendered = ",".join([repr(_unwrap(a)) for a in args] + [f"{k}={v!r}" for k, v in kwargs.items()])
+        return f"{self._label}.{name}({rendered})"
+
+    def _budget(self, name: str):
+        """The request's deadline budget, unless ``name`` does not go to the network on its own."""
+        budget = deadlines.current_budget()
+        if budget is None or (name in BUILDER_OPS and name != "get_blob"):
+            return None
+        if self._label == "batch" and name != "commit":
+            return None  # batch writes are sent by commit()
+        if name not in deadlines.BUDGETED_OPS:
+            budget.check()  # stream: no per-call timeout, only refuse to start late
+            return None
+        return budget
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or (name not in BACKEND_OPS and name not in BUILDER_OPS):
+            return attr
+
+        def wrapper(*args, **kwargs):
+            args = tuple(_unwrap(a) for a in args)
+            kwargs = {k: _unwrap(v) for k, v in kwargs.items()}
+            if name == "get_all" and args:
+                args = ([_unwrap(r) for r in args[0]],) + args[1:]
+            budget = self._budget(name)
+
+            def call():
+                if budget is None:
+                    return attr(*args, **kwargs)
+                return deadlines.call_with_budget(budget, name, attr, args, kwargs)
+
+            if name in BUILDER_OPS:
+                result = call()
+                if result is None:
+                    return result
+                return TracedProxy(result, self._child_label(name, args, kwargs))
+
+            trace = _current_trace.get()
+            if trace is None:
+                return call()
+
+            origin = _call_origin()
+            target = self._label
+            if name == "get_all" and args:
+                target = "get_all[" + ",".join(getattr(r, "path", repr(r)) for r in args[0]) + "]"
+            start = time.perf_counter()
+
+            def finish(error=None):
+                trace.record(BackendCall(
+                    op=name,
+                    target=target,
+                    duration_ms=(time.perf_counter() - start) * 1000,
+                    origin=origin,
+                    error=error,
+                ))
+
+            try:
+                result = call()
+            except Exception as e:
+                finish(type(e).__name__)
+                raise
+            if name == "stream":
+                # Streams are lazy; the round trip ends when the iterator is drained.
+                return _traced_stream(result, finish)
+            finish()
+            return result
+
+        return wrapper
+
+    def __iter__(self):
+        return iter(self._target)
+
+    def __repr__(self):
+        return f"TracedProxy({self._label or type(self._target).__name__})"
+
+
+def traced(target, label: str = ""):
+    """Wrap ``target`` if backend tracing or request deadlines are enabled, otherwise return it unchanged."""
+    if not (config.TRACE_BACKEND_CALLS or config.REQUEST_DEADLINE_ENABLED):
+        return target
+    return TracedProxy(target, label)
+
+
+async def _logged_after(body_iterator, trace: RequestTrace):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        log_trace(trace)
+
+
+def log_after_body(response, trace: RequestTrace):
+    """Log ``trace`` once ``response``'s body has been sent, so streamed work is counted."""
+    body_iterator = getattr(response, "body_iterator", None)
+    if body_iterator is None:
+        log_trace(trace)
+    else:
+        response.body_iterator = _logged_after(body_iterator, trace)
+
+
+def log_trace(trace: RequestTrace):
+    """Emit the trace as a log record; warn when it breaks the round-trip budget."""
+    flagged = trace.over_budget or bool(trace.repeated_reads())
+    level = logging.WARNING if flagged else logging.DEBUG
+    logging.getLogger("app.tracing").log(
+        level,
+        "backend trace %s %s: %s",
+        trace.method,
+        trace.path,
+        trace.summary_header(),
+        extra={"backend_trace": trace.to_dict()},
+    )
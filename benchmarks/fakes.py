@@ -0,0 +1,525 @@
+"""In-memory stand-ins for Firestore, Cloud Storage and Gemini.
+
+They implement the subset of the client APIs used by the routers and add a
+fixed per-round-trip latency so that concurrency and call counts show up in
+the numbers the same way they would against the real services.
+"""
+import copy
+import datetime as dt
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+
+def _now():
+    return dt.datetime.now(dt.timezone.utc)
+
+
+def _get_field(data: dict, path: str):
+    value = data
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _resolve(current, value):
+    """Apply Firestore transforms (Increment, ArrayUnion, SERVER_TIMESTAMP...)."""
+    kind = type(value).__name__
+    if kind == "Increment":
+        return (current or 0) + value.value
+    if kind == "ArrayUnion":
+        base = list(current or [])
+        return base + [v for v in value.values if v not in base]
+    if kind == "ArrayRemove":
+        return [v for v in (current or []) if v not in value.values]
+    if kind == "Sentinel":
+        return _now()
+    if isinstance(value, dict):
+        base = dict(current) if isinstance(current, dict) else {}
+        for k, v in value.items():
+            base[k] = _resolve(base.get(k), v)
+        return base
+    return value
+
+
+def _set_field(data: dict, path: str, value):
+    parts = path.split(".")
+    for part in parts[:-1]:
+        data = data.setdefault(part, {})
+    if type(value).__name__ == "Sentinel" and "DELETE" in repr(value).upper():
+        data.pop(parts[-1], None)
+        return
+    data[parts[-1]] = _resolve(data.get(parts[-1]), value)
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time=None, create_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+        self.update_time = update_time
+        self.create_time = create_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return _get_field(self._data or {}, field)
+
+
+class _Store:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lock = threading.RLock()
+        self.collections: dict[str, dict[str, dict]] = {}
+        self.update_times: dict[str, dt.datetime] = {}
+        self.round_trips = 0
+        self.watchers: dict[str, list] = {}
+
+    def notify(self, collection: str, doc_id: str, removed: bool = False):
+        """Deliver a change to snapshot listeners on ``collection``."""
+        callbacks = self.watchers.get(collection)
+        if not callbacks:
+            return
+        ref = FakeDocumentReference(self, collection, doc_id)
+        change = SimpleNamespace(
+            type=SimpleNamespace(name="REMOVED" if removed else "MODIFIED"),
+            document=FakeSnapshot(ref, None if removed else self.collections[collection][doc_id],
+                                  self.update_times.get(ref.path)),
+        )
+        for callback in list(callbacks):
+            # Only the first callback carries the full document list.
+            callback([], [change], _now())
+
+    def roundtrip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+class FakeDocumentReference:
+    def __init__(self, store: _Store, collection: str, doc_id: str):
+        self._store = store
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    @property
+    def parent(self):
+        return FakeCollection(self._store, self._collection)
+
+    def _docs(self):
+        return self._store.collections.setdefault(self._collection, {})
+
+    def snapshot(self):
+        data = self._docs().get(self.id)
+        return FakeSnapshot(self, data, self._store.update_times.get(self.path))
+
+    def get(self, field_paths=None, transaction=None, retry=None, timeout=None):
+        self._store.roundtrip()
+        with self._store.lock:
+            return self.snapshot()
+
+    def _write(self, data):
+        self._docs()[self.id] = data
+        self._store.update_times[self.path] = _now()
+        self._store.notify(self._collection, self.id)
+
+    def set(self, document_data, merge=False, retry=None, timeout=None):
+        self._store.roundtrip()
+        with self._store.lock:
+            self._set(document_data, merge)
+
+    def _set(self, document_data, merge=False):
+        base = copy.deepcopy(self._docs().get(self.id, {})) if merge else {}
+        self._write(_resolve(base, copy.deepcopy(document_data)))
+
+    def create(self, document_data, retry=None, timeout=None):
+        self._store.roundtrip()
+        with self._store.lock:
+            self._create(document_data)
+
+    def _create(self, document_data):
+        self._check_absent()
+        self._set(document_data)
+
+    def _check_absent(self):
+        if self.id in self._docs():
+            raise AlreadyExists(f"Document already exists: {self.path}")
+
+    def update(self, field_updates, option=None, retry=None, timeout=None):
+        self._store.roundtrip()
+        with self._store.lock:
+            self._check(option)
+            self._update(field_updates)
+
+    def _check(self, option):
+        expected = getattr(option, "last_update_time", None)
+        if expected is not None and self._store.update_times.get(self.path) != expected:
+            raise FailedPrecondition(f"Document was modified: {self.path}")
+
+    def _update(self, field_updates):
+        if self.id not in self._docs():
+            raise NotFound(f"No document to update: {self.path}")
+        data = copy.deepcopy(self._docs()[self.id])
+        for key, value in field_updates.items():
+            _set_field(data, key.replace("`", ""), value)
+        self._write(data)
+
+    def delete(self, option=None, retry=None, timeout=None):
+        self._store.roundtrip()
+        with self._store.lock:
+            self._delete()
+
+    def _delete(self):
+        self._docs().pop(self.id, None)
+        self._store.update_times.pop(self.path, None)
+        self._store.notify(self._collection, self.id, removed=True)
+
+    def collection(self, name):
+        return FakeCollection(self._store, f"{self.path}/{name}")
+
+
+class FakeQuery:
+    def __init__(self, store: _Store, collection: str, filters=(), orders=(), limit=None, cursor=None):
+        self._store = store
+        self._collection = collection
+        self._filters = list(filters)
+        self._orders = list(orders)
+        self._limit = limit
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, orders=self._orders, limit=self._limit, cursor=self._cursor)
+        state.update(changes)
+        return FakeQuery(self._store, self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path, direction="ASCENDING"):
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(cursor=document_fields_or_snapshot)
+
+    def select(self, field_paths):
+        return self._copy()  # projections only shrink payloads; the fake returns whole documents
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            current = _get_field(data, field)
+            if op == "==" and current != value:
+                return False
+            if op == "!=" and current == value:
+                return False
+            if op == "in" and current not in value:
+                return False
+            if op == "not-in" and current in value:
+                return False
+            if op == "array_contains" and value not in (current or []):
+                return False
+            if op in ("<", "<=", ">", ">="):
+                if current is None:
+                    return False
+                if op == "<" and not current < value:
+                    return False
+                if op == "<=" and not current <= value:
+                    return False
+                if op == ">" and not current > value:
+                    return False
+                if op == ">=" and not current >= value:
+                    return False
+        return True
+
+    def _results(self):
+        with self._store.lock:
+            docs = self._store.collections.get(self._collection, {})
+            rows = [(doc_id, data) for doc_id, data in docs.items() if self._matches(data)]
+        for field, direction in reversed(self._orders):
+            rows.sort(
+                key=lambda r: (_get_field(r[1], field) is None, _get_field(r[1], field)),
+                reverse=str(direction).upper().startswith("DESC"),
+            )
+        if self._cursor is not None:
+            cursor_id = getattr(self._cursor, "id", None)
+            ids = [doc_id for doc_id, _ in rows]
+            if cursor_id in ids:
+                rows = rows[ids.index(cursor_id) + 1:]
+        if self._limit is not None:
+            rows = rows[: self._limit]
+        return [
+            FakeSnapshot(
+                FakeDocumentReference(self._store, self._collection, doc_id),
+                data,
+                self._store.update_times.get(f"{self._collection}/{doc_id}"),
+            )
+            for doc_id, data in rows
+        ]
+
+    def get(self, transaction=None, retry=None, timeout=None):
+        self._store.roundtrip()
+        return self._results()
+
+    def stream(self, transaction=None, retry=None, timeout=None):
+        self._store.roundtrip()
+        yield from self._results()
+
+    def on_snapshot(self, callback):
+        """Register a listener on the whole collection (query filters are ignored)."""
+        with self._store.lock:
+            self._store.watchers.setdefault(self._collection, []).append(callback)
+            callback(self._results(), [], _now())
+        return FakeWatch(self._store, self._collection, callback)
+
+
+class FakeWatch:
+    def __init__(self, store, collection, callback):
+        self._store = store
+        self._collection = collection
+        self._callback = callback
+        self.is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+        callbacks = self._store.watchers.get(self._collection, [])
+        if self._callback in callbacks:
+            callbacks.remove(self._callback)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, store: _Store, name: str):
+        super().__init__(store, name)
+        self.id = name.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        return FakeDocumentReference(self._store, self._collection, document_id or uuid.uuid4().hex[:20])
+
+    def add(self, document_data, document_id=None, retry=None, timeout=None):
+        ref = self.document(document_id)
+        ref.set(document_data)
+        return _now(), ref
+
+
+class FakeWriteBatch:
+    def __init__(self, store: _Store):
+        self._store = store
+        self._ops = []
+        self._checks = []
+
+    def set(self, reference, document_data, merge=False):
+        self._ops.append(lambda: reference._set(document_data, merge))
+        return self
+
+    def create(self, reference, document_data):
+        # Checked before any write: like Firestore, a batch with one existing document applies nothing.
+        self._checks.append(reference._check_absent)
+        self._ops.append(lambda: reference._create(document_data))
+        return self
+
+    def update(self, reference, field_updates, option=None):
+        self._checks.append(lambda: reference._check(option))
+        self._ops.append(lambda: reference._update(field_updates))
+        return self
+
+    def delete(self, reference, option=None):
+        self._ops.append(lambda: reference._delete())
+        return self
+
+    def __len__(self):
+        return len(self._ops)
+
+    def commit(self, retry=None, timeout=None):
+        self._store.roundtrip()
+        with self._store.lock:
+            for check in self._checks:
+                check()
+            for op in self._ops:
+                op()
+        self._ops = []
+        self._checks = []
+        return []
+
+
+class FakeFirestore:
+    """Subset of ``google.cloud.firestore.Client`` backed by dicts."""
+
+    def __init__(self, latency: float = 0.0):
+        self._store = _Store(latency)
+
+    @property
+    def round_trips(self) -> int:
+        return self._store.round_trips
+
+    def reset(self):
+        with self._store.lock:
+            self._store.collections.clear()
+            self._store.update_times.clear()
+            self._store.round_trips = 0
+
+    def seed(self, collection: str, docs: dict[str, dict]):
+        """Load documents without paying round-trip latency."""
+        with self._store.lock:
+            target = self._store.collections.setdefault(collection, {})
+            now = _now()
+            for doc_id, data in docs.items():
+                target[doc_id] = data
+                self._store.update_times[f"{collection}/{doc_id}"] = now
+
+    def collection(self, name):
+        return FakeCollection(self._store, name)
+
+    def document(self, path):
+        collection, doc_id = path.rsplit("/", 1)
+        return FakeDocumentReference(self._store, collection, doc_id)
+
+    def batch(self):
+        return FakeWriteBatch(self._store)
+
+    def write_option(self, **kwargs):
+        return SimpleNamespace(**kwargs)
+
+    def get_all(self, references, field_paths=None, transaction=None, retry=None, timeout=None):
+        self._store.roundtrip()
+        with self._store.lock:
+            snapshots = [ref.snapshot() for ref in references]
+        yield from snapshots
+
+
+class FakeBlob:
+    def __init__(self, bucket: "FakeBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+
+    @property
+    def _entry(self):
+        return self.bucket._objects.get(self.name)
+
+    @property
+    def public_url(self):
+        return f"https://storage.example.test/{self.bucket.name}/{self.name}"
+
+    def generate_signed_url(self, version="v4", expiration=None, method="GET", **kwargs):
+        return f"{self.public_url}?X-Goog-Signature=fake"
+
+    @property
+    def size(self):
+        return len(self._entry["data"]) if self._entry else None
+
+    @property
+    def content_type(self):
+        return self._entry["content_type"] if self._entry else None
+
+    @property
+    def etag(self):
+        return self._entry["etag"] if self._entry else None
+
+    @property
+    def updated(self):
+        return self._entry["updated"] if self._entry else None
+
+    def upload_from_string(self, data, content_type="application/octet-stream", timeout=None, retry=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode()
+        self.bucket._roundtrip()
+        self.bucket._objects[self.name] = {
+            "data": bytes(data),
+            "content_type": content_type,
+            "etag": uuid.uuid4().hex,
+            "updated": _now(),
+        }
+
+    def upload_from_file(self, file_obj, content_type=None, timeout=None, retry=None, **kwargs):
+        self.upload_from_string(file_obj.read(), content_type=content_type or "application/octet-stream")
+
+    def make_public(self, client=None, timeout=None, retry=None):
+        self.bucket._roundtrip()
+
+    def exists(self, client=None, timeout=None, retry=None):
+        self.bucket._roundtrip()
+        return self._entry is not None
+
+    def reload(self, client=None, timeout=None, retry=None):
+        self.bucket._roundtrip()
+        if self._entry is None:
+            raise NotFound(f"No such object: {self.name}")
+
+    def download_as_bytes(self, start=None, end=None, timeout=None, retry=None, **kwargs):
+        self.bucket._roundtrip()
+        if self._entry is None:
+            raise NotFound(f"No such object: {self.name}")
+        data = self._entry["data"]
+        if start is not None or end is not None:
+            data = data[start or 0: (end + 1) if end is not None else None]
+        return data
+
+    def download_to_file(self, file_obj, **kwargs):
+        file_obj.write(self.download_as_bytes())
+
+    def delete(self, client=None, timeout=None, retry=None, **kwargs):
+        self.bucket._roundtrip()
+        if self.bucket._objects.pop(self.name, None) is None:
+            raise NotFound(f"No such object: {self.name}")
+
+
+class FakeBucket:
+    """Subset of ``google.cloud.storage.Bucket`` backed by a dict."""
+
+    def __init__(self, name: str = "bench-bucket", latency: float = 0.0):
+        self.name = name
+        self.latency = latency
+        self._objects: dict[str, dict] = {}
+        self.round_trips = 0
+
+    def _roundtrip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def reset(self):
+        self._objects.clear()
+        self.round_trips = 0
+
+    def blob(self, blob_name, **kwargs):
+        return FakeBlob(self, blob_name)
+
+    def get_blob(self, blob_name, **kwargs):
+        blob = FakeBlob(self, blob_name)
+        return blob if blob.exists() else None
+
+
+class FakeGemini:
+    """Stand-in for the Gemini chat call with a fixed upstream latency."""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = 0
+
+    async def agenerate_response(self, user_message: str) -> str:
+        import asyncio
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return f"You asked: {user_message[:64]}. Is there anything else I can help you with?"
+
+
+try:  # Use the real exception types when the Google libraries are installed.
+    from google.api_core.exceptions import AlreadyExists, FailedPrecondition, NotFound
+except ImportError:  # pragma: no cover
+    class AlreadyExists(Exception):
+        pass
+
+    class FailedPrecondition(Exception):
+        pass
+
+    class NotFound(Exception):
+        pass
+
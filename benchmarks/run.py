@@ -0,0 +1,280 @@
+"""Load and latency benchmarks for the HackConnect routers.
+
+Drives the real FastAPI app in-process through ``httpx.ASGITransport`` with
+the Firestore, Storage and Gemini clients replaced by the stand-ins in
+``benchmarks.fakes``. Each scenario runs in its own subprocess so peak RSS is
+measured per scenario, and the results are written as JSON so two commits
+can be diffed:
+
+    python -m benchmarks.run --out bench.json
+    python -m benchmarks.run --scenario list_events --requests 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+
+SCENARIOS = {
+    # name: (default requests, default concurrency)
+    "join_drop": (500, 50),
+    "checkin_rush": (1000, 50),
+    "list_events": (30, 4),
+    "attendees_export": (3, 1),
+    "chatbot_burst": (300, 100),
+}
+
+LIST_EVENTS_COUNT = 10_000
+ATTENDEES_COUNT = 50_000
+BACKEND_LATENCY = float(os.getenv("BENCH_BACKEND_LATENCY", "0.002"))
+GEMINI_LATENCY = float(os.getenv("BENCH_GEMINI_LATENCY", "0.05"))
+SEED = 1234
+
+
+def install_fakes():
+    """Point the app at local stand-ins for Firestore, Storage and Gemini."""
+    from benchmarks.fakes import FakeBucket, FakeFirestore, FakeGemini
+    from app.services import firebase
+    from app.services.gemini import gemini_gateway
+
+    db = FakeFirestore(latency=BACKEND_LATENCY)
+    bucket = FakeBucket(latency=BACKEND_LATENCY)
+    gemini = FakeGemini(latency=GEMINI_LATENCY)
+
+    firebase.override_clients(db=db, storage_bucket=bucket)
+    gemini_gateway.call = gemini.agenerate_response
+    return db, bucket, gemini
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def _drive(client, requests, concurrency):
+    """Send ``requests`` (list of (method, url, kwargs)) with bounded concurrency."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses: dict[int, int] = {}
+
+    async def one(method, url, kwargs):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*r) for r in requests))
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    ok = sum(n for code, n in statuses.items() if 200 <= code < 400)
+    return {
+        "requests": len(requests),
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(requests) / wall, 1) if wall else None,
+        "p50_ms": round(_percentile(latencies, 50), 2),
+        "p95_ms": round(_percentile(latencies, 95), 2),
+        "p99_ms": round(_percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2),
+        "ok": ok,
+        "errors": len(requests) - ok,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+    }
+
+
+def _event_doc(i, rng, tier_count=1000):
+    import datetime as dt
+    start = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc) + dt.timedelta(hours=rng.randint(0, 24 * 365))
+    return {
+        "eventLink": f"https://example.test/events/{i}",
+        "title": f"Hackathon {i} {rng.choice(['Arbitrum', 'Solidity', 'ZK', 'DeFi', 'AI'])}",
+        "startDate": start,
+        "endDate": start + dt.timedelta(hours=rng.choice([8, 24, 48])),
+        "description": "A weekend of building on web3. " * 4,
+        "hostAddress": f"0xhost{rng.randint(0, 500):04d}",
+        "imageUrl": f"https://storage.example.test/events/images/{i}.png",
+        "status": rng.choice(["upcoming", "ongoing", "ended"]),
+        "ticketTiers": [
+            {"tierName": "General", "ticketCount": tier_count, "ticketsSold": 0, "price": 0.0},
+            {"tierName": "VIP", "ticketCount": tier_count // 10, "ticketsSold": 0, "price": 25.0},
+        ],
+        "createdAt": start,
+    }
+
+
+def _ticket_doc(event_id, i, signer):
+    import datetime as dt
+    payload = {
+        "eventTitle": "Hackathon 0",
+        "eventId": event_id,
+        "walletAddress": f"0xwallet{i:06d}",
+        "ticketId": f"ticket-{i:06d}",
+        "purchasedAt": dt.datetime(2026, 1, 1, 12, 0).isoformat(),
+        "priceBought": 0.0,
+        "tierName": "General",
+        "status": "active",
+    }
+    payload["signature"] = signer(dict(payload))
+    return {
+        **payload,
+        "qrCodeUrl": f"https://storage.example.test/qrcodes/{i}.png",
+        "qrCodePath": f"qrcodes/events/{event_id}/{payload['walletAddress']}/{payload['ticketId']}.png",
+        "purchasedAtTimestamp": dt.datetime(2026, 1, 1, 12, 0, tzinfo=dt.timezone.utc),
+    }
+
+
+def build_requests(name, count, db, rng):
+    """Seed the stand-ins for ``name`` and return the request list to replay."""
+    from app.routers.events import generate_signature
+
+    if name == "join_drop":
+        db.seed("Events", {"drop": _event_doc(0, rng, tier_count=count * 2)})
+        return [
+            ("POST", f"/events/joinEvent/drop/0xwallet{i:06d}",
+             {"json": {"eventTitle": "Hackathon 0", "priceBought": 0.0, "tierName": "General"}})
+            for i in range(count)
+        ]
+
+    if name == "checkin_rush":
+        db.seed("Events", {"rush": _event_doc(0, rng)})
+        tickets = {f"ticket-{i:06d}": _ticket_doc("rush", i, generate_signature) for i in range(count)}
+        db.seed("Tickets", tickets)
+        requests = []
+        for data in tickets.values():
+            qr = {k: data[k] for k in ("eventTitle", "eventId", "walletAddress", "ticketId",
+                                      "purchasedAt", "priceBought", "tierName", "status", "signature")}
+            requests.append(("POST", "/events/verifyTicket/rush", {"json": qr}))
+        rng.shuffle(requests)
+        return requests
+
+    if name == "list_events":
+        db.seed("Events", {f"event-{i:05d}": _event_doc(i, rng) for i in range(LIST_EVENTS_COUNT)})
+        return [("GET", "/events/listEvents", {})] * count
+
+    if name == "attendees_export":
+        db.seed("Events", {"export": _event_doc(0, rng)})
+        db.seed("Tickets", {
+            f"ticket-{i:06d}": _ticket_doc("export", i, generate_signature) for i in range(ATTENDEES_COUNT)
+        })
+        return [("GET", "/events/downloadAttendeesList/export", {})] * count
+
+    if name == "chatbot_burst":
+        questions = ["How do I join an event?", "Where can I see my tokens?", "How do I claim rewards?"]
+        return [
+            ("POST", "/chatbot/chatbotInput", {"json": {"user_message": rng.choice(questions)}})
+            for _ in range(count)
+        ]
+
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+def run_scenario(name, count, concurrency):
+    """Run one scenario in the current process and return its result dict."""
+    import httpx
+
+    db, bucket, gemini = install_fakes()
+    from app import create_app
+
+    rng = random.Random(SEED)
+    app = create_app()
+    requests = build_requests(name, count, db, rng)
+    db._store.round_trips = 0
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            return await _drive(client, requests, concurrency)
+
+    result = asyncio.run(main())
+    result["firestore_round_trips"] = db.round_trips
+    result["storage_round_trips"] = bucket.round_trips
+    result["gemini_calls"] = gemini.calls
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--requests", type=int, help="override the request count")
+    parser.add_argument("--concurrency", type=int, help="override the concurrency")
+    parser.add_argument("--out", default="bench_output.json", help="JSON report path")
+    parser.add_argument("--admission", action="store_true",
+                        help="turn admission control on (all bench traffic shares one client IP)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("ADMISSION_ENABLED", "1" if args.admission else "0")
+    os.environ.setdefault("MEDIA_BASE_URL", "http://bench.local")
+
+    if args.child:
+        name = args.scenario[0]
+        default_count, default_concurrency = SCENARIOS[name]
+        result = run_scenario(name, args.requests or default_count, args.concurrency or default_concurrency)
+        print(json.dumps(result))
+        return
+
+    report = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend_latency_s": BACKEND_LATENCY,
+        "gemini_latency_s": GEMINI_LATENCY,
+        "scenarios": {},
+    }
+    for name in args.scenario or list(SCENARIOS):
+        cmd = [sys.executable, "-m", "benchmarks.run", "--child", "--scenario", name]
+        if args.admission:
+            cmd += ["--admission"]
+        if args.requests:
+            cmd += ["--requests", str(args.requests)]
+        if args.concurrency:
+            cmd += ["--concurrency", str(args.concurrency)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"{name}: failed\n{proc.stderr}", file=sys.stderr)
+            report["scenarios"][name] = {"error": proc.stderr.strip().splitlines()[-1:]}
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        report["scenarios"][name] = result
+        print(
+            f"{name:18} {result['throughput_rps']:>9} rps  p50 {result['p50_ms']:>8} ms  "
+            f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  "
+            f"rss {result['peak_rss_mb']:>7} MB  errors {result['errors']}"
+        )
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
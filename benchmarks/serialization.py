@@ -0,0 +1,87 @@
+"""Serialization benchmark for the event list (10k events by default).
+
+Compares the old path (pydantic ``Event`` per document wrapped in
+``EventListResponse`` and re-encoded by ``jsonable_encoder``) with the
+plain-dict + ``FastJSONResponse`` path used by ``list_events``, and checks
+that both produce the same JSON.
+
+    python -m benchmarks.serialization --events 10000 --out serialization.json
+"""
+import argparse
+import datetime as dt
+import json
+import random
+import time
+
+
+def _legacy_render(docs):
+    from fastapi.encoders import jsonable_encoder
+    from app.routers.events import Event, EventListResponse, EventTiers
+
+    events = []
+    for doc_id, data in docs:
+        tiers = [EventTiers(**t) for t in data.get("ticketTiers", []) if isinstance(t, dict)]
+        events.append(Event(
+            event_id=doc_id,
+            event_link=data.get("eventLink", ""),
+            event_title=data.get("title", ""),
+            date_start=data.get("startDate", dt.datetime.now()),
+            date_end=data.get("endDate", dt.datetime.now()),
+            description=data.get("description", ""),
+            host_address=data.get("hostAddress", ""),
+            image_url=data.get("imageUrl"),
+            status=data.get("status", ""),
+            ticket_tiers=tiers,
+            created_at=data.get("createdAt", dt.datetime.utcnow()),
+        ))
+    content = jsonable_encoder(EventListResponse(events=events))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _fast_render(docs):
+    from app.services.serialization import FastJSONResponse, event_to_dict
+
+    return FastJSONResponse({"events": [event_to_dict(doc_id, data) for doc_id, data in docs]}).body
+
+
+def _time(fn, docs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(docs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main(argv=None):
+    from benchmarks.run import SEED, _event_doc
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5, help="best of N runs")
+    parser.add_argument("--out", help="optional JSON report path")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(SEED)
+    docs = [(f"event-{i:05d}", _event_doc(i, rng)) for i in range(args.events)]
+
+    legacy_s, legacy_body = _time(_legacy_render, docs, args.repeat)
+    fast_s, fast_body = _time(_fast_render, docs, args.repeat)
+
+    report = {
+        "events": args.events,
+        "legacy_ms": round(legacy_s * 1000, 1),
+        "fast_ms": round(fast_s * 1000, 1),
+        "speedup": round(legacy_s / fast_s, 2),
+        "body_bytes": len(fast_body),
+        "identical_json": json.loads(legacy_body) == json.loads(fast_body),
+    }
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
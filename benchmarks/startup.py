@@ -0,0 +1,113 @@
+"""Cold-start benchmark: import time of ``main`` and time to first response.
+
+    python -m benchmarks.startup --out startup.json --budget-ms 1500
+
+Import cost comes from ``python -X importtime -c "import main"`` (the
+heaviest modules are listed by cumulative time). Time to first response
+starts a local uvicorn process and polls ``GET /`` until it answers. With
+``--budget-ms`` the command exits non-zero when time to first response goes
+over the budget, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+
+def import_profile(runs: int = 3, top: int = 15):
+    """Return total import time of ``main`` (best of ``runs``) and the heaviest modules."""
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            capture_output=True, text=True, env={**os.environ, "SERVICE_WARMUP": "off"},
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+        modules = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            modules.append((name.rstrip(), int(self_us), int(cumulative_us)))
+        main_module = next((m for m in modules if m[0].strip() == "main"), None)
+        total_us = main_module[2] if main_module else sum(m[1] for m in modules)
+        if best is None or total_us < best[0]:
+            best = (total_us, modules)
+
+    total_us, modules = best
+    heaviest = sorted(modules, key=lambda m: m[2], reverse=True)
+    return {
+        "import_main_ms": round(total_us / 1000, 1),
+        "modules_imported": len(modules),
+        "heaviest": [
+            {"module": name.strip(), "cumulative_ms": round(cum / 1000, 1), "self_ms": round(own / 1000, 1)}
+            for name, own, cum in heaviest[:top]
+        ],
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_response(warmup: str = "off", timeout: float = 60.0):
+    """Start uvicorn and return milliseconds until ``GET /`` answers 200."""
+    port = _free_port()
+    env = {**os.environ, "SERVICE_WARMUP": warmup}
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited early: {proc.stderr.read().decode()[-500:]}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return round((time.perf_counter() - start) * 1000, 1)
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("server did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="startup_output.json", help="JSON report path")
+    parser.add_argument("--runs", type=int, default=3, help="repetitions (best run is kept)")
+    parser.add_argument("--warmup", default="off", choices=["off", "blocking", "background"],
+                        help="SERVICE_WARMUP mode for the first-response measurement")
+    parser.add_argument("--budget-ms", type=float, help="fail if time to first response exceeds this")
+    args = parser.parse_args(argv)
+
+    report = import_profile(runs=args.runs)
+    report["warmup"] = args.warmup
+    report["first_response_ms"] = min(time_to_first_response(args.warmup) for _ in range(args.runs))
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"import main:         {report['import_main_ms']} ms ({report['modules_imported']} modules)")
+    print(f"time to first reply: {report['first_response_ms']} ms (warmup={args.warmup})")
+    for m in report["heaviest"][:5]:
+        print(f"  {m['cumulative_ms']:>8} ms  {m['module']}")
+    print(f"wrote {args.out}")
+
+    if args.budget_ms is not None and report["first_response_ms"] > args.budget_ms:
+        print(f"over budget: {report['first_response_ms']} ms > {args.budget_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
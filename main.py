@@ -1,13 +1,16 @@
 
-import uvicorn
-from app import create_app
+if __name__ == "__main__":
+    # Direct invocation: `python main.py` runs the multi-worker launcher
+    # (WEB_WORKERS, WEB_HOST, WEB_PORT; see app/launcher.py). Each worker
+    # builds its own app, so this process never creates one.
+    from app.launcher import main
 
-# Expose the ASGI application instance at module level so
-# running `uvicorn main:app --reload` works. Previously it
-# was only defined inside the __main__ guard causing
-# "Attribute 'app' not found" when Uvicorn imported it.
-app = create_app()
+    main()
+else:
+    from app import create_app
 
-if __name__ == "__main__":
-    # Direct invocation: `python main.py`
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
+    # Expose the ASGI application instance at module level so
+    # running `uvicorn main:app --reload` works. Previously it
+    # was only defined inside the __main__ guard causing
+    # "Attribute 'app' not found" when Uvicorn imported it.
+    app = create_app()
\ No newline at end of file